@@ -0,0 +1,194 @@
+"""
+Écriture différée de last_login / last_activity
+
+Les horodatages sont accumulés en mémoire du worker puis écrits en bloc
+(``bulk_update``) toutes les ``FLUSH_INTERVAL`` secondes par un thread de
+fond, ou dès que ``MAX_PENDING`` utilisateurs sont en attente.
+
+Garanties:
+- le buffer est vidé à l'arrêt du processus (``atexit``, déclenché aussi par
+  l'arrêt gracieux des workers gunicorn) ;
+- une écriture en échec est réintégrée au buffer et retentée ;
+- seule la valeur la plus récente par utilisateur est conservée ;
+- l'écriture ne périme ni la version de ``User`` (ETag) ni les principaux en
+  cache : ces horodatages changent à chaque requête ou presque et sont
+  indicatifs. Le buffer garde les valeurs de sa dernière écriture, reportées
+  sur le principal (``apply_pending``, ``touch``) à la place de celles, plus
+  anciennes, qu'il porte.
+
+Le mécanisme (thread, reprise sur échec) est porté par ``WriteBehindBuffer``,
+réutilisé pour les positions (``positions``).
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('last_login', 'last_activity')
+
+
+class WriteBehindBuffer:
+    """
+    Valeurs par utilisateur accumulées en mémoire du worker et écrites en
+    bloc par un thread de fond (base des buffers d'écriture différée)
+
+    Les sous-classes définissent ``merge(current, value)`` (valeur conservée
+    pour un utilisateur, ``current`` pouvant être None) et ``write(pending)``.
+    """
+    thread_name = 'write-behind'
+    failure_message = "Échec de l'écriture différée, nouvel essai"
+
+    def __init__(self, flush_interval=30.0, max_pending=10_000, batch_size=500):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Démarrage paresseux par processus (les threads ne survivent pas au fork)
+        if self._pid == os.getpid() or self.flush_interval <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name=self.thread_name, daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+    def _store(self, user_id, value):
+        self._ensure_thread()
+        with self._lock:
+            self._pending[user_id] = self.merge(self._pending.get(user_id), value)
+            size = len(self._pending)
+        if size >= self.max_pending:
+            self._wakeup.set()
+
+    def pending(self, user_id):
+        with self._lock:
+            return self._pending.get(user_id)
+
+    def merge(self, current, value):
+        raise NotImplementedError
+
+    def write(self, pending):
+        raise NotImplementedError
+
+    def flush(self):
+        """Écrire en bloc les valeurs en attente, retourne le nombre d'utilisateurs"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            self.write(pending)
+        except Exception:
+            logger.exception(self.failure_message)
+            self._merge(pending)
+            return 0
+        return len(pending)
+
+    def _merge(self, pending):
+        with self._lock:
+            for user_id, value in pending.items():
+                self._pending[user_id] = self.merge(self._pending.get(user_id), value)
+
+
+class ActivityBuffer(WriteBehindBuffer):
+    """Buffer write-behind des horodatages d'activité"""
+    thread_name = 'activity-flush'
+    failure_message = "Échec de l'écriture différée de l'activité, nouvel essai"
+
+    def __init__(self, flush_interval=30.0, max_pending=10_000, resolution=60.0, batch_size=500):
+        super().__init__(flush_interval, max_pending, batch_size)
+        self.resolution = resolution
+        self._written = {}
+
+    def merge(self, current, value):
+        entry = dict(current or {})
+        for field, at in value.items():
+            if entry.get(field) is None or at > entry[field]:
+                entry[field] = at
+        return entry
+
+    def _record(self, user_id, field, at):
+        self._store(user_id, {field: at})
+
+    def record_login(self, user_id, at=None):
+        at = at or timezone.now()
+        self._record(user_id, 'last_login', at)
+        self._record(user_id, 'last_activity', at)
+
+    def touch(self, user, at=None):
+        """
+        Noter l'activité d'un utilisateur authentifié
+
+        Aucune écriture si l'activité connue date de moins de ``resolution``
+        secondes (le cas courant : rien n'est ajouté au buffer).
+        """
+        at = at or timezone.now()
+        known = self.known(user.pk).get('last_activity') or user.last_activity
+        if known is not None and (at - known).total_seconds() < self.resolution:
+            return
+        self._record(user.pk, 'last_activity', at)
+
+    def pending_value(self, user_id, field):
+        return (self.pending(user_id) or {}).get(field)
+
+    def known(self, user_id):
+        """Valeurs en attente, à défaut celles de la dernière écriture"""
+        return self.merge(self._written.get(user_id), self.pending(user_id) or {})
+
+    def apply_pending(self, user):
+        """Reporter sur une instance les valeurs plus récentes que les siennes"""
+        for field, value in self.known(user.pk).items():
+            current = getattr(user, field)
+            if current is None or value > current:
+                setattr(user, field, value)
+        return user
+
+    def write(self, pending):
+        for field in FIELDS:
+            objs = [
+                User(pk=user_id, **{field: values[field]})
+                for user_id, values in pending.items() if field in values
+            ]
+            if objs:
+                User.objects.bulk_update(objs, [field], batch_size=self.batch_size)
+        self._written = pending
+
+
+def _build_buffer():
+    config = getattr(settings, 'AUTH_ACTIVITY', {})
+    return ActivityBuffer(
+        flush_interval=config.get('FLUSH_INTERVAL', 30.0),
+        max_pending=config.get('MAX_PENDING', 10_000),
+        resolution=config.get('RESOLUTION', 60.0),
+        batch_size=config.get('BATCH_SIZE', 500),
+    )
+
+
+activity_buffer = _build_buffer()
+atexit.register(activity_buffer.flush)
@@ -43,7 +43,7 @@ class UserAdmin(BaseUserAdmin):
             'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')
         }),
         ('Dates importantes', {
-            'fields': ('last_login', 'created_at', 'updated_at')
+            'fields': ('last_login', 'last_activity', 'created_at', 'updated_at')
         }),
     )
     
@@ -57,7 +57,7 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
     
-    readonly_fields = ['id', 'created_at', 'updated_at', 'last_login']
+    readonly_fields = ['id', 'created_at', 'updated_at', 'last_login', 'last_activity']
 
 
 @admin.register(AffectationGare)
@@ -0,0 +1,46 @@
+"""
+Backends d'authentification DRF pour l'app Authentication
+"""
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .activity import activity_buffer
+from .cache import load_principal
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication avec cache des principaux
+
+    L'utilisateur et son rôle sont lus depuis le cache au lieu de deux
+    requêtes SQL par appel. L'activité est notée sans écriture immédiate.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            user = load_principal(self.user_model, user_id)
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        # Activité notée en mémoire, écrite en bloc plus tard
+        activity_buffer.touch(user)
+        return user
@@ -0,0 +1,87 @@
+"""
+Mises à jour groupées des utilisateurs
+
+Une action groupée lit l'état courant des utilisateurs visés (verrouillés
+pour la transaction), écrit les lignes réellement modifiées par des
+``UPDATE ... WHERE id IN (...)`` et n'invalide les caches (principal,
+version des claims) qu'une fois pour tout le lot. ``QuerySet.update()``
+n'émet pas de signals : ces invalidations (et la version du modèle pour
+les ETag) sont faites ici.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.versions import bump_version
+
+from .cache import bump_token_version, invalidate_principal
+from .livreurs import invalidate_livreurs
+from .models import User
+
+# Champs modifiables en masse et effet sur les claims des tokens
+BULK_FIELDS = {'role': 'role_id', 'is_active': 'is_active'}
+BATCH_SIZE = 500
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+SKIPPED = 'skipped'
+
+
+def bulk_settings():
+    return getattr(settings, 'AUTH_BULK', {})
+
+
+def bulk_max_users():
+    """Utilisateurs au plus par action groupée (liste ids ou filtres)"""
+    return bulk_settings().get('MAX_USERS', 1000)
+
+
+def bulk_update_users(ids, values, skip=()):
+    """
+    Appliquer ``values`` (role, is_active) aux utilisateurs ``ids``
+
+    Retourne ``{id: statut}`` dans l'ordre des ids ; les ids de ``skip``
+    (ex. l'administrateur qui se désactive lui-même) ne sont pas modifiés.
+    """
+    unknown = set(values) - set(BULK_FIELDS)
+    if unknown:
+        raise ValueError(f"Champs non modifiables en masse: {', '.join(sorted(unknown))}")
+
+    attnames = {BULK_FIELDS[field]: getattr(value, 'pk', value) for field, value in values.items()}
+    ids = list(dict.fromkeys(str(user_id) for user_id in ids))
+    skip = {str(user_id) for user_id in skip}
+
+    results, targets = {}, []
+    with transaction.atomic():
+        current = {
+            str(row['id']): row for row in User.objects.select_for_update().filter(
+                pk__in=ids
+            ).values('id', *attnames)
+        }
+        for user_id in ids:
+            row = current.get(user_id)
+            if row is None:
+                results[user_id] = NOT_FOUND
+            elif user_id in skip:
+                results[user_id] = SKIPPED
+            elif all(row[attname] == value for attname, value in attnames.items()):
+                results[user_id] = UNCHANGED
+            else:
+                results[user_id] = UPDATED
+                targets.append(user_id)
+
+        now = timezone.now()
+        for start in range(0, len(targets), BATCH_SIZE):
+            User.objects.filter(pk__in=targets[start:start + BATCH_SIZE]).update(
+                updated_at=now, **attnames
+            )
+        if targets:
+            # Rôle et activation figurent dans les claims : une seule
+            # incrémentation de version pour tout le lot
+            bump_token_version(*targets)
+            transaction.on_commit(lambda: invalidate_principal(*targets))
+            transaction.on_commit(lambda: bump_version(User))
+            transaction.on_commit(invalidate_livreurs)
+
+    return results
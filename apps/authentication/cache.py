@@ -0,0 +1,127 @@
+"""
+Cache des principaux authentifiés
+
+Chaque requête authentifiée par JWT chargeait l'utilisateur puis son rôle
+(deux requêtes SQL). Le principal (utilisateur + rôle) est désormais mis en
+cache par ``user_id`` et invalidé par les signals de ``User`` et ``Role``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import User
+
+PRINCIPAL_KEY = 'auth:principal:{user_id}'
+GENERATION_KEY = 'auth:principal:generation'
+
+
+def _timeout():
+    return getattr(settings, 'AUTH_PRINCIPAL_CACHE_TIMEOUT', 300)
+
+
+def principal_key(user_id):
+    return PRINCIPAL_KEY.format(user_id=user_id)
+
+
+def get_principal(user_id):
+    """
+    Retourne l'utilisateur en cache (rôle déjà chargé) ou None.
+
+    La génération et l'entrée sont lues en un seul aller-retour : une entrée
+    écrite sous une génération antérieure (rôle modifié depuis) est ignorée.
+    """
+    key = principal_key(user_id)
+    values = cache.get_many([GENERATION_KEY, key])
+    entry = values.get(key)
+    if entry is None:
+        return None
+    if entry['generation'] != values.get(GENERATION_KEY, 0):
+        return None
+    return entry['user']
+
+
+def set_principal(user):
+    """Mettre en cache un utilisateur dont le rôle est déjà chargé"""
+    cache.set(principal_key(user.pk), {
+        'generation': cache.get(GENERATION_KEY, 0),
+        'user': user,
+        'role_code': user.role.nom if user.role_id else None,
+    }, _timeout())
+
+
+def load_principal(user_model, user_id):
+    """
+    Résoudre un utilisateur depuis le cache ou la base (une seule requête
+    avec le rôle), puis le mettre en cache.
+    """
+    user = get_principal(user_id)
+    if user is None:
+        user = user_model.objects.select_related('role').get(pk=user_id)
+        set_principal(user)
+    return user
+
+
+def invalidate_principal(*user_ids):
+    """Invalider le cache d'un ou plusieurs utilisateurs"""
+    cache.delete_many([principal_key(user_id) for user_id in user_ids])
+
+
+def invalidate_all_principals():
+    """
+    Invalider tous les principaux (changement de rôle)
+
+    Les rôles changent rarement : incrémenter la génération est moins coûteux
+    que de parcourir tous les utilisateurs du rôle.
+    """
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+# Versions des claims JWT ---------------------------------------------------
+
+TOKEN_VERSION_KEY = 'auth:token_version:{user_id}'
+
+
+def token_version_key(user_id):
+    return TOKEN_VERSION_KEY.format(user_id=user_id)
+
+
+def get_token_version(user_id):
+    """
+    Version courante des claims d'un utilisateur (cache, sinon base)
+
+    Retourne None si l'utilisateur n'existe pas.
+    """
+    key = token_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = User.objects.filter(pk=user_id).values_list(
+            'token_version', flat=True
+        ).first()
+        if version is None:
+            return None
+        cache.set(key, version, None)
+    return version
+
+
+def bump_token_version(*user_ids):
+    """
+    Invalider les claims (rôle, gares) des tokens déjà émis
+
+    Les tokens portant l'ancienne version ne sont plus crus sur parole : les
+    permissions retombent sur l'utilisateur et le refresh réémet les claims.
+    Les clés sont supprimées de nouveau après le commit : une lecture
+    concurrente avant le commit remettrait l'ancienne version en cache, sans
+    expiration.
+    """
+    if not user_ids:
+        return
+    User.objects.filter(pk__in=user_ids).update(token_version=F('token_version') + 1)
+    keys = [token_version_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    invalidate_principal(*user_ids)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,20 @@
+"""
+Filtres pour l'app Authentication
+"""
+import django_filters
+
+from .models import User, AffectationGare
+
+
+class UserFilter(django_filters.FilterSet):
+    """Filtres de la liste des utilisateurs (et des actions groupées)"""
+    gare = django_filters.UUIDFilter(method='filter_gare', label='Gare (affectation active)')
+    
+    class Meta:
+        model = User
+        fields = ['role', 'is_active', 'gare']
+    
+    def filter_gare(self, queryset, name, value):
+        return queryset.filter(pk__in=AffectationGare.objects.filter(
+            gare_id=value, is_active=True
+        ).values('user_id'))
@@ -0,0 +1,122 @@
+"""
+Hachage des mots de passe pour l'app Authentication
+
+- ``TunablePBKDF2PasswordHasher``: coût (itérations) réglable par
+  environnement via ``PASSWORD_HASH_ITERATIONS`` ;
+- ``CredentialPipeline``: exécute le hachage dans un pool de threads borné
+  (PBKDF2 libère le GIL) : au plus ``WORKERS`` calculs simultanés par
+  processus, quel que soit le nombre de requêtes. Le thread de la requête
+  attend toujours le résultat ; au-delà de ``MAX_PENDING`` requêtes en
+  attente d'un calcul, les suivantes reçoivent un 503 après
+  ``QUEUE_TIMEOUT`` secondes au lieu de s'accumuler.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.backends import ModelBackend
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import User
+
+
+class TunablePBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 dont le nombre d'itérations vient des settings"""
+
+    @property
+    def iterations(self):
+        return getattr(
+            settings, 'PASSWORD_HASH_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations
+        )
+
+
+class HashingOverloaded(APIException):
+    """Trop de calculs de mots de passe en attente"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Service momentanément surchargé, veuillez réessayer'
+    default_code = 'hashing_overloaded'
+
+
+class CredentialPipeline:
+    """
+    Pool de hachage borné avec contre-pression
+
+    Limite les calculs simultanés et le nombre de requêtes qui les
+    attendent ; il ne libère pas le thread de la requête (appels bloquants).
+    """
+
+    def __init__(self, workers=4, max_pending=32, timeout=2.0):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='credentials'
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, func, *args):
+        """Exécuter ``func`` dans le pool et attendre son résultat (bloquant)"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingOverloaded()
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def make_password(self, raw_password):
+        return self.submit(hashers.make_password, raw_password)
+
+    def check_password(self, user, raw_password):
+        """
+        Vérifier le mot de passe d'un utilisateur
+
+        Si le hash doit être mis à jour (coût modifié), il est recalculé dans
+        le pool puis enregistré depuis le thread de la requête.
+        """
+        needs_update = []
+        is_correct = self.submit(
+            hashers.check_password, raw_password, user.password, needs_update.append
+        )
+        if is_correct and needs_update:
+            user.password = self.make_password(raw_password)
+            user.save(update_fields=['password'])
+        return is_correct
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """Pipeline du worker courant (créé à la première utilisation)"""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                config = getattr(settings, 'PASSWORD_HASHING', {})
+                _pipeline = CredentialPipeline(
+                    workers=config.get('WORKERS', 4),
+                    max_pending=config.get('MAX_PENDING', 32),
+                    timeout=config.get('QUEUE_TIMEOUT', 2.0),
+                )
+    return _pipeline
+
+
+class PipelineModelBackend(ModelBackend):
+    """ModelBackend dont le hachage passe par le CredentialPipeline"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+        try:
+            user = User._default_manager.select_related('role').get(
+                **{User.USERNAME_FIELD: username}
+            )
+        except User.DoesNotExist:
+            # Hacher quand même pour limiter l'écart de temps de réponse
+            get_pipeline().make_password(password)
+        else:
+            if get_pipeline().check_password(user, password) and self.user_can_authenticate(user):
+                return user
@@ -0,0 +1,212 @@
+"""
+Index en direct des positions des livreurs actifs
+
+Chaque worker garde une grille (``core.geo.GridIndex``) des livreurs actifs
+géolocalisés :
+
+- écriture (signals, après le commit): le point est déplacé ou retiré en
+  place dans le worker, et une génération partagée (cache) est incrémentée ;
+- positions reçues (``positions``, plusieurs par seconde) : le point est
+  déplacé en place sans toucher la génération ; les déplacements sont
+  publiés en un lot (cache, numéroté) à chaque écriture en bloc des
+  positions, et appliqués en place par les autres workers, avec au plus
+  ``FLUSH_INTERVAL`` de retard et sans reconstruire leur grille ;
+- lecture: la génération et le numéro du dernier lot sont relus au plus
+  toutes les ``SYNC_INTERVAL`` secondes. Si un autre worker a fait avancer
+  la génération, ou si des lots manquent (expirés, ``MOVES_TIMEOUT``), la
+  grille est reconstruite (une requête, quelques milliers de lignes,
+  complétée par les positions reçues et pas encore écrites, cf.
+  ``positions``) ; sinon les nouveaux lots sont appliqués.
+
+Les lectures ne prennent pas de verrou : une cellule modifiée est remplacée
+et non modifiée en place (cf. ``GridIndex.remove``). Les écritures en bloc
+(``update()``, ``bulk_create``) doivent appeler ``invalidate_livreurs``.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.geo import GridIndex
+
+from .models import Role, User
+from .positions import latest_positions
+
+GENERATION_KEY = 'auth:livreurs:gen'
+MOVES_SEQ_KEY = 'auth:livreurs:moves:seq'
+MOVES_KEY = 'auth:livreurs:moves:{}'
+# Au-delà, reconstruire coûte moins que rattraper les lots
+MAX_MOVE_BATCHES = 100
+
+
+def livreur_settings():
+    return getattr(settings, 'AUTH_LIVREUR_INDEX', {})
+
+
+def build_livreur_index():
+    rows = list(User.objects.filter(role__nom=Role.LIVREUR, is_active=True).values_list(
+        'id', 'latitude', 'longitude'
+    ))
+    # Positions reçues mais pas encore écrites en base (ingestion différée)
+    latest = latest_positions([user_id for user_id, _, _ in rows])
+    points = []
+    for user_id, lat, lon in rows:
+        if user_id in latest:
+            lat, lon = latest[user_id].latitude, latest[user_id].longitude
+        if lat is not None and lon is not None:
+            points.append((user_id, lat, lon))
+    return GridIndex(points, cell_deg=livreur_settings().get('CELL_DEG', 0.01))
+
+
+def livreur_position(user):
+    """(latitude, longitude) si l'utilisateur doit figurer dans l'index, sinon None"""
+    if user.is_active and user.has_location and user.is_livreur:
+        return user.latitude, user.longitude
+    return None
+
+
+class LivreurIndex:
+    """
+    Grille du worker, synchronisée par génération avec les autres workers
+
+    Les écritures (``update``, ``move``) prennent le verrou ; les recherches
+    s'en passent (la grille ne modifie jamais en place ce qu'elle parcourt).
+    """
+
+    def __init__(self):
+        self._index = None
+        self._generation = None
+        self._moves = 0
+        self._moved_at = {}
+        self._outgoing = {}
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def generation(self):
+        return cache.get(GENERATION_KEY, 0)
+
+    def _bump(self):
+        cache.add(GENERATION_KEY, 0, None)
+        try:
+            return cache.incr(GENERATION_KEY)
+        except ValueError:
+            # Clé évincée entre add et incr
+            cache.set(GENERATION_KEY, 1, None)
+            return 1
+
+    def index(self):
+        now = time.monotonic()
+        if self._index is not None and now - self._checked < livreur_settings().get('SYNC_INTERVAL', 1.0):
+            return self._index
+        values = cache.get_many([GENERATION_KEY, MOVES_SEQ_KEY])
+        generation, moves = values.get(GENERATION_KEY, 0), values.get(MOVES_SEQ_KEY, 0)
+        with self._lock:
+            if (
+                self._index is None or self._generation != generation
+                or not self._apply_moves(moves)
+            ):
+                self._index = build_livreur_index()
+                self._generation = generation
+                self._moves = moves
+                self._moved_at = {}
+            self._checked = now
+        return self._index
+
+    def _apply_moves(self, moves):
+        """Appliquer les lots publiés depuis le dernier lu ; False s'il faut reconstruire"""
+        if moves == self._moves:
+            return True
+        if not self._moves < moves <= self._moves + MAX_MOVE_BATCHES:
+            return False
+        keys = [MOVES_KEY.format(seq) for seq in range(self._moves + 1, moves + 1)]
+        batches = cache.get_many(keys)
+        if len(batches) < len(keys):
+            return False
+        for key in keys:
+            for user_id, (lat, lon, at) in batches[key].items():
+                self._move(user_id, lat, lon, at)
+        self._moves = moves
+        return True
+
+    def _move(self, user_id, lat, lon, at):
+        # Lots reçus dans le désordre : un point plus ancien est ignoré
+        known = self._moved_at.get(user_id)
+        if known is None or at >= known:
+            self._index.add(user_id, lat, lon)
+            self._moved_at[user_id] = at
+
+    def nearest(self, lat, lon, k, max_radius_km=None):
+        """[(distance, user_id)] des ``k`` livreurs les plus proches"""
+        return self.index().nearest(lat, lon, k, max_radius_km)
+
+    def within(self, lat, lon, radius_km, limit=None):
+        """[(distance, user_id)] des livreurs à moins de ``radius_km``"""
+        return self.index().within(lat, lon, radius_km, limit)
+
+    def update(self, user_id, position):
+        """
+        Déplacer (``position`` = (lat, lon)) ou retirer (None) un livreur
+
+        La grille locale n'est mise à jour en place que si elle était à jour
+        (génération précédente) ; sinon elle sera reconstruite.
+        """
+        generation = self._bump()
+        with self._lock:
+            if self._index is None or self._generation != generation - 1:
+                return
+            if position is None:
+                self._index.remove(user_id)
+            else:
+                self._index.add(user_id, *position)
+            self._moved_at.pop(user_id, None)
+            self._generation = generation
+
+    def move(self, user_id, position, at):
+        """
+        Déplacer un livreur dans la grille du worker ; le déplacement est
+        publié aux autres workers par ``publish`` (cf. ``positions``)
+        """
+        with self._lock:
+            self._outgoing[user_id] = (*position, at)
+            if self._index is not None:
+                self._move(user_id, *position, at)
+
+    def publish(self):
+        """Publier les déplacements reçus depuis le dernier lot"""
+        with self._lock:
+            outgoing, self._outgoing = self._outgoing, {}
+        if not outgoing:
+            return
+        cache.add(MOVES_SEQ_KEY, 0, None)
+        try:
+            seq = cache.incr(MOVES_SEQ_KEY)
+        except ValueError:
+            # Clé évincée entre add et incr : les workers reconstruiront
+            seq = 1
+            cache.set(MOVES_SEQ_KEY, seq, None)
+        cache.set(MOVES_KEY.format(seq), outgoing, livreur_settings().get('MOVES_TIMEOUT', 60))
+
+    def invalidate(self):
+        self._bump()
+        with self._lock:
+            self._index = None
+
+
+livreur_index = LivreurIndex()
+
+
+def livreur_saved(user):
+    """
+    Reporter la position d'un utilisateur enregistré
+
+    Les valeurs sont lues immédiatement ; la mise à jour retournée est à
+    exécuter après le commit.
+    """
+    user_id, position = user.pk, livreur_position(user)
+    return lambda: livreur_index.update(user_id, position)
+
+
+def invalidate_livreurs():
+    """Reconstruire les index après une écriture en bloc"""
+    livreur_index.invalidate()
@@ -0,0 +1,34 @@
+"""
+Commande pour sous-échantillonner l'historique des positions ancien
+Usage: python manage.py downsample_tracks [--days 7] [--resolution 60] [--batch-size 500]
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.authentication.tracks import downsample, track_settings
+
+
+class Command(BaseCommand):
+    help = "Reduit l'historique des positions ancien a un point par intervalle"
+
+    def add_arguments(self, parser):
+        config = track_settings()
+        parser.add_argument(
+            '--days', type=int, default=config.get('DOWNSAMPLE_AFTER_DAYS', 7),
+            help='Age minimal (en jours) des segments reduits'
+        )
+        parser.add_argument(
+            '--resolution', type=int, default=config.get('DOWNSAMPLE_RESOLUTION', 60),
+            help='Intervalle minimal (en secondes) entre deux points conserves'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=config.get('BATCH_SIZE', 500),
+            help='Nombre de segments reduits par transaction'
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        count = downsample(before, options['resolution'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✓ {count} segments sous-echantillonnes"))
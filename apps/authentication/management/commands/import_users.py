@@ -0,0 +1,289 @@
+"""
+Commande d'import en masse des utilisateurs
+Usage: python manage.py import_users personnel.csv [--processes 4] [--resume]
+
+Formats: CSV (en-tête) ou NDJSON (un objet JSON par ligne).
+Colonnes: nom, prenom, telephone, email, password, role, cnib, adresse,
+          gare_id, affectation (gerant | colissier | guichetier)
+
+Le fichier est lu en flux et traité par lots : téléphones normalisés (E.164),
+mots de passe hachés dans un pool de processus, rôles et gares résolus en une
+requête par lot, insertion par ``bulk_create`` (index de recherche compris). Les lignes rejetées sont
+écrites dans un rapport CSV ; la progression est enregistrée après chaque lot
+validé pour reprendre avec ``--resume``.
+"""
+import csv
+import json
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from core.versions import bump_version
+
+from apps.authentication.livreurs import invalidate_livreurs
+from apps.authentication.models import Role, User, AffectationGare, UserSearchToken
+from apps.authentication.phone import normalize_telephone
+from apps.authentication.roster import invalidate_rosters
+from apps.authentication.search import search_token_rows
+from apps.geography.models import Gare
+
+REPORT_FIELDS = ['ligne', 'telephone', 'erreur']
+
+
+def _init_worker():
+    # Processus lancés en "spawn" : Django doit être initialisé
+    django.setup()
+
+
+def _hash(password):
+    return make_password(password or None)
+
+
+def read_records(path, fmt):
+    """
+    Lire le fichier ligne à ligne : (numéro de ligne, dict)
+
+    Une ligne NDJSON illisible donne (numéro, ValueError) : elle est rejetée
+    dans le rapport sans interrompre l'import.
+    """
+    with open(path, encoding='utf-8-sig', newline='') as handle:
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(handle), start=1):
+                yield number, row
+        else:
+            for number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, ValueError(f'JSON invalide: {e.msg}')
+                    continue
+                if not isinstance(record, dict):
+                    yield number, ValueError('Objet JSON attendu')
+                    continue
+                yield number, record
+
+
+class Command(BaseCommand):
+    help = 'Importe des utilisateurs depuis un fichier CSV ou NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichier CSV ou NDJSON')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Deduit de l\'extension par defaut')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Processus de hachage (0 = dans le processus courant)'
+        )
+        parser.add_argument('--default-role', default=Role.CLIENT, help='Code du role si absent')
+        parser.add_argument('--report', help='Rapport des erreurs (defaut: <fichier>.errors.csv)')
+        parser.add_argument('--resume', action='store_true', help='Reprendre apres le dernier lot valide')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"Fichier introuvable: {path}")
+
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        report_path = options['report'] or f"{path}.errors.csv"
+        self.progress_path = f"{path}.progress"
+        self.chunk_size = options['chunk_size']
+        self.default_role = options['default_role']
+        self.roles = {role.nom: role for role in Role.objects.all()}
+
+        progress = {'ligne': 0, 'crees': 0, 'erreurs': 0}
+        if options['resume'] and os.path.exists(self.progress_path):
+            with open(self.progress_path) as handle:
+                progress = json.load(handle)
+            self.stdout.write(f"Reprise apres la ligne {progress['ligne']}")
+
+        report_exists = options['resume'] and os.path.exists(report_path)
+        pool = None
+        if options['processes']:
+            pool = ProcessPoolExecutor(options['processes'], initializer=_init_worker)
+
+        try:
+            with open(report_path, 'a' if report_exists else 'w', newline='') as report_file:
+                self.report = csv.DictWriter(report_file, fieldnames=REPORT_FIELDS)
+                if not report_exists:
+                    self.report.writeheader()
+
+                records = (
+                    (number, record) for number, record in read_records(path, fmt)
+                    if number > progress['ligne']
+                )
+                while True:
+                    chunk = list(islice(records, self.chunk_size))
+                    if not chunk:
+                        break
+                    created, errors = self.import_chunk(chunk, pool)
+                    report_file.flush()
+
+                    progress['ligne'] = chunk[-1][0]
+                    progress['crees'] += created
+                    progress['erreurs'] += errors
+                    with open(self.progress_path, 'w') as handle:
+                        json.dump(progress, handle)
+                    self.stdout.write(
+                        f"  ligne {progress['ligne']}: {progress['crees']} crees, "
+                        f"{progress['erreurs']} erreurs"
+                    )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        # Absent si le fichier ne contient aucune ligne
+        if os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
+        self.stdout.write(self.style.SUCCESS(
+            f"\n✓ Import termine: {progress['crees']} utilisateurs crees, "
+            f"{progress['erreurs']} erreurs (rapport: {report_path})"
+        ))
+
+    def reject(self, number, record, message):
+        self.report.writerow({
+            'ligne': number,
+            'telephone': record.get('telephone', ''),
+            'erreur': message,
+        })
+
+    def import_chunk(self, chunk, pool):
+        """Valider, hacher et insérer un lot ; retourne (créés, erreurs)"""
+        valid = []
+        errors = 0
+        seen_telephones, seen_emails = set(), set()
+
+        for number, record in chunk:
+            if isinstance(record, ValueError):
+                self.reject(number, {}, str(record))
+                errors += 1
+                continue
+            try:
+                row = self.clean(record)
+            except ValueError as e:
+                self.reject(number, record, str(e))
+                errors += 1
+                continue
+            if row['telephone'] in seen_telephones or (row['email'] and row['email'] in seen_emails):
+                self.reject(number, record, 'Doublon dans le fichier')
+                errors += 1
+                continue
+            seen_telephones.add(row['telephone'])
+            if row['email']:
+                seen_emails.add(row['email'])
+            valid.append((number, record, row))
+
+        # Résolutions en bloc : doublons existants (téléphone comparé sous sa
+        # forme normalisée, les comptes anciens ne l'étant pas tous) et gares
+        existing_telephones = set(User.objects.filter(
+            telephone_e164__in=seen_telephones
+        ).values_list('telephone_e164', flat=True))
+        existing_emails = set(User.objects.filter(
+            email__in=seen_emails
+        ).values_list('email', flat=True))
+        gare_ids = {row['gare_id'] for _, _, row in valid if row['gare_id']}
+        known_gares = {
+            str(pk) for pk in Gare.objects.filter(pk__in=gare_ids).values_list('pk', flat=True)
+        }
+
+        rows = []
+        for number, record, row in valid:
+            if row['telephone'] in existing_telephones:
+                message = 'Ce numéro de téléphone est déjà utilisé'
+            elif row['email'] and row['email'] in existing_emails:
+                message = 'Cet email est déjà utilisé'
+            elif row['gare_id'] and row['gare_id'] not in known_gares:
+                message = f"Gare inconnue: {row['gare_id']}"
+            else:
+                rows.append(row)
+                continue
+            self.reject(number, record, message)
+            errors += 1
+
+        passwords = [row['password'] for row in rows]
+        if pool is not None:
+            hashes = list(pool.map(_hash, passwords, chunksize=max(1, len(passwords) // 16)))
+        else:
+            hashes = [_hash(password) for password in passwords]
+
+        users, affectations = [], []
+        for row, encoded in zip(rows, hashes):
+            user = User(
+                nom=row['nom'], prenom=row['prenom'], telephone=row['telephone'],
+                email=row['email'], role=row['role'], cnib=row['cnib'],
+                adresse=row['adresse'], password=encoded,
+            )
+            user.sync_telephone_index()
+            users.append(user)
+            if row['gare_id']:
+                affectations.append(AffectationGare(
+                    user=user, gare_id=row['gare_id'], type=row['affectation'],
+                ))
+
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=self.chunk_size)
+            AffectationGare.objects.bulk_create(affectations, batch_size=self.chunk_size)
+            UserSearchToken.objects.bulk_create(
+                search_token_rows(users), batch_size=self.chunk_size
+            )
+            # bulk_create n'émet pas de signals : périmer les rosters (gares,
+            # utilisateurs) et les versions (ETag) des modèles
+            transaction.on_commit(
+                lambda: invalidate_rosters(
+                    *(a.gare_id for a in affectations), user_ids=[a.user_id for a in affectations]
+                )
+            )
+            transaction.on_commit(lambda: bump_version(User, AffectationGare))
+            transaction.on_commit(invalidate_livreurs)
+
+        return len(users), errors
+
+    def clean(self, record):
+        """Normaliser une ligne ; lève ValueError si elle est invalide"""
+        def value(key):
+            return (str(record.get(key) or '')).strip() or None
+
+        for key in ('nom', 'prenom', 'telephone'):
+            if not value(key):
+                raise ValueError(f'Champ obligatoire manquant: {key}')
+
+        email = value('email')
+        if email:
+            email = email.lower()
+            try:
+                validate_email(email)
+            except ValidationError:
+                raise ValueError(f'Email invalide: {email}')
+
+        role_code = value('role') or self.default_role
+        if role_code not in self.roles:
+            raise ValueError(f'Rôle inconnu: {role_code}')
+
+        gare_id = value('gare_id')
+        affectation = value('affectation')
+        if gare_id:
+            gare_id = str(uuid.UUID(gare_id))
+            if affectation not in dict(AffectationGare.TYPE_CHOICES):
+                raise ValueError(f"Type d'affectation invalide: {affectation}")
+
+        return {
+            'nom': value('nom'),
+            'prenom': value('prenom'),
+            'telephone': normalize_telephone(value('telephone')),
+            'email': email,
+            'password': value('password'),
+            'role': self.roles[role_code],
+            'cnib': value('cnib'),
+            'adresse': value('adresse'),
+            'gare_id': gare_id,
+            'affectation': affectation,
+        }
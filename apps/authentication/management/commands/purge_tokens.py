@@ -0,0 +1,45 @@
+"""
+Commande pour purger les tokens expirés
+Usage: python manage.py purge_tokens [--chunk-size 1000] [--dry-run]
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from apps.authentication.token_state import DatabaseTokenStateBackend, get_token_state
+
+
+class Command(BaseCommand):
+    help = 'Purge par lots les tokens expires (emis et liste noire)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Nombre de tokens supprimes par transaction'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Afficher le nombre de tokens expires sans supprimer'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = OutstandingToken.objects.filter(expires_at__lt=now)
+
+        if options['dry_run']:
+            self.stdout.write(f"Tokens expires: {expired.count()}")
+            self.stdout.write(
+                f"Dont en liste noire: {BlacklistedToken.objects.filter(token__expires_at__lt=now).count()}"
+            )
+            return
+
+        # Les tables simplejwt sont purgées quel que soit le backend configuré
+        # (lignes héritées d'avant un changement de backend)
+        chunk_size = options['chunk_size']
+        deleted = DatabaseTokenStateBackend().purge_expired(chunk_size=chunk_size)
+
+        state = get_token_state()
+        if not isinstance(state.backend, DatabaseTokenStateBackend):
+            deleted += state.purge_expired(chunk_size=chunk_size)
+
+        self.stdout.write(self.style.SUCCESS(f"✓ {deleted} tokens expires purges"))
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="token_version",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Version des claims JWT (incrémentée au changement de rôle ou d'affectation)",
+            ),
+        ),
+    ]
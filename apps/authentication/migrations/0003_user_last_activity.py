@@ -0,0 +1,21 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0002_user_token_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="last_activity",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Dernière requête authentifiée (écriture différée)",
+                null=True,
+            ),
+        ),
+    ]
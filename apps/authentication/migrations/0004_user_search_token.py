@@ -0,0 +1,85 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:08
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Copie figée de apps.authentication.search.user_tokens (et core.text) à la
+# date de la migration : le code de l'app peut évoluer sans la modifier
+TOKEN_RE = re.compile(r"[^\W_]+")
+TOKEN_MAX_LENGTH = 100
+
+
+def tokenize(value):
+    normalized = unicodedata.normalize("NFKD", str(value or ""))
+    folded = "".join(c for c in normalized if not unicodedata.combining(c)).casefold()
+    return TOKEN_RE.findall(folded)
+
+
+def user_tokens(user):
+    tokens = set()
+    for field in ("nom", "prenom", "email"):
+        tokens.update(tokenize(getattr(user, field)))
+    digits = "".join(c for c in user.telephone or "" if c.isdigit())
+    if digits:
+        tokens.add(digits)
+        indicatif = getattr(settings, "DEFAULT_PHONE_INDICATIF", "+226").lstrip("+")
+        if digits.startswith(indicatif) and len(digits) > len(indicatif):
+            tokens.add(digits[len(indicatif):])
+    return {token[:TOKEN_MAX_LENGTH] for token in tokens}
+
+
+def build_search_index(apps, schema_editor):
+    User = apps.get_model("authentication", "User")
+    UserSearchToken = apps.get_model("authentication", "UserSearchToken")
+    rows = []
+    for user in User.objects.only("nom", "prenom", "telephone", "email").iterator():
+        rows.extend(
+            UserSearchToken(user_id=user.pk, token=token) for token in user_tokens(user)
+        )
+        if len(rows) >= 5000:
+            UserSearchToken.objects.bulk_create(rows)
+            rows = []
+    UserSearchToken.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0003_user_last_activity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserSearchToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(db_index=True, max_length=100)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_tokens",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Mot de recherche utilisateur",
+                "verbose_name_plural": "Mots de recherche utilisateurs",
+                "db_table": "auth_user_search_token",
+                "unique_together": {("token", "user")},
+            },
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:09
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Copie figée de apps.authentication.phone.normalize_telephone à la date de
+# la migration : le code de l'app peut évoluer sans la modifier
+E164_RE = re.compile(r"^\+[1-9]\d{7,14}$")
+
+
+def normalize_telephone(value):
+    raw = re.sub(r"[\s.\-()/]", "", str(value or ""))
+    if raw.startswith("00"):
+        raw = "+" + raw[2:]
+    if not raw.startswith("+"):
+        raw = getattr(settings, "DEFAULT_PHONE_INDICATIF", "+226") + raw.lstrip("0")
+    if not E164_RE.match(raw):
+        raise ValueError(value)
+    return raw
+
+
+def fill_telephone_lookup(apps, schema_editor):
+    User = apps.get_model("authentication", "User")
+    users = []
+    for user in User.objects.only("telephone").iterator():
+        try:
+            user.telephone_e164 = normalize_telephone(user.telephone)
+        except ValueError:
+            user.telephone_e164 = None
+        digits = "".join(
+            c for c in user.telephone_e164 or user.telephone or "" if c.isdigit()
+        )
+        user.telephone_reversed = digits[::-1]
+        users.append(user)
+        if len(users) >= 1000:
+            User.objects.bulk_update(users, ["telephone_e164", "telephone_reversed"])
+            users = []
+    User.objects.bulk_update(users, ["telephone_e164", "telephone_reversed"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0004_user_search_token"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="telephone_e164",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="Téléphone normalisé E.164 (recherche par préfixe)",
+                max_length=16,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="telephone_reversed",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                editable=False,
+                help_text="Chiffres du téléphone inversés (recherche par suffixe)",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(fill_telephone_lookup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0005_user_telephone_lookup"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="affectationgare",
+            index=models.Index(
+                fields=["created_at", "id"], name="auth_affectation_keyset_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["created_at", "id"], name="auth_user_keyset_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0006_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="affectationgare",
+            index=models.Index(
+                fields=["gare_id", "is_active", "type"],
+                name="auth_affectation_gare_idx",
+            ),
+        ),
+    ]
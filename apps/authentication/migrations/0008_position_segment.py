@@ -0,0 +1,62 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authentication", "0007_affectation_gare_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PositionSegment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("debut", models.DateTimeField(verbose_name="Début de l'heure")),
+                ("points", models.BinaryField()),
+                (
+                    "nombre",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Nombre de points"
+                    ),
+                ),
+                (
+                    "resolution",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Résolution (s)"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="position_segments",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Segment de trajet",
+                "verbose_name_plural": "Segments de trajet",
+                "db_table": "auth_position_segment",
+                "indexes": [
+                    models.Index(
+                        fields=["debut", "resolution"],
+                        name="auth_position_seg_debut_idx",
+                    )
+                ],
+                "unique_together": {("user", "debut")},
+            },
+        ),
+    ]
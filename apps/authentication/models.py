@@ -5,6 +5,7 @@ from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.db import models
 from core.models import BaseModel
 from .managers import UserManager
+from .phone import normalize_telephone
 
 
 class Role(BaseModel):
@@ -97,6 +98,22 @@ class User(AbstractBaseUser, PermissionsMixin, BaseModel):
     prenom = models.CharField(max_length=100, help_text="Prénom")
     email = models.EmailField(unique=True, null=True, blank=True)
     telephone = models.CharField(max_length=20, unique=True, help_text="Numéro de téléphone")
+    telephone_e164 = models.CharField(
+        max_length=16,
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        help_text="Téléphone normalisé E.164 (recherche par préfixe)"
+    )
+    telephone_reversed = models.CharField(
+        max_length=20,
+        blank=True,
+        default='',
+        db_index=True,
+        editable=False,
+        help_text="Chiffres du téléphone inversés (recherche par suffixe)"
+    )
     
     # Rôle et affectation
     role = models.ForeignKey(
@@ -111,6 +128,15 @@ class User(AbstractBaseUser, PermissionsMixin, BaseModel):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     last_login = models.DateTimeField(null=True, blank=True)
+    last_activity = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Dernière requête authentifiée (écriture différée)"
+    )
+    token_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Version des claims JWT (incrémentée au changement de rôle ou d'affectation)"
+    )
     
     # Informations supplémentaires
     latitude = models.DecimalField(
@@ -146,11 +172,28 @@ class User(AbstractBaseUser, PermissionsMixin, BaseModel):
             models.Index(fields=['telephone']),
             models.Index(fields=['email']),
             models.Index(fields=['role']),
+            models.Index(fields=['created_at', 'id'], name='auth_user_keyset_idx'),
         ]
     
     def __str__(self):
         return f"{self.prenom} {self.nom}"
     
+    def save(self, *args, **kwargs):
+        self.sync_telephone_index()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'telephone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'telephone_e164', 'telephone_reversed'}
+        super().save(*args, **kwargs)
+    
+    def sync_telephone_index(self):
+        """Calculer les colonnes de recherche du téléphone (aussi avant bulk_create)"""
+        try:
+            self.telephone_e164 = normalize_telephone(self.telephone)
+        except ValueError:
+            self.telephone_e164 = None
+        digits = ''.join(c for c in self.telephone_e164 or self.telephone or '' if c.isdigit())
+        self.telephone_reversed = digits[::-1]
+    
     @property
     def nom_complet(self):
         """Nom complet de l'utilisateur"""
@@ -239,6 +282,10 @@ class AffectationGare(BaseModel):
         verbose_name = 'Affectation gare'
         verbose_name_plural = 'Affectations gares'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='auth_affectation_keyset_idx'),
+            models.Index(fields=['gare_id', 'is_active', 'type'], name='auth_affectation_gare_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.nom_complet} - {self.get_type_display()}"
@@ -254,3 +301,59 @@ class AffectationGare(BaseModel):
     @property
     def is_guichetier(self):
         return self.type == self.TYPE_GUICHETIER
+
+
+class UserSearchToken(models.Model):
+    """
+    Index de recherche des utilisateurs
+
+    Un mot normalisé (sans accents, minuscules) par ligne, tiré du nom, du
+    prénom, du téléphone et de l'email. Maintenu par les signals de User.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='search_tokens'
+    )
+    token = models.CharField(max_length=100, db_index=True)
+    
+    class Meta:
+        db_table = 'auth_user_search_token'
+        verbose_name = 'Mot de recherche utilisateur'
+        verbose_name_plural = 'Mots de recherche utilisateurs'
+        unique_together = [['token', 'user']]
+    
+    def __str__(self):
+        return self.token
+
+
+class PositionSegment(models.Model):
+    """
+    Historique des positions d'un utilisateur sur une heure
+
+    Les points sont empaquetés dans ``points`` (cf. ``tracks``) : une ligne
+    par utilisateur et par heure quel que soit le nombre de points.
+    ``resolution`` est l'intervalle minimal entre deux points conservés
+    (0 : points bruts, sinon historique sous-échantillonné).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='position_segments'
+    )
+    debut = models.DateTimeField(verbose_name='Début de l\'heure')
+    points = models.BinaryField()
+    nombre = models.PositiveIntegerField(default=0, verbose_name='Nombre de points')
+    resolution = models.PositiveIntegerField(default=0, verbose_name='Résolution (s)')
+    
+    class Meta:
+        db_table = 'auth_position_segment'
+        verbose_name = 'Segment de trajet'
+        verbose_name_plural = 'Segments de trajet'
+        unique_together = [['user', 'debut']]
+        indexes = [
+            models.Index(fields=['debut', 'resolution'], name='auth_position_seg_debut_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.debut:%Y-%m-%d %H:00} ({self.nombre} points)"
@@ -1,8 +1,31 @@
 """
 Permissions personnalisées pour l'app Authentication
 """
+from django.conf import settings
 from rest_framework import permissions
 
+from .models import Role
+from .tokens import claimed_principal
+
+
+def has_role(request, *role_codes):
+    """
+    Vérifier le rôle de l'utilisateur de la requête (l'un des rôles donnés)
+
+    En mode claims (``AUTH_PERMISSIONS_FROM_CLAIMS``), le rôle est lu dans le
+    token si sa version est à jour ; sinon on retombe sur ``User.role``.
+    """
+    user = request.user
+    if not (user and user.is_authenticated):
+        return False
+    
+    if getattr(settings, 'AUTH_PERMISSIONS_FROM_CLAIMS', False):
+        principal = claimed_principal(request)
+        if principal is not None:
+            return principal[0] in role_codes
+    
+    return bool(user.role and user.role.nom in role_codes)
+
 
 class IsAdmin(permissions.BasePermission):
     """Permission pour les administrateurs uniquement"""
@@ -10,11 +33,7 @@ class IsAdmin(permissions.BasePermission):
     message = "Seuls les administrateurs peuvent effectuer cette action"
     
     def has_permission(self, request, view):
-        return (
-            request.user and 
-            request.user.is_authenticated and 
-            request.user.is_admin
-        )
+        return has_role(request, Role.ADMIN)
 
 
 class IsOwnerOrAdmin(permissions.BasePermission):
@@ -27,7 +46,7 @@ class IsOwnerOrAdmin(permissions.BasePermission):
     
     def has_object_permission(self, request, view, obj):
         # Admin a tous les droits
-        if request.user.is_admin:
+        if has_role(request, Role.ADMIN):
             return True
         
         # Propriétaire de l'objet
@@ -39,17 +58,31 @@ class IsOwnerOrAdmin(permissions.BasePermission):
         return False
 
 
+class IsPersonnel(permissions.BasePermission):
+    """Permission pour le personnel (admin, gérant, guichetier, colissier)"""
+    
+    message = "Seul le personnel peut effectuer cette action"
+    
+    def has_permission(self, request, view):
+        return has_role(request, Role.ADMIN, Role.GERANT, Role.GUICHETIER, Role.COLISSIER)
+
+
+class IsAdminOrGerant(permissions.BasePermission):
+    """Permission pour les administrateurs et les gérants de gare"""
+    
+    message = "Seuls les administrateurs et les gérants peuvent effectuer cette action"
+    
+    def has_permission(self, request, view):
+        return has_role(request, Role.ADMIN, Role.GERANT)
+
+
 class IsGerantGare(permissions.BasePermission):
     """Permission pour les gérants de gare"""
     
     message = "Seuls les gérants de gare peuvent effectuer cette action"
     
     def has_permission(self, request, view):
-        return (
-            request.user and 
-            request.user.is_authenticated and 
-            request.user.is_gerant_gare
-        )
+        return has_role(request, Role.GERANT)
 
 
 class IsGuichetier(permissions.BasePermission):
@@ -58,11 +91,7 @@ class IsGuichetier(permissions.BasePermission):
     message = "Seuls les guichetiers peuvent effectuer cette action"
     
     def has_permission(self, request, view):
-        return (
-            request.user and 
-            request.user.is_authenticated and 
-            request.user.is_guichetier
-        )
+        return has_role(request, Role.GUICHETIER)
 
 
 class IsColissier(permissions.BasePermission):
@@ -71,11 +100,7 @@ class IsColissier(permissions.BasePermission):
     message = "Seuls les colissiers peuvent effectuer cette action"
     
     def has_permission(self, request, view):
-        return (
-            request.user and 
-            request.user.is_authenticated and 
-            request.user.is_colissier
-        )
+        return has_role(request, Role.COLISSIER)
 
 
 class IsLivreur(permissions.BasePermission):
@@ -84,11 +109,7 @@ class IsLivreur(permissions.BasePermission):
     message = "Seuls les livreurs peuvent effectuer cette action"
     
     def has_permission(self, request, view):
-        return (
-            request.user and 
-            request.user.is_authenticated and 
-            request.user.is_livreur
-        )
+        return has_role(request, Role.LIVREUR)
 
 
 class IsClient(permissions.BasePermission):
@@ -97,8 +118,38 @@ class IsClient(permissions.BasePermission):
     message = "Seuls les clients peuvent effectuer cette action"
     
     def has_permission(self, request, view):
-        return (
-            request.user and 
-            request.user.is_authenticated and 
-            request.user.is_client
-        )
+        return has_role(request, Role.CLIENT)
+
+
+def affected_gare_ids(request):
+    """
+    Gares des affectations actives de l'utilisateur de la requête
+
+    Lues dans les claims du token s'ils sont à jour, sinon en base.
+    """
+    if getattr(settings, 'AUTH_PERMISSIONS_FROM_CLAIMS', False):
+        principal = claimed_principal(request)
+        if principal is not None:
+            return principal[1]
+    
+    return frozenset(
+        str(gare_id) for gare_id in request.user.affectations.filter(
+            is_active=True, gare_id__isnull=False
+        ).values_list('gare_id', flat=True)
+    )
+
+
+class IsAffecteGare(permissions.BasePermission):
+    """Permission pour le personnel affecté à la gare de l'objet (ou un admin)"""
+    
+    message = "Vous n'êtes pas affecté à cette gare"
+    
+    def has_permission(self, request, view):
+        return request.user and request.user.is_authenticated
+    
+    def has_object_permission(self, request, view, obj):
+        if has_role(request, Role.ADMIN):
+            return True
+        
+        gare_id = getattr(obj, 'gare_id', obj.pk)
+        return str(gare_id) in affected_gare_ids(request)
@@ -0,0 +1,43 @@
+"""
+Normalisation des numéros de téléphone (E.164)
+"""
+import re
+
+from django.conf import settings
+
+E164_RE = re.compile(r'^\+[1-9]\d{7,14}$')
+
+
+def default_indicatif():
+    return getattr(settings, 'DEFAULT_PHONE_INDICATIF', '+226')
+
+
+def normalize_telephone(value, indicatif=None):
+    """
+    Normaliser un numéro au format E.164 (+22670000000)
+
+    Les séparateurs sont ignorés, ``00`` vaut ``+`` et un numéro national
+    reçoit l'indicatif par défaut. Lève ValueError si le résultat est invalide.
+    """
+    raw = re.sub(r'[\s.\-()/]', '', str(value or ''))
+    if raw.startswith('00'):
+        raw = '+' + raw[2:]
+    if not raw.startswith('+'):
+        raw = (indicatif or default_indicatif()) + raw.lstrip('0')
+    if not E164_RE.match(raw):
+        raise ValueError(f'Numéro de téléphone invalide: {value}')
+    return raw
+
+
+def normalize_telephone_prefix(value, indicatif=None):
+    """
+    Normaliser un début de numéro saisi : '70 11' -> '+2267011'
+
+    Même règles que ``normalize_telephone``, sans contrôle de longueur.
+    """
+    raw = re.sub(r'[\s.\-()/]', '', str(value or ''))
+    if raw.startswith('00'):
+        raw = '+' + raw[2:]
+    if not raw.startswith('+'):
+        raw = (indicatif or default_indicatif()) + raw.lstrip('0')
+    return '+' + ''.join(c for c in raw if c.isdigit())
@@ -0,0 +1,116 @@
+"""
+Ingestion des positions GPS (écriture différée et regroupée)
+
+Les applications des livreurs envoient leurs points par lots :
+
+- la position la plus récente de chaque utilisateur est conservée dans le
+  cache (lue par tous les workers, dont l'index des livreurs) ;
+- elle est écrite dans ``User.latitude`` / ``longitude`` par un
+  ``bulk_update`` toutes les ``FLUSH_INTERVAL`` secondes : quel que soit le
+  nombre de points reçus, une ligne par utilisateur et par intervalle, sans
+  toucher ``updated_at`` ni passer par ``UserSerializer`` ;
+- l'écriture ne périme ni la version de ``User`` (ETag) ni les principaux en
+  cache : ``/me`` lit la position en cache (``apply_pending``), et les
+  déplacements des livreurs sont publiés aux index des autres workers, qui
+  les appliquent en place (une fois par écriture, cf. ``livreurs``).
+
+Un point plus ancien que la position connue est ignoré (lots reçus dans le
+désordre).
+"""
+import atexit
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .activity import WriteBehindBuffer
+from .models import User
+
+POSITION_KEY = 'auth:position:{}'
+# Précision des colonnes latitude / longitude
+QUANTUM = Decimal('0.00000001')
+
+
+def position_settings():
+    return getattr(settings, 'AUTH_POSITIONS', {})
+
+
+class Position:
+    """Position horodatée d'un utilisateur"""
+    __slots__ = ('latitude', 'longitude', 'at')
+
+    def __init__(self, latitude, longitude, at):
+        self.latitude = Decimal(str(latitude)).quantize(QUANTUM)
+        self.longitude = Decimal(str(longitude)).quantize(QUANTUM)
+        self.at = at
+
+    def __getstate__(self):
+        return (self.latitude, self.longitude, self.at)
+
+    def __setstate__(self, state):
+        self.latitude, self.longitude, self.at = state
+
+
+def latest_positions(user_ids):
+    """Positions en cache : {user_id: Position}"""
+    keys = {POSITION_KEY.format(user_id): user_id for user_id in user_ids}
+    return {keys[key]: position for key, position in cache.get_many(list(keys)).items()}
+
+
+class PositionBuffer(WriteBehindBuffer):
+    """Buffer write-behind des positions (une par utilisateur)"""
+    thread_name = 'position-flush'
+    failure_message = "Échec de l'écriture différée des positions, nouvel essai"
+
+    def merge(self, current, value):
+        if current is None or value.at >= current.at:
+            return value
+        return current
+
+    def record(self, user_id, points):
+        """
+        Enregistrer des points ``(latitude, longitude, at)`` ; retourne la
+        position retenue, ou None si elle n'est pas plus récente que la
+        position connue
+        """
+        latest = max(points, key=lambda point: point[2])
+        position = Position(*latest)
+        key = POSITION_KEY.format(user_id)
+        known = self.pending(user_id) or cache.get(key)
+        if known is not None and known.at > position.at:
+            return None
+        cache.set(key, position, position_settings().get('CACHE_TIMEOUT', 3600))
+        self._store(user_id, position)
+        return position
+
+    def apply_pending(self, user):
+        """Reporter sur une instance la dernière position reçue (en attente ou en cache)"""
+        position = self.pending(user.pk) or cache.get(POSITION_KEY.format(user.pk))
+        if position is not None:
+            user.latitude, user.longitude = position.latitude, position.longitude
+        return user
+
+    def write(self, pending):
+        User.objects.bulk_update(
+            [
+                User(pk=user_id, latitude=position.latitude, longitude=position.longitude)
+                for user_id, position in pending.items()
+            ],
+            ['latitude', 'longitude'], batch_size=self.batch_size,
+        )
+        # Import local : livreurs dépend de ce module (positions en attente)
+        from .livreurs import livreur_index
+        livreur_index.publish()
+
+
+def _build_buffer():
+    config = position_settings()
+    return PositionBuffer(
+        flush_interval=config.get('FLUSH_INTERVAL', 10.0),
+        max_pending=config.get('MAX_PENDING', 10_000),
+        batch_size=config.get('BATCH_SIZE', 500),
+    )
+
+
+position_buffer = _build_buffer()
+atexit.register(position_buffer.flush)
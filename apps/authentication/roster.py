@@ -0,0 +1,287 @@
+"""
+Tableau de service par gare (qui est affecté à la gare X à la date D)
+
+Chaque gare a un ``Roster`` : ses affectations actives sous forme
+d'intervalles [date_debut, date_fin] triés par début, interrogés par
+dichotomie. Les rosters sont conservés dans le cache Django, avec un
+numéro de génération par gare, et mémorisés dans le processus :
+
+- lecture: une lecture de la génération, puis le roster en mémoire s'il
+  est à jour (sinon cache, sinon reconstruction en une requête indexée) ;
+- écriture (signals): la génération est incrémentée et le roster en cache
+  est mis à jour en place s'il correspond à la génération précédente ;
+  sinon il sera reconstruit à la prochaine lecture.
+
+Les affectations de chaque utilisateur forment de même un roster, indexé
+par utilisateur (``user_rosters``), d'où sont tirés ses chevauchements sans
+requête.
+
+Les écritures en bloc (``bulk_create``, ``update()``) doivent appeler
+``invalidate_rosters``.
+"""
+import datetime
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import AffectationGare
+
+ROSTER_KEY = 'auth:roster:{}:{}'
+GENERATION_KEY = 'auth:roster:{}:{}:gen'
+
+
+def _as_date(value, default):
+    # Une instance peut porter des dates en chaîne (create(date_debut='2024-05-01'))
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value)
+    return value or default
+
+
+def roster_timeout():
+    return getattr(settings, 'AUTH_ROSTER_CACHE_TIMEOUT', 3600)
+
+
+class Shift:
+    """Une affectation vue comme un intervalle de dates (bornes incluses)"""
+    __slots__ = ('debut', 'fin', 'affectation_id', 'user_id', 'type')
+
+    def __init__(self, debut, fin, affectation_id, user_id, type):
+        self.debut = debut
+        self.fin = fin
+        self.affectation_id = affectation_id
+        self.user_id = user_id
+        self.type = type
+
+    @classmethod
+    def from_affectation(cls, affectation):
+        return cls(
+            _as_date(affectation.date_debut, datetime.date.min),
+            _as_date(affectation.date_fin, datetime.date.max),
+            str(affectation.pk), str(affectation.user_id), affectation.type,
+        )
+
+    def __getstate__(self):
+        return (self.debut, self.fin, self.affectation_id, self.user_id, self.type)
+
+    def __setstate__(self, state):
+        self.debut, self.fin, self.affectation_id, self.user_id, self.type = state
+
+    def __lt__(self, other):
+        return (self.debut, self.affectation_id) < (other.debut, other.affectation_id)
+
+    def as_dict(self):
+        return {
+            'affectation': self.affectation_id,
+            'user': self.user_id,
+            'type': self.type,
+            'date_debut': None if self.debut == datetime.date.min else self.debut.isoformat(),
+            'date_fin': None if self.fin == datetime.date.max else self.fin.isoformat(),
+        }
+
+
+class Roster:
+    """
+    Intervalles d'une gare, triés par date de début
+
+    Les affectations sans début ou sans fin sont rangées à part : leur durée
+    (jusqu'à ``date.max``) ôterait toute portée à la borne de remontée des
+    intervalles fermés.
+    """
+    __slots__ = ('shifts', 'bounded', 'starts', 'max_length', 'open_end', 'open_end_starts',
+                 'open_start', 'open_start_ends', 'unbounded')
+
+    def __init__(self, shifts=()):
+        self.shifts = sorted(shifts)
+        self._reindex()
+
+    def _reindex(self):
+        min_date, max_date = datetime.date.min, datetime.date.max
+        self.bounded = [shift for shift in self.shifts if shift.debut != min_date and shift.fin != max_date]
+        self.starts = [shift.debut for shift in self.bounded]
+        # Durée maximale : borne la remontée depuis la date recherchée
+        self.max_length = max(
+            ((shift.fin - shift.debut).days for shift in self.bounded), default=0
+        )
+        # Sans fin : couvrent la date dès leur début
+        self.open_end = [shift for shift in self.shifts if shift.debut != min_date and shift.fin == max_date]
+        self.open_end_starts = [shift.debut for shift in self.open_end]
+        # Sans début : couvrent la date jusqu'à leur fin (triés par fin)
+        self.open_start = sorted(
+            (shift for shift in self.shifts if shift.debut == min_date and shift.fin != max_date),
+            key=lambda shift: (shift.fin, shift.affectation_id),
+        )
+        self.open_start_ends = [shift.fin for shift in self.open_start]
+        self.unbounded = [shift for shift in self.shifts if shift.debut == min_date and shift.fin == max_date]
+
+    def __getstate__(self):
+        return self.shifts
+
+    def __setstate__(self, shifts):
+        self.shifts = shifts
+        self._reindex()
+
+    def on(self, date):
+        """Affectations couvrant ``date`` (débutées au plus tard ce jour), par début"""
+        end = bisect_right(self.starts, date)
+        try:
+            start = bisect_left(self.starts, date - datetime.timedelta(days=self.max_length))
+        except OverflowError:
+            start = 0
+        found = [shift for shift in self.bounded[start:end] if shift.fin >= date]
+        found += self.open_end[:bisect_right(self.open_end_starts, date)]
+        found += self.open_start[bisect_left(self.open_start_ends, date):]
+        found += self.unbounded
+        return sorted(found)
+
+    def add(self, shift):
+        insort(self.shifts, shift)
+        self._reindex()
+
+    def remove(self, affectation_id):
+        self.shifts = [shift for shift in self.shifts if shift.affectation_id != affectation_id]
+        self._reindex()
+
+
+def find_overlaps(shifts):
+    """
+    Paires d'affectations qui se chevauchent (balayage par date de début)
+    """
+    overlaps = []
+    active = []
+    for shift in sorted(shifts):
+        active = [other for other in active if other.fin >= shift.debut]
+        overlaps.extend((other, shift) for other in active)
+        active.append(shift)
+    return overlaps
+
+
+def build_roster(gare_id, field='gare_id'):
+    return Roster(
+        Shift.from_affectation(affectation)
+        for affectation in AffectationGare.objects.filter(**{field: gare_id, 'is_active': True}).only(
+            'id', 'user_id', 'type', 'date_debut', 'date_fin'
+        )
+    )
+
+
+class RosterIndex:
+    """
+    Rosters par valeur de ``field`` (gare, utilisateur) : mémoire du
+    processus, cache partagé, base
+    """
+
+    def __init__(self, field='gare_id'):
+        self.field = field
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _key(self, template, gare_id):
+        return template.format(self.field, gare_id)
+
+    def generation(self, gare_id):
+        return cache.get(self._key(GENERATION_KEY, gare_id), 0)
+
+    def get(self, gare_id):
+        gare_id = str(gare_id)
+        generation = self.generation(gare_id)
+        local = self._local.get(gare_id)
+        if local is not None and local[0] == generation:
+            return local[1]
+
+        entry = cache.get(self._key(ROSTER_KEY, gare_id))
+        if entry is not None and entry[0] == generation:
+            roster = entry[1]
+        else:
+            roster = build_roster(gare_id, self.field)
+            cache.set(self._key(ROSTER_KEY, gare_id), (generation, roster), roster_timeout())
+        with self._lock:
+            self._local[gare_id] = (generation, roster)
+        return roster
+
+    def _bump(self, gare_id):
+        key = self._key(GENERATION_KEY, gare_id)
+        cache.add(key, 0, None)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Clé évincée entre add et incr
+            cache.set(key, 1, None)
+            return 1
+
+    def apply(self, gare_id, remove=None, add=None):
+        """
+        Retirer l'affectation ``remove`` et/ou ajouter le Shift ``add``
+
+        La mise à jour en place n'a lieu que si le roster en cache est celui
+        de la génération précédente ; sinon il sera reconstruit.
+        """
+        gare_id = str(gare_id)
+        generation = self._bump(gare_id)
+        entry = cache.get(self._key(ROSTER_KEY, gare_id))
+        if entry is None or entry[0] != generation - 1:
+            return
+        roster = entry[1]
+        if remove is not None:
+            roster.remove(remove)
+        if add is not None:
+            roster.add(add)
+        cache.set(self._key(ROSTER_KEY, gare_id), (generation, roster), roster_timeout())
+
+    def invalidate(self, *gare_ids):
+        for gare_id in {str(gare_id) for gare_id in gare_ids if gare_id}:
+            self._bump(gare_id)
+
+
+roster_index = RosterIndex()
+user_rosters = RosterIndex('user_id')
+
+
+def on_duty(gare_id, date=None):
+    """Affectations actives de la gare à la date donnée (aujourd'hui par défaut)"""
+    return roster_index.get(gare_id).on(date or timezone.localdate())
+
+
+def affectation_saved(affectation, previous_gare_id=None, previous_user_id=None):
+    """
+    Reporter une affectation créée ou modifiée dans les rosters
+
+    Les valeurs sont lues immédiatement ; la mise à jour retournée est à
+    exécuter après le commit.
+    """
+    affectation_id, gare_id, user_id = str(affectation.pk), affectation.gare_id, affectation.user_id
+    shift = Shift.from_affectation(affectation) if affectation.is_active else None
+
+    def apply():
+        for index, key, previous in (
+            (roster_index, gare_id, previous_gare_id), (user_rosters, user_id, previous_user_id),
+        ):
+            if previous and str(previous) != str(key):
+                index.apply(previous, remove=affectation_id)
+            if key:
+                index.apply(key, remove=affectation_id, add=shift)
+    return apply
+
+
+def affectation_deleted(affectation):
+    """Retirer une affectation supprimée (mise à jour à exécuter après le commit)"""
+    affectation_id, gare_id, user_id = str(affectation.pk), affectation.gare_id, affectation.user_id
+
+    def apply():
+        if gare_id:
+            roster_index.apply(gare_id, remove=affectation_id)
+        user_rosters.apply(user_id, remove=affectation_id)
+    return apply
+
+
+def invalidate_rosters(*gare_ids, user_ids=()):
+    """Périmer les rosters des gares (et des utilisateurs) après une écriture en bloc"""
+    roster_index.invalidate(*gare_ids)
+    user_rosters.invalidate(*user_ids)
+
+
+def user_overlaps(user_id):
+    """Affectations actives de l'utilisateur qui se chevauchent (roster de l'utilisateur)"""
+    return find_overlaps(user_rosters.get(user_id).shifts)
@@ -0,0 +1,72 @@
+"""
+Recherche des utilisateurs par index de mots normalisés
+
+Remplace les ``icontains`` de SearchFilter (parcours complet de auth_user)
+par des recherches par préfixe dans ``UserSearchToken``, servies par index
+B-tree sur PostgreSQL comme sur SQLite.
+"""
+from rest_framework import filters
+
+from core.db import prefix_filter
+from core.text import tokenize
+from .models import UserSearchToken
+from .phone import default_indicatif
+
+# Champs de User alimentant l'index
+SEARCH_FIELDS = ('nom', 'prenom', 'telephone', 'email')
+TOKEN_MAX_LENGTH = UserSearchToken._meta.get_field('token').max_length
+
+
+def user_tokens(user):
+    """Mots indexés d'un utilisateur"""
+    tokens = set()
+    for field in ('nom', 'prenom', 'email'):
+        tokens.update(tokenize(getattr(user, field)))
+    
+    # Téléphone : numéro complet et numéro national (sans l'indicatif par défaut)
+    digits = ''.join(c for c in user.telephone or '' if c.isdigit())
+    if digits:
+        tokens.add(digits)
+        indicatif = default_indicatif().lstrip('+')
+        if digits.startswith(indicatif) and len(digits) > len(indicatif):
+            tokens.add(digits[len(indicatif):])
+    return {token[:TOKEN_MAX_LENGTH] for token in tokens}
+
+
+def search_token_rows(users):
+    """Lignes UserSearchToken à insérer pour des utilisateurs"""
+    return [
+        UserSearchToken(user=user, token=token)
+        for user in users
+        for token in user_tokens(user)
+    ]
+
+
+def index_user(user):
+    """Reconstruire l'index d'un utilisateur"""
+    UserSearchToken.objects.filter(user=user).delete()
+    UserSearchToken.objects.bulk_create(search_token_rows([user]))
+
+
+class UserSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter adossé à l'index de mots
+
+    Chaque mot de la recherche doit être le début d'un mot indexé de
+    l'utilisateur : « oued awa » trouve « Awa Ouédraogo ».
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        
+        prefixes = [token[:TOKEN_MAX_LENGTH] for term in terms for token in tokenize(term)]
+        if not prefixes:
+            return queryset.none()
+        
+        for prefix in prefixes:
+            queryset = queryset.filter(pk__in=UserSearchToken.objects.filter(
+                **prefix_filter('token', prefix)
+            ).values('user_id'))
+        return queryset
@@ -1,12 +1,50 @@
 """
 Serializers pour l'app Authentication
 """
+from datetime import timedelta
+
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from apps.geography.serializers import GareDetailField
+from core.fieldsets import SparseFieldsetMixin
+from core.loaders import BatchedListSerializer
+from core.serializers import FiniteFloatField
 from .models import Role, User, AffectationGare
+from .bulk import bulk_max_users
+from .hashers import get_pipeline
+from .livreurs import livreur_settings
+from .positions import position_settings
+from .tracks import track_settings
+
 
+def create_user(validated_data, password=None):
+    """
+    Créer un utilisateur en un seul INSERT
 
-class RoleSerializer(serializers.ModelSerializer):
+    Le mot de passe est haché dans le pipeline avant l'insertion ; l'unicité
+    du téléphone et de l'email repose sur les contraintes de la base.
+    """
+    if password:
+        validated_data['password'] = get_pipeline().make_password(password)
+    try:
+        with transaction.atomic():
+            return User.objects.create(**validated_data)
+    except IntegrityError:
+        # Chemin d'échec uniquement : identifier le champ en conflit
+        if User.objects.filter(telephone=validated_data.get('telephone')).exists():
+            raise serializers.ValidationError({
+                'telephone': ['Ce numéro de téléphone est déjà utilisé']
+            })
+        if validated_data.get('email') and User.objects.filter(email=validated_data['email']).exists():
+            raise serializers.ValidationError({
+                'email': ['Cet email est déjà utilisé']
+            })
+        raise
+
+
+class RoleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer pour les rôles"""
     
     class Meta:
@@ -15,7 +53,7 @@ class RoleSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer principal pour les utilisateurs"""
     role_detail = RoleSerializer(source='role', read_only=True)
     role_code = serializers.CharField(source='role.nom', read_only=True)
@@ -27,23 +65,20 @@ class UserSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'nom', 'prenom', 'email', 'telephone',
             'role', 'role_detail', 'role_code', 'role_nom',
-            'nom_complet', 'is_active', 'last_login',
+            'nom_complet', 'is_active', 'last_login', 'last_activity',
             'latitude', 'longitude', 'photo_url', 'adresse', 'cnib',
             'created_at', 'updated_at'
         ]
         extra_kwargs = {
             'password': {'write_only': True},
             'id': {'read_only': True},
+            'last_activity': {'read_only': True},
         }
     
     def create(self, validated_data):
         """Créer un utilisateur"""
         password = validated_data.pop('password', None)
-        user = User.objects.create(**validated_data)
-        if password:
-            user.set_password(password)
-            user.save()
-        return user
+        return create_user(validated_data, password)
     
     def update(self, instance, validated_data):
         """Mettre à jour un utilisateur"""
@@ -51,7 +86,7 @@ class UserSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         if password:
-            instance.set_password(password)
+            instance.password = get_pipeline().make_password(password)
         instance.save()
         return instance
 
@@ -76,6 +111,11 @@ class RegisterSerializer(serializers.ModelSerializer):
             'nom', 'prenom', 'telephone', 'email', 
             'password', 'confirm_password', 'role'
         ]
+        # L'unicité est vérifiée par les contraintes de la base à l'insertion
+        extra_kwargs = {
+            'telephone': {'validators': []},
+            'email': {'validators': []},
+        }
     
     def validate(self, data):
         """Valider les données"""
@@ -84,18 +124,6 @@ class RegisterSerializer(serializers.ModelSerializer):
                 'password': 'Les mots de passe ne correspondent pas'
             })
         
-        # Vérifier si le téléphone existe déjà
-        if User.objects.filter(telephone=data['telephone']).exists():
-            raise serializers.ValidationError({
-                'telephone': 'Ce numéro de téléphone est déjà utilisé'
-            })
-        
-        # Vérifier l'email si fourni
-        if data.get('email') and User.objects.filter(email=data['email']).exists():
-            raise serializers.ValidationError({
-                'email': 'Cet email est déjà utilisé'
-            })
-        
         return data
     
     def create(self, validated_data):
@@ -103,11 +131,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         validated_data.pop('confirm_password')
         password = validated_data.pop('password')
         
-        user = User.objects.create(**validated_data)
-        user.set_password(password)
-        user.save()
-        
-        return user
+        return create_user(validated_data, password)
 
 
 class LoginSerializer(serializers.Serializer):
@@ -171,11 +195,96 @@ class ChangePasswordSerializer(serializers.Serializer):
         return data
 
 
-class AffectationGareSerializer(serializers.ModelSerializer):
+class BulkUserSerializer(serializers.Serializer):
+    """Utilisateurs visés par une action groupée (sinon : filtres de l'URL)"""
+    ids = serializers.ListField(child=serializers.UUIDField(), required=False, allow_empty=False)
+    
+    def validate_ids(self, value):
+        max_users = bulk_max_users()
+        if len(value) > max_users:
+            raise serializers.ValidationError(f'Au plus {max_users} utilisateurs par requête')
+        return value
+
+
+class BulkUserUpdateSerializer(BulkUserSerializer):
+    """Action groupée : valeurs à appliquer"""
+    role = serializers.PrimaryKeyRelatedField(
+        queryset=Role.objects.all(), required=False, allow_null=True
+    )
+    is_active = serializers.BooleanField(required=False)
+    
+    def validate(self, data):
+        if 'role' not in data and 'is_active' not in data:
+            raise serializers.ValidationError({
+                'detail': 'Au moins un champ à modifier (role, is_active) est requis'
+            })
+        return data
+
+
+class NearestLivreursSerializer(serializers.Serializer):
+    """Recherche des livreurs proches : k plus proches et/ou rayon (km)"""
+    lat = FiniteFloatField(min_value=-90, max_value=90)
+    lon = FiniteFloatField(min_value=-180, max_value=180)
+    k = serializers.IntegerField(min_value=1, required=False)
+    radius = FiniteFloatField(min_value=0, required=False)
+    
+    def validate(self, data):
+        config = livreur_settings()
+        max_k = config.get('MAX_K', 50)
+        max_radius = config.get('MAX_RADIUS_KM', 100)
+        if data.get('radius', 0) > max_radius:
+            raise serializers.ValidationError({'radius': f'Rayon maximal : {max_radius} km'})
+        # Rayon seul : tous les livreurs du rayon (au plus MAX_K)
+        default_k = max_k if 'radius' in data else config.get('DEFAULT_K', 5)
+        data['k'] = min(data.get('k', default_k), max_k)
+        # Sans rayon : recherche bornée à MAX_RADIUS_KM (loin de tout livreur,
+        # les anneaux de cellules ne s'arrêteraient qu'au bout de la grille)
+        data.setdefault('radius', max_radius)
+        return data
+
+
+class PositionPointSerializer(serializers.Serializer):
+    """Point GPS (horodaté par le téléphone, sinon à la réception)"""
+    lat = FiniteFloatField(min_value=-90, max_value=90)
+    lon = FiniteFloatField(min_value=-180, max_value=180)
+    at = serializers.DateTimeField(required=False)
+    
+    def validate_at(self, value):
+        tolerance = position_settings().get('MAX_CLOCK_SKEW', 300)
+        if (value - timezone.now()).total_seconds() > tolerance:
+            raise serializers.ValidationError('Horodatage dans le futur')
+        return value
+
+
+class PositionBatchSerializer(serializers.Serializer):
+    """Lot de points envoyé par l'application"""
+    points = PositionPointSerializer(many=True, allow_empty=False, max_length=100)
+
+
+class TrackQuerySerializer(serializers.Serializer):
+    """Période d'un trajet (par défaut les dernières 24 heures)"""
+    debut = serializers.DateTimeField(required=False)
+    fin = serializers.DateTimeField(required=False)
+    
+    def validate(self, data):
+        data.setdefault('fin', timezone.now())
+        data.setdefault('debut', data['fin'] - timedelta(days=1))
+        if data['debut'] >= data['fin']:
+            raise serializers.ValidationError({'fin': 'Doit être postérieure au début'})
+        max_days = track_settings().get('MAX_RANGE_DAYS', 31)
+        if data['fin'] - data['debut'] > timedelta(days=max_days):
+            raise serializers.ValidationError({'debut': f'Période limitée à {max_days} jours'})
+        return data
+
+
+class AffectationGareSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer pour les affectations de gares"""
     user_detail = UserSerializer(source='user', read_only=True)
+    gare_detail = GareDetailField(source='gare_id')
     
     class Meta:
         model = AffectationGare
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
+        # Les gares de toute la liste sont chargées en une requête
+        list_serializer_class = BatchedListSerializer
@@ -1,22 +1,157 @@
 """
 Signals pour l'app Authentication
 """
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
-from .models import User
+from core.versions import track_versions
+from .models import Role, User, AffectationGare
+from .cache import invalidate_principal, invalidate_all_principals, bump_token_version
+from .livreurs import invalidate_livreurs, livreur_index, livreur_saved
+from .roster import affectation_deleted, affectation_saved
+from .search import SEARCH_FIELDS, index_user
+
+# Champs dont la modification périme les claims des tokens déjà émis
+CLAIM_FIELDS = {'role', 'role_id', 'is_active'}
+
+# Champs qui placent un utilisateur dans l'index des livreurs
+LIVREUR_FIELDS = {'role', 'role_id', 'is_active', 'latitude', 'longitude'}
+
+# Versions des modèles (ETag des réponses)
+track_versions(User, Role, AffectationGare)
+
+
+@receiver(pre_save, sender=User)
+def user_pre_save(sender, instance, update_fields=None, **kwargs):
+    """Détecter un changement de rôle ou d'activation avant la sauvegarde"""
+    instance._claims_changed = False
+    if instance._state.adding:
+        return
+    if update_fields is not None and not CLAIM_FIELDS & set(update_fields):
+        return
+    previous = User.objects.filter(pk=instance.pk).values('role_id', 'is_active').first()
+    instance._claims_changed = previous is not None and (
+        previous['role_id'] != instance.role_id
+        or previous['is_active'] != instance.is_active
+    )
 
 
 @receiver(post_save, sender=User)
-def user_post_save(sender, instance, created, **kwargs):
+def user_post_save(sender, instance, created, update_fields=None, **kwargs):
     """
     Signal après la sauvegarde d'un utilisateur
     """
+    # Index de recherche (nom, prénom, téléphone, email)
+    if update_fields is None or set(SEARCH_FIELDS) & set(update_fields):
+        index_user(instance)
+    
     if created:
         # Actions à effectuer après la création d'un utilisateur
         print(f"✅ Nouvel utilisateur créé: {instance.nom_complet}")
-        
+
         # Ici on pourrait:
         # - Envoyer un email de bienvenue
         # - Créer une notification
         # - Logger l'événement
         # - etc.
+    else:
+        # Désactivation, changement de mot de passe ou de rôle:
+        # invalider maintenant et après le commit (une requête concurrente
+        # pourrait remettre en cache l'ancienne ligne avant le commit)
+        invalidate_principal(instance.pk)
+        transaction.on_commit(lambda: invalidate_principal(instance.pk))
+        
+        if getattr(instance, '_claims_changed', False):
+            bump_token_version(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_livreur_saved(sender, instance, update_fields=None, **kwargs):
+    """Déplacer ou retirer le livreur dans l'index des positions après le commit"""
+    if update_fields is not None and not LIVREUR_FIELDS & set(update_fields):
+        return
+    if instance.is_livreur or getattr(instance, '_claims_changed', False):
+        transaction.on_commit(livreur_saved(instance))
+
+
+@receiver(post_delete, sender=User)
+def user_post_delete(sender, instance, **kwargs):
+    """Invalider le cache d'un utilisateur supprimé"""
+    invalidate_principal(instance.pk)
+    user_id = instance.pk
+    transaction.on_commit(lambda: livreur_index.update(user_id, None))
+
+
+@receiver(pre_save, sender=Role)
+def role_pre_save(sender, instance, **kwargs):
+    """Détecter un changement de code de rôle"""
+    instance._claims_changed = not instance._state.adding and (
+        Role.objects.filter(pk=instance.pk).exclude(nom=instance.nom).exists()
+    )
+
+
+@receiver(pre_delete, sender=Role)
+def role_pre_delete(sender, instance, **kwargs):
+    """Les utilisateurs du rôle supprimé perdent leur rôle (SET_NULL)"""
+    bump_token_version(*instance.users.values_list('pk', flat=True))
+    transaction.on_commit(invalidate_livreurs)
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def role_changed(sender, instance, **kwargs):
+    """Un rôle modifié invalide tous les principaux en cache"""
+    invalidate_all_principals()
+    transaction.on_commit(invalidate_all_principals)
+    
+    if getattr(instance, '_claims_changed', False):
+        bump_token_version(*instance.users.values_list('pk', flat=True))
+        transaction.on_commit(invalidate_livreurs)
+
+
+def claimed_gare(user_id, gare_id, is_active):
+    """(utilisateur, gare) porté par les claims des tokens, ou None"""
+    return (user_id, gare_id) if is_active and gare_id is not None else None
+
+
+@receiver(pre_save, sender=AffectationGare)
+def affectation_pre_save(sender, instance, **kwargs):
+    """Mémoriser la gare et l'utilisateur précédents (tableaux de service) et la gare des claims"""
+    previous = None if instance._state.adding else (
+        AffectationGare.objects.filter(pk=instance.pk).values('user_id', 'gare_id', 'is_active').first()
+    )
+    instance._previous_gare_id = previous['gare_id'] if previous else None
+    instance._previous_user_id = previous['user_id'] if previous else None
+    instance._previous_claim = claimed_gare(**previous) if previous else None
+
+
+@receiver(post_save, sender=AffectationGare)
+def affectation_changed(sender, instance, **kwargs):
+    """Les gares des claims ne changent qu'avec l'utilisateur, la gare ou l'activation"""
+    previous = getattr(instance, '_previous_claim', None)
+    current = claimed_gare(instance.user_id, instance.gare_id, instance.is_active)
+    if previous != current:
+        bump_token_version(*{claim[0] for claim in (previous, current) if claim})
+
+
+@receiver(post_delete, sender=AffectationGare)
+def affectation_claim_deleted(sender, instance, **kwargs):
+    """Une affectation active supprimée retire sa gare des claims"""
+    if claimed_gare(instance.user_id, instance.gare_id, instance.is_active):
+        bump_token_version(instance.user_id)
+
+
+@receiver(post_save, sender=AffectationGare)
+def affectation_roster_saved(sender, instance, **kwargs):
+    """Mettre à jour le tableau de service de la gare après le commit"""
+    transaction.on_commit(affectation_saved(
+        instance,
+        getattr(instance, '_previous_gare_id', None),
+        getattr(instance, '_previous_user_id', None),
+    ))
+
+
+@receiver(post_delete, sender=AffectationGare)
+def affectation_roster_deleted(sender, instance, **kwargs):
+    """Retirer l'affectation du tableau de service après le commit"""
+    transaction.on_commit(affectation_deleted(instance))
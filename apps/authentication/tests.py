@@ -1,15 +1,47 @@
 """
 Tests pour l'app Authentication
 """
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import uuid
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Role
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from core.geo import GridIndex
+from core.queries import QueryBudgetTestMixin
+from core.versions import get_versions
+from .activity import ActivityBuffer, activity_buffer
+from .bulk import bulk_update_users
+from .cache import get_principal, get_token_version, token_version_key
+from .hashers import CredentialPipeline, HashingOverloaded, get_pipeline
+from .livreurs import MOVES_KEY, MOVES_SEQ_KEY, LivreurIndex, livreur_index
+from .positions import position_buffer
+from .tracks import append_points, iter_track, track_buffer, track_distance
+from .models import AffectationGare, PositionSegment, Role
+from .serializers import AffectationGareSerializer
+from .token_state import BloomFilter, LocMemTokenStateBackend, reset_token_state
+from .views import AffectationGareViewSet, UserViewSet
+from .tokens import ROLE_CLAIM, GARES_CLAIM, VERSION_CLAIM, RoleRefreshToken
 
 User = get_user_model()
 
 
+def tearDownModule():
+    # Écrire l'activité en attente tant que la base de test existe
+    activity_buffer.flush()
+
+
 class RoleModelTest(TestCase):
     """Tests pour le modèle Role"""
     
@@ -122,3 +154,1216 @@ class AuthAPITest(TestCase):
         }
         response = self.client.post('/api/auth/login/', data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PrincipalCacheTest(TestCase):
+    """Tests pour le cache des principaux JWT"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.role = Role.objects.create(
+            nom=Role.CLIENT,
+            description='Client'
+        )
+        self.user = User.objects.create_user(
+            telephone='+22675555555',
+            password='testpass123',
+            nom='Cache',
+            prenom='Test',
+            role=self.role
+        )
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    
+    def test_me_served_from_cache(self):
+        """Le second appel ne touche pas la base"""
+        self.client.get('/api/auth/users/me/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/users/me/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['role_code'], Role.CLIENT)
+    
+    def test_deactivation_invalidates_cache(self):
+        """Un utilisateur désactivé est refusé malgré le cache"""
+        self.client.get('/api/auth/users/me/')
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/api/auth/users/me/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_role_change_invalidates_cache(self):
+        """Modifier un rôle invalide les principaux en cache"""
+        self.client.get('/api/auth/users/me/')
+        self.role.description = 'Client modifié'
+        self.role.save()
+        response = self.client.get('/api/auth/users/me/')
+        self.assertEqual(response.data['role_nom'], 'Client modifié')
+
+
+class RoleClaimsTest(TestCase):
+    """Tests pour les claims de rôle des tokens JWT"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin_role = Role.objects.create(nom=Role.ADMIN, description='Admin')
+        self.client_role = Role.objects.create(nom=Role.CLIENT, description='Client')
+        self.user = User.objects.create_user(
+            telephone='+22676666666',
+            password='testpass123',
+            nom='Claims',
+            prenom='Test',
+            role=self.admin_role
+        )
+    
+    def login(self):
+        response = self.client.post('/api/auth/login/', {
+            'telephone': '+22676666666',
+            'password': 'testpass123'
+        })
+        return response.data['tokens']
+    
+    def test_login_embeds_role_claims(self):
+        """Le token d'accès porte le rôle, les gares et la version"""
+        access = AccessToken(self.login()['access'])
+        self.assertEqual(access[ROLE_CLAIM], Role.ADMIN)
+        self.assertEqual(access[GARES_CLAIM], [])
+        self.assertEqual(access[VERSION_CLAIM], 0)
+    
+    def test_role_change_outdates_claims(self):
+        """Un changement de rôle rend les claims caducs"""
+        tokens = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get('/api/auth/users/').status_code, status.HTTP_200_OK)
+        
+        self.user.role = self.client_role
+        self.user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+        
+        response = self.client.post('/api/auth/users/', {
+            'nom': 'X', 'prenom': 'Y', 'telephone': '+22670101010'
+        })
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_refresh_reissues_claims(self):
+        """Le refresh réémet les claims périmés"""
+        tokens = self.login()
+        self.user.role = self.client_role
+        self.user.save()
+        
+        response = self.client.post('/api/auth/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        access = AccessToken(response.data['access'])
+        self.assertEqual(access[ROLE_CLAIM], Role.CLIENT)
+        self.assertEqual(access[VERSION_CLAIM], 1)
+    
+    def test_affectation_outdates_claims_only_when_gares_change(self):
+        """Seuls l'utilisateur, la gare et l'activation d'une affectation périment les claims"""
+        def version():
+            return User.objects.get(pk=self.user.pk).token_version
+        
+        affectation = AffectationGare.objects.create(user=self.user, gare_id=uuid.uuid4(), type='gerant')
+        self.assertEqual(version(), 1)
+        affectation.commentaire = 'Équipe du matin'
+        affectation.date_fin = date(2030, 1, 1)
+        affectation.save()
+        self.assertEqual(version(), 1)
+        affectation.gare_id = uuid.uuid4()
+        affectation.save()
+        self.assertEqual(version(), 2)
+        affectation.is_active = False
+        affectation.save()
+        self.assertEqual(version(), 3)
+        # Affectation inactive : ni sa suppression ni ses modifications ne comptent
+        affectation.gare_id = uuid.uuid4()
+        affectation.save()
+        affectation.delete()
+        self.assertEqual(version(), 3)
+
+
+class TokenStateTest(TestCase):
+    """Tests pour la liste noire des refresh tokens"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.role = Role.objects.create(nom=Role.CLIENT, description='Client')
+        self.user = User.objects.create_user(
+            telephone='+22677777777',
+            password='testpass123',
+            nom='State',
+            prenom='Test',
+            role=self.role
+        )
+        self.refresh = RoleRefreshToken.for_user(self.user)
+    
+    def test_rotated_token_is_rejected(self):
+        """Un refresh token déjà utilisé est refusé"""
+        data = {'refresh': str(self.refresh)}
+        response = self.client.post('/api/auth/token/refresh/', data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post('/api/auth/token/refresh/', data)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_logout_blacklists_token(self):
+        """Le token de la déconnexion ne peut plus être rafraîchi"""
+        self.client.force_authenticate(self.user)
+        self.client.post('/api/auth/logout/', {'refresh': str(self.refresh)})
+        self.client.force_authenticate(None)
+        response = self.client.post('/api/auth/token/refresh/', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_legacy_blacklist_is_honoured(self):
+        """Un token révoqué dans les tables simplejwt avant le changement de backend reste refusé"""
+        outstanding = OutstandingToken.objects.create(
+            user=self.user, jti=self.refresh['jti'], token=str(self.refresh),
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+        BlacklistedToken.objects.create(token=outstanding)
+        reset_token_state()
+        self.addCleanup(reset_token_state)
+        response = self.client.post('/api/auth/token/refresh/', {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_filter_has_no_false_negative(self):
+        """Le filtre de Bloom ne rate aucun jti ajouté"""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        jtis = [f'jti-{i}' for i in range(1000)]
+        for jti in jtis:
+            bloom.add(jti)
+        self.assertTrue(all(jti in bloom for jti in jtis))
+    
+    def test_purge_expired_tokens(self):
+        """La commande purge les tokens expirés et leur liste noire"""
+        expired = OutstandingToken.objects.create(
+            jti='expired', token='x', expires_at=timezone.now() - timedelta(days=1)
+        )
+        BlacklistedToken.objects.create(token=expired)
+        OutstandingToken.objects.create(
+            jti='valid', token='y', expires_at=timezone.now() + timedelta(days=1)
+        )
+        call_command('purge_tokens', chunk_size=1, stdout=StringIO())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), ['valid'])
+        self.assertFalse(BlacklistedToken.objects.exists())
+    
+    def test_purge_advances_log_floor(self):
+        """Le premier chargement d'un filtre ne parcourt pas les entrées expirées"""
+        backend = LocMemTokenStateBackend()
+        backend.clear()
+        exp = (timezone.now() + timedelta(days=1)).timestamp()
+        for number in range(150):
+            backend.blacklist(f'jti-{number}', exp)
+        # Expiration simulée des 120 premières entrées
+        backend.cache.delete_many([backend.LOG_KEY.format(seq=seq) for seq in range(1, 121)])
+        self.assertEqual(backend.purge_expired(chunk_size=7), 50)
+        self.assertEqual(backend.purge_expired(chunk_size=7), 0)
+        
+        requested = []
+        get_many = backend.cache.get_many
+        backend.cache.get_many = lambda keys: requested.extend(keys) or get_many(keys)
+        jtis, cursor = backend.blacklisted_since(None)
+        self.assertEqual(cursor, 150)
+        self.assertEqual(jtis, [f'jti-{number}' for number in range(120, 150)])
+        self.assertNotIn(backend.LOG_KEY.format(seq=50), requested)
+
+
+class CredentialPipelineTest(TestCase):
+    """Tests pour le hachage des mots de passe"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(nom=Role.CLIENT, description='Client')
+    
+    def test_register_duplicate_telephone(self):
+        """Le doublon est détecté par la contrainte d'unicité"""
+        User.objects.create_user(telephone='+22678888888', password='x', nom='A', prenom='B')
+        response = self.client.post('/api/auth/register/', {
+            'nom': 'Test',
+            'prenom': 'User',
+            'telephone': '+22678888888',
+            'password': 'testpass123',
+            'confirm_password': 'testpass123',
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['telephone'], ['Ce numéro de téléphone est déjà utilisé'])
+    
+    @override_settings(
+        PASSWORD_HASHERS=['apps.authentication.hashers.TunablePBKDF2PasswordHasher'],
+        PASSWORD_HASH_ITERATIONS=1000
+    )
+    def test_iterations_from_settings(self):
+        """Le coût du hachage vient des settings"""
+        self.assertTrue(get_pipeline().make_password('secret').startswith('pbkdf2_sha256$1000$'))
+    
+    def test_overloaded_pipeline(self):
+        """Le pipeline saturé refuse au lieu de mettre en attente"""
+        pipeline = CredentialPipeline(workers=1, max_pending=1, timeout=0)
+        pipeline._slots.acquire()
+        with self.assertRaises(HashingOverloaded):
+            pipeline.make_password('secret')
+    
+    def test_change_password(self):
+        """Changer le mot de passe via le pipeline"""
+        user = User.objects.create_user(
+            telephone='+22679999999', password='ancien123', nom='A', prenom='B'
+        )
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/auth/change-password/', {
+            'old_password': 'ancien123',
+            'new_password': 'nouveau123',
+            'confirm_password': 'nouveau123',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('nouveau123'))
+
+
+class ActivityBufferTest(TestCase):
+    """Tests pour l'écriture différée de last_login / last_activity"""
+    
+    def setUp(self):
+        cache.clear()
+        activity_buffer.flush()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            telephone='+22670202020', password='testpass123', nom='Activ', prenom='Ity'
+        )
+    
+    def test_login_defers_last_login(self):
+        """La connexion n'écrit last_login qu'au flush"""
+        response = self.client.post('/api/auth/login/', {
+            'telephone': '+22670202020', 'password': 'testpass123'
+        })
+        self.assertIsNotNone(response.data['user']['last_login'])
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+        
+        with self.assertNumQueries(2):
+            self.assertEqual(activity_buffer.flush(), 1)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(self.user.last_login, self.user.last_activity)
+    
+    def test_flush_keeps_caches(self):
+        """Le flush ne périme ni les ETag ni les principaux, /me reste à jour"""
+        response = self.client.post('/api/auth/login/', {
+            'telephone': '+22670202020', 'password': 'testpass123'
+        })
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['tokens']['access']}")
+        last_login = self.client.get('/api/auth/users/me/').data['last_login']
+        self.assertIsNotNone(last_login)
+        versions = get_versions(User)
+        activity_buffer.flush()
+        self.assertEqual(get_versions(User), versions)
+        self.assertIsNotNone(get_principal(self.user.pk))
+        self.assertEqual(self.client.get('/api/auth/users/me/').data['last_login'], last_login)
+        # Activité connue : rien de nouveau en attente
+        self.assertIsNone(activity_buffer.pending(self.user.pk))
+    
+    def test_touch_respects_resolution(self):
+        """Une activité récente n'est pas réenregistrée"""
+        now = timezone.now()
+        buffer = ActivityBuffer(flush_interval=0, resolution=60)
+        buffer.touch(self.user, now)
+        self.user.last_activity = now
+        buffer.flush()
+        buffer.touch(self.user, now + timedelta(seconds=30))
+        self.assertIsNone(buffer.pending_value(self.user.pk, 'last_activity'))
+        buffer.touch(self.user, now + timedelta(seconds=90))
+        self.assertIsNotNone(buffer.pending_value(self.user.pk, 'last_activity'))
+
+
+class ImportUsersTest(TestCase):
+    """Tests pour la commande import_users"""
+    
+    def setUp(self):
+        Role.objects.create(nom=Role.CLIENT, description='Client')
+        Role.objects.create(nom=Role.GUICHETIER, description='Guichetier')
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'personnel.csv')
+        with open(self.path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['nom', 'prenom', 'telephone', 'email', 'password', 'role'])
+            writer.writerow(['Ouédraogo', 'Awa', '70 11 22 33', 'awa@example.com', 'secret1', 'guichetier'])
+            writer.writerow(['Sawadogo', 'Ali', '0022670112234', '', 'secret2', ''])
+            writer.writerow(['Kaboré', 'Issa', '70112233', '', 'secret3', ''])
+            writer.writerow(['Traoré', 'Mariam', '70112235', '', 'secret4', 'inconnu'])
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def test_import_with_error_report(self):
+        """Les lignes valides sont créées, les autres rapportées"""
+        call_command('import_users', self.path, processes=0, chunk_size=2, stdout=StringIO())
+        
+        awa = User.objects.get(telephone='+22670112233')
+        self.assertEqual(awa.role.nom, Role.GUICHETIER)
+        self.assertTrue(awa.check_password('secret1'))
+        self.assertTrue(User.objects.filter(telephone='+22670112234', role__nom=Role.CLIENT).exists())
+        
+        with open(f'{self.path}.errors.csv') as handle:
+            errors = list(csv.DictReader(handle))
+        self.assertEqual(sorted(error['ligne'] for error in errors), ['3', '4'])
+        self.assertFalse(os.path.exists(f'{self.path}.progress'))
+    
+    def test_existing_unnormalized_telephone(self):
+        """Un compte existant saisi sans indicatif est reconnu comme doublon"""
+        User.objects.create_user(telephone='70 11 22 33', password='x', nom='A', prenom='B')
+        call_command('import_users', self.path, processes=0, stdout=StringIO())
+        self.assertFalse(User.objects.filter(telephone='+22670112233').exists())
+        with open(f'{self.path}.errors.csv') as handle:
+            errors = {error['ligne']: error['erreur'] for error in csv.DictReader(handle)}
+        self.assertEqual(errors['1'], 'Ce numéro de téléphone est déjà utilisé')
+    
+    def test_malformed_ndjson_lines(self):
+        """Les lignes NDJSON illisibles sont rapportées, les autres importées"""
+        path = os.path.join(self.directory.name, 'personnel.ndjson')
+        with open(path, 'w') as handle:
+            handle.write('{"nom": "Ouédraogo", "prenom": "Awa", "telephone": "70112233"}\n')
+            handle.write('{"nom": "Sawadogo", \n')
+            handle.write('["Kaboré", "Issa"]\n')
+            handle.write('{"nom": "Traoré", "prenom": "Mariam", "telephone": "70112235"}\n')
+        call_command('import_users', path, processes=0, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 2)
+        with open(f'{path}.errors.csv') as handle:
+            errors = {error['ligne']: error['erreur'] for error in csv.DictReader(handle)}
+        self.assertEqual(sorted(errors), ['2', '3'])
+        self.assertTrue(errors['2'].startswith('JSON invalide'))
+        self.assertEqual(errors['3'], 'Objet JSON attendu')
+    
+    def test_resume_skips_committed_lines(self):
+        """--resume reprend après le dernier lot validé"""
+        with open(f'{self.path}.progress', 'w') as handle:
+            json.dump({'ligne': 2, 'crees': 2, 'erreurs': 0}, handle)
+        call_command('import_users', self.path, processes=0, resume=True, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 1)
+        self.assertTrue(User.objects.filter(telephone='+22670112233', nom='Kaboré').exists())
+    
+    def test_header_only_file(self):
+        """Fichier sans ligne : rien à importer, pas d'erreur"""
+        with open(self.path, 'w', newline='') as handle:
+            csv.writer(handle).writerow(['nom', 'prenom', 'telephone', 'email', 'password', 'role'])
+        out = StringIO()
+        call_command('import_users', self.path, processes=0, stdout=out)
+        self.assertIn('0 utilisateurs crees, 0 erreurs', out.getvalue())
+        self.assertEqual(User.objects.count(), 0)
+
+
+class UserSearchTest(TestCase):
+    """Tests pour la recherche indexée des utilisateurs"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.awa = User.objects.create_user(
+            telephone='+22670303030', password='x', nom='Ouédraogo', prenom='Awa',
+            email='awa.oue@example.com'
+        )
+        self.issa = User.objects.create_user(
+            telephone='+22670404040', password='x', nom='Kaboré', prenom='Issa'
+        )
+        self.client.force_authenticate(self.issa)
+    
+    def search(self, query):
+        response = self.client.get('/api/auth/users/', {'search': query})
+        return {user['id'] for user in response.data['results']}
+    
+    def test_accent_insensitive_prefix(self):
+        """La recherche ignore les accents et la casse"""
+        self.assertEqual(self.search('OUEDR'), {str(self.awa.id)})
+        self.assertEqual(self.search('kabo'), {str(self.issa.id)})
+        self.assertEqual(self.search('Ouédraogo awa'), {str(self.awa.id)})
+        self.assertEqual(self.search('ouedraogo issa'), set())
+    
+    def test_telephone_and_email(self):
+        """Le téléphone (avec ou sans indicatif) et l'email sont indexés"""
+        self.assertEqual(self.search('7040'), {str(self.issa.id)})
+        self.assertEqual(self.search('+2267030'), {str(self.awa.id)})
+        self.assertEqual(self.search('awa.oue@'), {str(self.awa.id)})
+    
+    def test_index_follows_updates(self):
+        """L'index suit les modifications du nom"""
+        self.issa.nom = 'Zongo'
+        self.issa.save()
+        self.assertEqual(self.search('kabore'), set())
+        self.assertEqual(self.search('zon'), {str(self.issa.id)})
+
+
+class TelephoneLookupTest(TestCase):
+    """Tests pour la recherche par téléphone au guichet"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        guichetier = Role.objects.create(nom=Role.GUICHETIER, description='Guichetier')
+        self.staff = User.objects.create_user(
+            telephone='+22670505050', password='x', nom='Guichet', prenom='Ier', role=guichetier
+        )
+        self.customer = User.objects.create_user(
+            telephone='76 12 34 56', password='x', nom='Client', prenom='Un'
+        )
+        self.client.force_authenticate(self.staff)
+    
+    def lookup(self, **params):
+        response = self.client.get('/api/auth/users/telephone/', params)
+        return response, [user['id'] for user in response.data] if response.status_code == 200 else None
+    
+    def test_normalized_columns(self):
+        """Le téléphone est normalisé et inversé à la sauvegarde"""
+        self.assertEqual(self.customer.telephone_e164, '+22676123456')
+        self.assertEqual(self.customer.telephone_reversed, '65432167622')
+    
+    def test_suffix_and_prefix(self):
+        """Recherche par les derniers ou les premiers chiffres"""
+        self.assertEqual(self.lookup(suffix='3456')[1], [str(self.customer.id)])
+        self.assertEqual(self.lookup(prefix='7612')[1], [str(self.customer.id)])
+        self.assertEqual(self.lookup(prefix='+2267050')[1], [str(self.staff.id)])
+        self.assertEqual(self.lookup(suffix='12')[0].status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_reserved_to_staff(self):
+        """Les clients n'ont pas accès à la recherche"""
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.lookup(suffix='3456')[0].status_code, status.HTTP_403_FORBIDDEN)
+
+
+class KeysetPaginationTest(TestCase):
+    """Tests pour la pagination par curseur"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [
+            User.objects.create_user(
+                telephone=f'+2267060{index:04d}', password='x', nom=f'Nom{index % 3}', prenom='P'
+            )
+            for index in range(7)
+        ]
+        # Horodatages identiques : l'id départage
+        User.objects.filter(pk__in=[u.pk for u in self.users[2:5]]).update(
+            created_at=self.users[2].created_at
+        )
+        self.client.force_authenticate(self.users[0])
+    
+    def walk(self, params):
+        ids, url, pages = [], '/api/auth/users/', []
+        while url:
+            response = self.client.get(url, params if not pages else None)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            pages.append(response.data)
+            ids += [user['id'] for user in response.data['results']]
+            url = response.data['next']
+        return ids, pages
+    
+    def test_walk_forward_and_back(self):
+        """Chaque utilisateur apparaît une fois, dans l'ordre (created_at, id) décroissant"""
+        ids, pages = self.walk({'pagination': 'keyset', 'page_size': 3})
+        expected = [
+            str(pk) for pk in User.objects.order_by('-created_at', '-id').values_list('pk', flat=True)
+        ]
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+        
+        back = self.client.get(pages[-1]['previous']).data
+        self.assertEqual([user['id'] for user in back['results']], expected[3:6])
+        self.assertEqual(back['next'], pages[1]['next'])
+    
+    def test_ordering_field(self):
+        """Le tri demandé (ordering_fields) devient la clé, complété par l'id"""
+        ids, _ = self.walk({'pagination': 'keyset', 'page_size': 2, 'ordering': 'nom'})
+        expected = [str(pk) for pk in User.objects.order_by('nom', 'id').values_list('pk', flat=True)]
+        self.assertEqual(ids, expected)
+    
+    def test_page_mode_and_invalid_cursor(self):
+        """Le mode page reste le défaut ; un curseur corrompu donne un 404"""
+        self.assertEqual(self.client.get('/api/auth/users/').data['count'], 7)
+        response = self.client.get('/api/auth/users/', {'cursor': 'pas-un-curseur'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CompiledSerializerTest(TestCase):
+    """Tests pour la sérialisation compilée des listes"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        role = Role.objects.create(nom=Role.LIVREUR, description='Livreur')
+        self.user = User.objects.create_user(
+            telephone='+22670808080', password='x', nom='Sawadogo', prenom='Ali', role=role,
+            email='ali@example.com', latitude='12.3714277', longitude='-1.5196603',
+            last_login=timezone.now()
+        )
+        User.objects.create_user(telephone='+22670909090', password='x', nom='Zongo', prenom='Fati')
+        self.client.force_authenticate(self.user)
+    
+    def test_identical_to_drf(self):
+        """Même JSON, octet pour octet, que UserSerializer (avec et sans rôle)"""
+        from rest_framework.renderers import JSONRenderer
+        from core.serializers import CompiledSerializer
+        from .serializers import UserSerializer
+        
+        queryset = User.objects.select_related('role').order_by('nom')
+        compiled = CompiledSerializer(UserSerializer, depends={'nom_complet': ('nom', 'prenom')})
+        expected = JSONRenderer().render(UserSerializer(queryset, many=True).data)
+        self.assertEqual(JSONRenderer().render(compiled.data(compiled.records(queryset))), expected)
+        
+        response = self.client.get('/api/auth/users/', {'ordering': 'nom'})
+        self.assertEqual(
+            JSONRenderer().render(response.data['results']), expected
+        )
+        # Sans rôle, role_code et role_nom sont omis comme par DRF
+        self.assertNotIn('role_code', response.data['results'][1])
+        self.assertIsNone(response.data['results'][1]['role_detail'])
+
+
+class QueryBudgetTest(QueryBudgetTestMixin, TestCase):
+    """Tests pour les budgets de requêtes"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        for index, code in enumerate([Role.LIVREUR, Role.GUICHETIER, Role.COLISSIER]):
+            role = Role.objects.create(nom=code, description=code)
+            user = User.objects.create_user(
+                telephone=f'+2267011{index:04d}', password='x', nom='N', prenom='P', role=role
+            )
+            AffectationGare.objects.create(user=user, type=AffectationGare.TYPE_GUICHETIER)
+        self.client.force_authenticate(user)
+    
+    def test_list_endpoints_within_budget(self):
+        """Les listes tiennent leur budget, sans requête répétée"""
+        with self.assertQueryBudget(AffectationGareViewSet, 'list', max_repeats=1):
+            response = self.client.get('/api/auth/affectations/')
+        self.assertEqual(len(response.data['results']), 3)
+        with self.assertQueryBudget(UserViewSet, 'list', max_repeats=1):
+            self.client.get('/api/auth/users/')
+    
+    def test_detects_n_plus_one(self):
+        """Une relation non chargée est signalée comme N+1"""
+        with self.assertRaises(AssertionError) as error:
+            with self.assertQueryBudget(max_repeats=1):
+                AffectationGareSerializer(
+                    AffectationGare.objects.select_related('user'), many=True
+                ).data
+        self.assertIn('N+1', str(error.exception))
+    
+    def test_middleware_header(self):
+        """Le middleware de développement expose le nombre de requêtes"""
+        response = self.client.get('/api/auth/affectations/')
+        self.assertEqual(response['X-Query-Count'], '2')
+
+
+class GareLoaderTest(QueryBudgetTestMixin, TestCase):
+    """Tests pour la résolution groupée des gares des affectations"""
+    
+    def setUp(self):
+        from apps.geography.models import Pays, Ville, Gare
+        self.client = APIClient()
+        ville = Ville.objects.create(
+            nom='Ouagadougou', pays=Pays.objects.create(nom='Burkina Faso', code='BF', indicatif='+226')
+        )
+        self.gares = [Gare.objects.create(nom=f'Gare {n}', ville=ville) for n in (1, 2)]
+        self.user = User.objects.create_user(telephone='+22670121212', password='x', nom='N', prenom='P')
+        for gare_id in (self.gares[0].pk, self.gares[1].pk, self.gares[0].pk, None):
+            AffectationGare.objects.create(
+                user=self.user, gare_id=gare_id, type=AffectationGare.TYPE_COLISSIER
+            )
+        self.client.force_authenticate(self.user)
+    
+    def test_gares_resolved_in_one_query(self):
+        """Une seule requête pour les gares de toute la liste"""
+        with self.assertQueryBudget(AffectationGareViewSet, 'list', max_repeats=1) as recorder:
+            response = self.client.get('/api/auth/affectations/')
+        gare_queries = [sql for sql in recorder.queries if 'geography_gare' in sql]
+        self.assertEqual(len(gare_queries), 1)
+        
+        details = {
+            (row['gare_id'] and str(row['gare_id'])): row['gare_detail'] for row in response.data['results']
+        }
+        self.assertEqual(details[str(self.gares[1].pk)]['nom'], 'Gare 2')
+        self.assertEqual(details[str(self.gares[0].pk)]['ville_nom'], 'Ouagadougou')
+        self.assertIsNone(details[None])
+    
+    def test_request_cache(self):
+        """Le loader est partagé et mis en cache pour la requête"""
+        from django.test import RequestFactory
+        from apps.geography.loaders import gare_loader
+        
+        request = RequestFactory().get('/')
+        loader = gare_loader(request)
+        self.assertIs(gare_loader(request), loader)
+        with self.assertNumQueries(1):
+            loader.load_many([self.gares[0].pk, self.gares[1].pk])
+            self.assertEqual(loader.load(self.gares[0].pk).nom, 'Gare 1')
+
+
+class RosterTest(TestCase):
+    """Tests pour le tableau de service des gares"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.gare, self.autre_gare = str(uuid.uuid4()), str(uuid.uuid4())
+        gerant = Role.objects.create(nom=Role.GERANT, description='Gérant')
+        self.gerant = User.objects.create_user(
+            telephone='+22670131313', password='x', nom='Gérant', prenom='Un', role=gerant
+        )
+        self.agent = User.objects.create_user(
+            telephone='+22670141414', password='x', nom='Agent', prenom='Deux'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            AffectationGare.objects.create(
+                user=self.gerant, gare_id=self.gare, type=AffectationGare.TYPE_GERANT
+            )
+            self.mai = AffectationGare.objects.create(
+                user=self.agent, gare_id=self.gare, type=AffectationGare.TYPE_GUICHETIER,
+                date_debut='2024-05-01', date_fin='2024-05-31'
+            )
+        self.client.force_authenticate(self.gerant)
+    
+    def roster(self, date, gare=None):
+        response = self.client.get(
+            '/api/auth/affectations/roster/', {'gare': gare or self.gare, 'date': date}
+        )
+        if response.status_code != status.HTTP_200_OK:
+            return response.status_code
+        return sorted(row['user'] for row in response.data['personnel'])
+    
+    def test_point_in_time(self):
+        """Le personnel dépend de la date demandée"""
+        self.assertEqual(self.roster('2024-05-15'), sorted([str(self.gerant.pk), str(self.agent.pk)]))
+        self.assertEqual(self.roster('2024-06-01'), [str(self.gerant.pk)])
+        self.assertEqual(self.roster('2024-13-01'), status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.roster('2024-05-15', gare=self.autre_gare), status.HTTP_403_FORBIDDEN)
+    
+    def test_incremental_updates(self):
+        """Les modifications sont reportées sans reconstruire depuis la base"""
+        from .roster import on_duty
+        day = date(2024, 6, 10)
+        on_duty(self.gare, day)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mai.date_fin = date(2024, 6, 30)
+            self.mai.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(on_duty(self.gare, day)), 2)
+            self.assertEqual(len(on_duty(self.gare, day)), 2)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mai.gare_id = self.autre_gare
+            self.mai.save()
+        self.assertEqual(len(on_duty(self.gare, day)), 1)
+        self.assertEqual(len(on_duty(self.autre_gare, day)), 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mai.delete()
+        self.assertEqual(on_duty(self.autre_gare, day), [])
+    
+    def test_open_ended_shifts(self):
+        """Affectations sans début ou sans fin rangées à part, résultats inchangés"""
+        from .roster import Roster, Shift
+        bounds = [
+            (date(2024, 5, 1), date(2024, 5, 31)), (date(2024, 5, 20), date(2024, 6, 5)),
+            (date(2024, 6, 1), date.max), (date.min, date(2024, 5, 10)), (date.min, date.max),
+        ]
+        shifts = [Shift(debut, fin, str(index), 'u', 'guichetier') for index, (debut, fin) in enumerate(bounds)]
+        roster = Roster(shifts)
+        self.assertEqual(roster.max_length, 30)
+        for day in (date(2024, 4, 1), date(2024, 5, 5), date(2024, 5, 25), date(2024, 6, 3), date(2025, 1, 1)):
+            self.assertEqual(
+                roster.on(day), sorted(shift for shift in shifts if shift.debut <= day <= shift.fin)
+            )
+    
+    def test_overlaps(self):
+        """Deux affectations simultanées d'un même agent sont signalées"""
+        with self.captureOnCommitCallbacks(execute=True):
+            AffectationGare.objects.create(
+                user=self.agent, gare_id=self.autre_gare, type=AffectationGare.TYPE_COLISSIER,
+                date_debut='2024-05-20'
+            )
+            AffectationGare.objects.create(
+                user=self.agent, gare_id=self.autre_gare, type=AffectationGare.TYPE_COLISSIER,
+                date_debut='2024-01-01', date_fin='2024-04-30'
+            )
+        response = self.client.get('/api/auth/affectations/chevauchements/', {'user': self.agent.pk})
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(
+            {row['date_debut'] for row in response.data[0]['affectations']},
+            {'2024-05-01', '2024-05-20'}
+        )
+        
+        # Roster de l'utilisateur en mémoire, tenu à jour sans requête
+        from .roster import user_overlaps
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mai.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(user_overlaps(self.agent.pk), [])
+
+
+class BulkUserActionsTest(TestCase):
+    """Tests pour les actions groupées sur les utilisateurs"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_role = Role.objects.create(nom=Role.ADMIN, description='Admin')
+        self.admin = User.objects.create_user(
+            telephone='+22670151515', password='x', nom='Admin', prenom='A', role=self.admin_role
+        )
+        self.gare = uuid.uuid4()
+        self.staff = [
+            User.objects.create_user(
+                telephone=f'+2267016{index:04d}', password='x', nom='Agent', prenom=str(index)
+            )
+            for index in range(3)
+        ]
+        for user in self.staff[:2]:
+            AffectationGare.objects.create(
+                user=user, gare_id=self.gare, type=AffectationGare.TYPE_GUICHETIER
+            )
+        self.client.force_authenticate(self.admin)
+    
+    def test_deactivate_by_ids(self):
+        """Un UPDATE pour le lot, statut par id, version des claims incrémentée"""
+        self.staff[2].is_active = False
+        self.staff[2].save()
+        version = User.objects.get(pk=self.staff[0].pk).token_version
+        missing = uuid.uuid4()
+        ids = [str(self.staff[0].pk), str(self.staff[2].pk), str(missing), str(self.admin.pk)]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/users/bulk-deactivate/', {'ids': ids}, format='json')
+        self.assertEqual(response.data['results'], {
+            ids[0]: 'updated', ids[1]: 'unchanged', ids[2]: 'not_found', ids[3]: 'skipped',
+        })
+        self.staff[0].refresh_from_db()
+        self.assertFalse(self.staff[0].is_active)
+        self.assertEqual(self.staff[0].token_version, version + 1)
+        self.assertTrue(User.objects.get(pk=self.admin.pk).is_active)
+    
+    def test_token_version_cached_before_commit(self):
+        """Une version lue avant le commit (autre requête) ne reste pas en cache"""
+        version = get_token_version(self.staff[0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_update_users([self.staff[0].pk], {'is_active': False})
+            # Lecture concurrente : ancienne version remise en cache
+            cache.set(token_version_key(self.staff[0].pk), version, None)
+        self.assertEqual(get_token_version(self.staff[0].pk), version + 1)
+    
+    def test_by_filter_and_update(self):
+        """Sélection par filtre (gare) puis changement de rôle"""
+        response = self.client.post(f'/api/auth/users/bulk-deactivate/?gare={self.gare}')
+        self.assertEqual(
+            set(response.data['results']), {str(user.pk) for user in self.staff[:2]}
+        )
+        self.assertEqual(User.objects.filter(is_active=False).count(), 2)
+        
+        response = self.client.post('/api/auth/users/bulk-update/', {
+            'ids': [str(self.staff[2].pk)], 'role': str(self.admin_role.pk), 'is_active': True
+        }, format='json')
+        self.assertEqual(response.data['results'], {str(self.staff[2].pk): 'updated'})
+        self.assertEqual(User.objects.get(pk=self.staff[2].pk).role_id, self.admin_role.pk)
+        
+        self.assertEqual(
+            self.client.post('/api/auth/users/bulk-activate/').status_code,
+            status.HTTP_400_BAD_REQUEST
+        )
+    
+    @override_settings(AUTH_BULK={'MAX_USERS': 1})
+    def test_max_users_setting(self):
+        """Une seule limite, par liste ids comme par filtre"""
+        response = self.client.post('/api/auth/users/bulk-deactivate/', {
+            'ids': [str(user.pk) for user in self.staff[:2]]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ids', response.data)
+        response = self.client.post(f'/api/auth/users/bulk-deactivate/?gare={self.gare}')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(User.objects.filter(is_active=False).exists())
+    
+    def test_admin_only(self):
+        """Actions groupées et unitaires réservées aux administrateurs"""
+        self.client.force_authenticate(self.staff[0])
+        ids = {'ids': [str(self.staff[1].pk)]}
+        self.assertEqual(
+            self.client.post('/api/auth/users/bulk-deactivate/', ids, format='json').status_code,
+            status.HTTP_403_FORBIDDEN
+        )
+        self.assertEqual(
+            self.client.post(f'/api/auth/users/{self.staff[1].pk}/deactivate/').status_code,
+            status.HTTP_403_FORBIDDEN
+        )
+
+
+class ConditionalGetTest(TestCase):
+    """Tests pour les GET conditionnels (ETag / Last-Modified)"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            telephone='+22670000001', password='x', nom='Ouedraogo', prenom='Awa'
+        )
+        self.client.force_authenticate(self.user)
+    
+    def test_list_not_modified(self):
+        """304 tant que les utilisateurs sont inchangés, nouvel ETag ensuite"""
+        response = self.client.get('/api/auth/users/')
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+        
+        response = self.client.get('/api/auth/users/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(response.content)
+        
+        # L'ETag dépend de l'URL (filtres, pagination)
+        response = self.client.get('/api/auth/users/?is_active=true', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(telephone='+22670000002', password='x', nom='Kabore', prenom='Ali')
+        response = self.client.get('/api/auth/users/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['count'], 2)
+    
+    def test_bulk_update_changes_etag(self):
+        """Les écritures sans signals (update()) font aussi avancer la version"""
+        admin_role = Role.objects.create(nom=Role.ADMIN, description='Admin')
+        admin = User.objects.create_user(
+            telephone='+22670000002', password='x', nom='Admin', prenom='A', role=admin_role
+        )
+        self.client.force_authenticate(admin)
+        etag = self.client.get('/api/auth/users/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/api/auth/users/bulk-deactivate/', {'ids': [str(self.user.pk)]}, format='json'
+            )
+        response = self.client.get('/api/auth/users/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_me_not_modified(self):
+        """/me/ revalidé sur la ligne et l'activité de l'utilisateur"""
+        etag = self.client.get('/api/auth/users/me/')['ETag']
+        response = self.client.get('/api/auth/users/me/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        activity_buffer.touch(self.user)
+        try:
+            response = self.client.get('/api/auth/users/me/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        finally:
+            activity_buffer.flush()
+
+
+class SparseFieldsetTest(TestCase):
+    """Tests pour ?fields= et ?expand= sur les utilisateurs et affectations"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.role = Role.objects.create(nom=Role.GUICHETIER, description='Guichetier')
+        self.user = User.objects.create_user(
+            telephone='+22670000001', password='x', nom='Ouedraogo', prenom='Awa', role=self.role
+        )
+        self.affectation = AffectationGare.objects.create(
+            user=self.user, gare_id=uuid.uuid4(), type=AffectationGare.TYPE_GUICHETIER
+        )
+        self.client.force_authenticate(self.user)
+    
+    def test_user_fields(self):
+        """Liste compilée et détail restreints, propriété résolue par depends"""
+        response = self.client.get('/api/auth/users/?fields=id,nom_complet,role_detail.nom')
+        self.assertEqual(response.data['results'], [{
+            'id': str(self.user.pk), 'nom_complet': 'Awa Ouedraogo',
+            'role_detail': {'nom': Role.GUICHETIER},
+        }])
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/auth/users/{self.user.pk}/?fields=nom_complet,is_active')
+        self.assertEqual(response.data, {'nom_complet': 'Awa Ouedraogo', 'is_active': True})
+    
+    def test_affectation_expand(self):
+        """expand= vide : ni utilisateur ni gare développés (aucune requête de gare)"""
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/auth/affectations/?expand=')
+        [affectation] = response.data['results']
+        self.assertNotIn('user_detail', affectation)
+        self.assertNotIn('gare_detail', affectation)
+        self.assertEqual(affectation['user'], self.user.pk)
+
+
+class LivreurIndexTest(TestCase):
+    """Tests pour l'index des positions des livreurs"""
+    
+    def setUp(self):
+        cache.clear()
+        livreur_index.invalidate()
+        self.client = APIClient()
+        self.livreur_role = Role.objects.create(nom=Role.LIVREUR, description='Livreur')
+        admin_role = Role.objects.create(nom=Role.ADMIN, description='Admin')
+        self.admin = User.objects.create_user(
+            telephone='+22670190000', password='x', nom='Admin', prenom='A', role=admin_role,
+            latitude='12.37000000', longitude='-1.52000000',
+        )
+        self.livreurs = [
+            User.objects.create_user(
+                telephone=f'+2267019{index:04d}', password='x', nom='Livreur', prenom=str(index),
+                role=self.livreur_role, latitude=f'{12.37 + index * 0.01:.8f}', longitude='-1.52000000',
+            )
+            for index in range(1, 4)
+        ]
+        self.client.force_authenticate(self.admin)
+        self.url = '/api/auth/users/livreurs-proches/?lat=12.37&lon=-1.52'
+    
+    def test_nearest_and_radius(self):
+        """k plus proches par distance croissante, rayon en km, livreurs seulement"""
+        response = self.client.get(self.url + '&k=2&fields=id')
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [str(user.pk) for user in self.livreurs[:2]]
+        )
+        self.assertAlmostEqual(response.data['results'][0]['distance'], 1.112, places=3)
+        
+        response = self.client.get(self.url + '&radius=2.5')
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(self.client.get(self.url + '&radius=500').status_code, 400)
+    
+    def test_far_query_bounded(self):
+        """Loin de tout livreur : rayon maximal par défaut, cellules occupées parcourues"""
+        response = self.client.get('/api/auth/users/livreurs-proches/?lat=5.36&lon=-4.0')
+        self.assertEqual(response.data['count'], 0)
+        index = GridIndex(
+            [(user.pk, user.latitude, user.longitude) for user in self.livreurs], cell_deg=0.01
+        )
+        self.assertEqual(
+            [key for _, key in index.nearest(5.36, -4.0, 2)], [user.pk for user in self.livreurs[:2]]
+        )
+        for query in ('lat=nan&lon=-1.5', 'lat=12.37&lon=inf', 'lat=12.37&lon=-1.5&radius=nan'):
+            response = self.client.get(f'/api/auth/users/livreurs-proches/?{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_writes_do_not_mutate_read_structures(self):
+        """Une lecture en cours garde ses listes de points : les écritures les remplacent"""
+        index = GridIndex([(1, 12.37, -1.52)], cell_deg=0.1)
+        cells = list(index.cells)
+        points = index.cells[cells[0]]
+        index.add(2, 12.371, -1.521)
+        index.remove(1)
+        self.assertEqual([point[3] for point in points], [1])
+        self.assertEqual(list(index.cells), cells)
+        self.assertEqual([key for _, key in index.nearest(12.37, -1.52, 2)], [2])
+    
+    def test_live_updates(self):
+        """Déplacement, désactivation et changement de rôle pris en compte"""
+        self.client.get(self.url)
+        far = self.livreurs[2]
+        far.latitude = '12.36900000'
+        with self.captureOnCommitCallbacks(execute=True):
+            far.save(update_fields=['latitude'])
+        self.livreurs[0].is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.livreurs[0].save()
+        response = self.client.get(self.url + '&k=5&fields=id')
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [str(far.pk), str(self.livreurs[1].pk)]
+        )
+        
+        # Écriture en bloc : index reconstruit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/auth/users/bulk-update/', {
+                'ids': [str(far.pk)], 'role': str(self.admin.role_id),
+            }, format='json')
+        response = self.client.get(self.url + '&fields=id')
+        self.assertEqual([item['id'] for item in response.data['results']], [str(self.livreurs[1].pk)])
+    
+    def test_worker_sync(self):
+        """Un autre worker (génération avancée) reconstruit sa grille"""
+        self.assertEqual(len(livreur_index.nearest(12.37, -1.52, 10)), 3)
+        User.objects.filter(pk=self.livreurs[1].pk).update(latitude=None)
+        cache.incr('auth:livreurs:gen')
+        with override_settings(AUTH_LIVREUR_INDEX={'SYNC_INTERVAL': 0}):
+            self.assertEqual(len(livreur_index.nearest(12.37, -1.52, 10)), 2)
+
+
+class PositionIngestionTest(TestCase):
+    """Tests pour l'ingestion des positions GPS"""
+    
+    def setUp(self):
+        cache.clear()
+        position_buffer.flush()
+        livreur_index.invalidate()
+        self.client = APIClient()
+        role = Role.objects.create(nom=Role.LIVREUR, description='Livreur')
+        self.livreur = User.objects.create_user(
+            telephone='+22670200001', password='x', nom='Livreur', prenom='A', role=role,
+        )
+        self.client.force_authenticate(self.livreur)
+        self.url = '/api/auth/users/positions/'
+    
+    def tearDown(self):
+        position_buffer.flush()
+        track_buffer.flush()
+    
+    def test_batch_coalesced(self):
+        """Dernier point du lot retenu, une écriture groupée, updated_at inchangé"""
+        updated_at = self.livreur.updated_at
+        now = timezone.now()
+        response = self.client.post(self.url, {'points': [
+            {'lat': 12.38, 'lon': -1.51, 'at': (now - timedelta(seconds=5)).isoformat()},
+            {'lat': 12.37, 'lon': -1.52, 'at': now.isoformat()},
+            {'lat': 12.36, 'lon': -1.53, 'at': (now - timedelta(seconds=10)).isoformat()},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['position']['latitude'], '12.37000000')
+        
+        # Point plus ancien que la position connue : ignoré
+        response = self.client.post(self.url, {'points': [
+            {'lat': 1, 'lon': 1, 'at': (now - timedelta(minutes=1)).isoformat()},
+        ]}, format='json')
+        self.assertIsNone(response.data['position'])
+        
+        # Position visible avant l'écriture (/me/, index des livreurs)
+        self.assertEqual(self.client.get('/api/auth/users/me/').data['latitude'], '12.37000000')
+        self.assertEqual(livreur_index.nearest(12.37, -1.52, 1)[0][1], self.livreur.pk)
+        self.assertIsNone(User.objects.get(pk=self.livreur.pk).latitude)
+        
+        with self.assertNumQueries(1):
+            self.assertEqual(position_buffer.flush(), 1)
+        user = User.objects.get(pk=self.livreur.pk)
+        self.assertEqual((str(user.latitude), str(user.longitude)), ('12.37000000', '-1.52000000'))
+        self.assertEqual(user.updated_at, updated_at)
+    
+    def test_generation_and_principal(self):
+        """Ni les points ni le flush ne font reconstruire les index ou périmer le principal"""
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.livreur).access_token}')
+        self.client.get('/api/auth/users/me/')
+        generation, versions = livreur_index.generation(), get_versions(User)
+        for lat in (12.3, 11.0):
+            self.client.post(self.url, {'points': [{'lat': lat, 'lon': -1.5}]}, format='json')
+        self.assertEqual(livreur_index.generation(), generation)
+        self.assertEqual(livreur_index.nearest(11.0, -1.5, 1)[0][1], self.livreur.pk)
+        
+        position_buffer.flush()
+        self.assertEqual(livreur_index.generation(), generation)
+        self.assertEqual(get_versions(User), versions)
+        self.assertIsNotNone(get_principal(self.livreur.pk))
+        self.assertEqual(self.client.get('/api/auth/users/me/').data['latitude'], '11.00000000')
+    
+    def test_moves_published_to_other_workers(self):
+        """Un autre worker applique les déplacements publiés sans reconstruire sa grille"""
+        other = LivreurIndex()
+        other.index()
+        now = timezone.now()
+        self.client.post(self.url, {'points': [{'lat': 11.0, 'lon': -1.5, 'at': now.isoformat()}]}, format='json')
+        position_buffer.flush()
+        with self.assertNumQueries(0), self.settings(AUTH_LIVREUR_INDEX={'SYNC_INTERVAL': 0}):
+            self.assertEqual(other.nearest(11.0, -1.5, 1)[0], (0.0, self.livreur.pk))
+        
+        # Lot manquant (expiré) : grille reconstruite
+        cache.delete(MOVES_KEY.format(cache.get(MOVES_SEQ_KEY)))
+        other._moves -= 1
+        with self.assertNumQueries(1), self.settings(AUTH_LIVREUR_INDEX={'SYNC_INTERVAL': 0}):
+            self.assertEqual(other.nearest(11.0, -1.5, 1)[0][1], self.livreur.pk)
+    
+    def test_validation(self):
+        """Lot vide, coordonnées hors bornes ou non finies et horodatage futur refusés"""
+        future = (timezone.now() + timedelta(hours=1)).isoformat()
+        for points in (
+            [], [{'lat': 91, 'lon': 0}], [{'lat': 1, 'lon': 1, 'at': future}],
+            [{'lat': 'nan', 'lon': -1.5}], [{'lat': 12.3, 'lon': '-inf'}],
+        ):
+            response = self.client.post(self.url, {'points': points}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Rien n'a été mis en attente
+        self.assertIsNone(position_buffer.pending(self.livreur.pk))
+        self.assertIsNone(track_buffer.pending(self.livreur.pk))
+
+
+class TrackHistoryTest(TestCase):
+    """Tests pour l'historique des positions"""
+    
+    def setUp(self):
+        track_buffer.flush()
+        self.client = APIClient()
+        self.livreur = User.objects.create_user(
+            telephone='+22670200001', password='x', nom='Livreur', prenom='A',
+            role=Role.objects.create(nom=Role.LIVREUR, description='Livreur'),
+        )
+        self.gerant = User.objects.create_user(
+            telephone='+22670200002', password='x', nom='Gerant', prenom='B',
+            role=Role.objects.create(nom=Role.GERANT, description='Gérant'),
+        )
+        self.start = timezone.now().replace(minute=50, second=0, microsecond=0) - timedelta(days=1)
+    
+    def tearDown(self):
+        position_buffer.flush()
+        track_buffer.flush()
+    
+    def test_append_and_iterate(self):
+        """Points répartis par heure, triés, doublons ignorés, fusion des ajouts"""
+        at = [self.start + timedelta(minutes=minutes) for minutes in range(0, 20, 2)]
+        points = [(12.3 + index / 1000, -1.5, moment) for index, moment in enumerate(at)]
+        self.assertEqual(append_points({self.livreur.pk: points[3:]}), 2)
+        # Utilisateurs, une lecture et une mise à jour pour les deux segments (+ savepoint)
+        with self.assertNumQueries(5):
+            append_points({self.livreur.pk: points[:6]})
+        
+        segments = PositionSegment.objects.filter(user=self.livreur).order_by('debut')
+        self.assertEqual([segment.nombre for segment in segments], [5, 5])
+        track = list(iter_track(self.livreur.pk))
+        self.assertEqual([moment for moment, _, _ in track], at)
+        self.assertEqual(track[3][1:], (12.303, -1.5))
+        self.assertAlmostEqual(track_distance(track), 1.001, places=2)
+        
+        window = list(iter_track(self.livreur.pk, at[2], at[7]))
+        self.assertEqual([moment for moment, _, _ in window], at[2:8])
+    
+    def test_unwritable_points_dropped(self):
+        """Points non finis et utilisateur supprimé abandonnés sans bloquer le buffer"""
+        ghost = User.objects.create_user(telephone='+22670200003', password='x', nom='Parti', prenom='C')
+        track_buffer.record(ghost.pk, [(12.3, -1.5, self.start)])
+        track_buffer.record(self.livreur.pk, [(float('nan'), -1.5, self.start), (12.3, float('inf'), self.start)])
+        ghost_id = ghost.pk
+        ghost.delete()
+        track_buffer.record(self.livreur.pk, [(12.3, -1.5, self.start)])
+        self.assertEqual(track_buffer.flush(), 2)
+        self.assertIsNone(track_buffer.pending(ghost_id))
+        self.assertEqual(list(PositionSegment.objects.values_list('user_id', 'nombre')), [(self.livreur.pk, 1)])
+        
+        track_buffer.record(self.livreur.pk, [(12.4, -1.5, self.start + timedelta(minutes=1))])
+        self.assertEqual(track_buffer.flush(), 1)
+        self.assertEqual(PositionSegment.objects.get().nombre, 2)
+    
+    def test_downsample(self):
+        """Segments anciens réduits à un point par intervalle"""
+        points = [(12.3, -1.5, self.start + timedelta(seconds=seconds)) for seconds in range(0, 900, 5)]
+        append_points({self.livreur.pk: points})
+        out = StringIO()
+        call_command('downsample_tracks', days=0, resolution=60, stdout=out)
+        self.assertIn('2 segments', out.getvalue())
+        self.assertEqual(
+            [moment for moment, _, _ in iter_track(self.livreur.pk)],
+            [self.start + timedelta(minutes=minutes) for minutes in range(15)],
+        )
+        self.assertEqual(set(PositionSegment.objects.values_list('resolution', flat=True)), {60})
+    
+    def test_trajet_endpoint(self):
+        """Points envoyés puis trajet en streaming, réservé au personnel"""
+        self.client.force_authenticate(self.livreur)
+        response = self.client.post('/api/auth/users/positions/', {'points': [
+            {'lat': 12.37, 'lon': -1.52, 'at': self.start.isoformat()},
+            {'lat': 12.38, 'lon': -1.52, 'at': (self.start + timedelta(minutes=1)).isoformat()},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(track_buffer.flush(), 1)
+        
+        url = f'/api/auth/users/{self.livreur.pk}/trajet/'
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(self.gerant)
+        response = self.client.get(url, {'debut': (self.start - timedelta(hours=1)).isoformat()})
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['points'][1][1:], [12.38, -1.52])
+        self.assertAlmostEqual(data['distance_km'], 1.112, places=2)
+        
+        response = self.client.get(url, {'debut': timezone.now().isoformat(), 'fin': self.start.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
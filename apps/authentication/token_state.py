@@ -0,0 +1,331 @@
+"""
+État des refresh tokens (tokens émis, liste noire)
+
+Le backend est choisi par ``settings.AUTH_TOKEN_STATE``:
+
+- ``CacheTokenStateBackend``: liste noire dans le cache, chaque entrée expire
+  avec le token (TTL), rien à purger ;
+- ``LocMemTokenStateBackend``: variante en mémoire locale pour les tests ;
+- ``DatabaseTokenStateBackend``: tables ``token_blacklist`` de simplejwt.
+
+Les vérifications passent par un filtre de Bloom en mémoire du worker : le
+stockage n'est interrogé que si le jti est peut-être dans la liste noire.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+
+class BloomFilter:
+    """Filtre de Bloom (faux positifs possibles, jamais de faux négatifs)"""
+
+    def __init__(self, capacity=100_000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    @property
+    def is_full(self):
+        return self.count > self.capacity
+
+
+class BaseTokenStateBackend:
+    """Interface des backends d'état des tokens"""
+
+    def add_outstanding(self, token, user):
+        """Enregistrer un refresh token émis (optionnel)"""
+
+    def blacklist(self, jti, exp, token=None):
+        raise NotImplementedError
+
+    def is_blacklisted(self, jti):
+        raise NotImplementedError
+
+    def blacklisted_since(self, cursor):
+        """
+        jtis mis en liste noire depuis ``cursor`` (None = depuis le début)
+
+        Retourne ``(jtis, nouveau_curseur)``.
+        """
+        raise NotImplementedError
+
+    def purge_expired(self, chunk_size=1000):
+        """Supprimer l'état des tokens expirés, retourne le nombre supprimé"""
+        return 0
+
+
+class CacheTokenStateBackend(BaseTokenStateBackend):
+    """
+    Liste noire dans le cache Django avec TTL
+
+    Un journal séquentiel (``seq`` -> jti, même TTL) permet aux filtres des
+    autres workers de se synchroniser. La séquence ne fait que croître : un
+    plancher (``LOW_KEY``), avancé par ``purge_expired`` (commande
+    ``purge_tokens``) jusqu'à la première entrée encore présente, évite au
+    premier chargement d'un filtre de parcourir toutes les entrées expirées.
+    """
+    KEY = 'auth:token:blacklist:{jti}'
+    SEQ_KEY = 'auth:token:blacklist:seq'
+    LOG_KEY = 'auth:token:blacklist:log:{seq}'
+    LOW_KEY = 'auth:token:blacklist:low'
+    # Dernières entrées jamais dépassées par le plancher : une entrée absente
+    # peut être en cours d'écriture (incr puis set)
+    PURGE_MARGIN = 100
+
+    def __init__(self, cache='default', chunk_size=1000):
+        self.cache = caches[cache] if isinstance(cache, str) else cache
+        self.chunk_size = chunk_size
+
+    def blacklist(self, jti, exp, token=None):
+        ttl = int(exp - time.time())
+        if ttl <= 0:
+            # Déjà expiré : la vérification d'expiration suffit
+            return
+        self.cache.set(self.KEY.format(jti=jti), 1, ttl)
+        self.cache.add(self.SEQ_KEY, 0, None)
+        seq = self.cache.incr(self.SEQ_KEY)
+        self.cache.set(self.LOG_KEY.format(seq=seq), jti, ttl)
+
+    def is_blacklisted(self, jti):
+        return self.cache.get(self.KEY.format(jti=jti)) is not None
+
+    def _bounds(self):
+        """(dernière séquence, plancher)"""
+        values = self.cache.get_many([self.SEQ_KEY, self.LOW_KEY])
+        current, low = values.get(self.SEQ_KEY, 0), values.get(self.LOW_KEY, 0)
+        # Séquence évincée puis repartie de zéro : plancher caduc
+        return current, low if low <= current else 0
+
+    def blacklisted_since(self, cursor):
+        current, low = self._bounds()
+        if cursor is None or cursor > current:
+            # Premier chargement, ou cache vidé entre-temps
+            cursor = 0
+        # Entrées sous le plancher : toutes expirées
+        cursor = max(cursor, low)
+        jtis = []
+        for start in range(cursor + 1, current + 1, self.chunk_size):
+            stop = min(start + self.chunk_size, current + 1)
+            keys = [self.LOG_KEY.format(seq=seq) for seq in range(start, stop)]
+            # Les entrées absentes ont expiré avec leur token
+            jtis.extend(self.cache.get_many(keys).values())
+        return jtis, current
+
+
+    def purge_expired(self, chunk_size=1000):
+        """
+        Avancer le plancher jusqu'à la première entrée du journal encore
+        présente ; retourne le nombre d'entrées expirées dépassées
+        """
+        current, low = self._bounds()
+        limit = current - self.PURGE_MARGIN
+        seq = low
+        while seq < limit:
+            stop = min(seq + chunk_size, limit)
+            keys = [self.LOG_KEY.format(seq=number) for number in range(seq + 1, stop + 1)]
+            present = self.cache.get_many(keys)
+            expired = next((index for index, key in enumerate(keys) if key in present), None)
+            if expired is not None:
+                seq += expired
+                break
+            seq = stop
+        if seq > low:
+            self.cache.set(self.LOW_KEY, seq, None)
+        return seq - low
+
+
+class LocMemTokenStateBackend(CacheTokenStateBackend):
+    """Backend en mémoire locale du processus (tests)"""
+
+    def __init__(self, chunk_size=1000, **kwargs):
+        super().__init__(
+            cache=LocMemCache('token-state', {'OPTIONS': {'MAX_ENTRIES': 1_000_000}}),
+            chunk_size=chunk_size,
+        )
+
+    def clear(self):
+        self.cache.clear()
+
+
+class DatabaseTokenStateBackend(BaseTokenStateBackend):
+    """Tables ``OutstandingToken`` / ``BlacklistedToken`` de simplejwt"""
+
+    def add_outstanding(self, token, user):
+        OutstandingToken.objects.create(
+            user=user,
+            jti=token['jti'],
+            token=str(token),
+            created_at=token.current_time,
+            expires_at=datetime_from_epoch(token['exp']),
+        )
+
+    def blacklist(self, jti, exp, token=None):
+        outstanding, _ = OutstandingToken.objects.get_or_create(
+            jti=jti,
+            defaults={
+                'token': str(token) if token is not None else '',
+                'expires_at': datetime_from_epoch(exp),
+            },
+        )
+        BlacklistedToken.objects.get_or_create(token=outstanding)
+
+    def is_blacklisted(self, jti):
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def blacklisted_since(self, cursor):
+        rows = list(
+            BlacklistedToken.objects.filter(
+                id__gt=cursor or 0,
+                token__expires_at__gt=timezone.now(),
+            ).order_by('id').values_list('id', 'token__jti')
+        )
+        if not rows:
+            return [], cursor or 0
+        return [jti for _, jti in rows], rows[-1][0]
+
+    def purge_expired(self, chunk_size=1000):
+        """Purge par lots pour ne pas verrouiller les tables longtemps"""
+        deleted = 0
+        now = timezone.now()
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lt=now)
+                .order_by('id').values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                return deleted
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+
+
+class FilteredTokenState:
+    """
+    Backend précédé d'un filtre de Bloom en mémoire
+
+    Le filtre est resynchronisé depuis le backend au plus toutes les
+    ``sync_interval`` secondes. Un jti mis en liste noire par ce worker est
+    ajouté immédiatement ; pour les autres workers, l'intervalle borne le délai
+    de prise en compte (0 = synchronisation à chaque vérification).
+
+    ``legacy`` : backend précédemment configuré (tables simplejwt), dont la
+    liste noire non expirée est chargée une fois par worker. Les tokens
+    révoqués avant le changement de backend restent ainsi refusés jusqu'à
+    leur expiration.
+    """
+
+    def __init__(self, backend, capacity=100_000, error_rate=0.001, sync_interval=1.0, legacy=None):
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self.error_rate = error_rate
+        self.legacy = legacy
+        self.legacy_jtis = None
+        self._lock = threading.Lock()
+        self._reset(capacity)
+
+    def _reset(self, capacity):
+        self.filter = BloomFilter(capacity, self.error_rate)
+        self.cursor = None
+        self.synced_at = 0.0
+
+    def sync(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.synced_at < self.sync_interval:
+            return
+        with self._lock:
+            jtis, self.cursor = self.backend.blacklisted_since(self.cursor)
+            for jti in jtis:
+                self.filter.add(jti)
+            self.synced_at = now
+            if self.filter.is_full:
+                # Trop de faux positifs : reconstruire un filtre plus grand
+                self._reset(self.filter.capacity * 2)
+                jtis, self.cursor = self.backend.blacklisted_since(None)
+                for jti in jtis:
+                    self.filter.add(jti)
+                self.synced_at = now
+
+    def add_outstanding(self, token, user):
+        self.backend.add_outstanding(token, user)
+
+    def blacklist(self, jti, exp, token=None):
+        self.backend.blacklist(jti, exp, token=token)
+        with self._lock:
+            self.filter.add(jti)
+
+    def _legacy_jtis(self):
+        if self.legacy_jtis is None:
+            with self._lock:
+                if self.legacy_jtis is None:
+                    self.legacy_jtis = frozenset(self.legacy.blacklisted_since(None)[0])
+        return self.legacy_jtis
+
+    def is_blacklisted(self, jti):
+        if self.legacy is not None and jti in self._legacy_jtis():
+            return True
+        self.sync()
+        if jti not in self.filter:
+            return False
+        return self.backend.is_blacklisted(jti)
+
+    def purge_expired(self, chunk_size=1000):
+        return self.backend.purge_expired(chunk_size=chunk_size)
+
+
+_token_state = None
+
+
+def get_token_state():
+    """État des tokens configuré (instance unique par worker)"""
+    global _token_state
+    if _token_state is None:
+        config = getattr(settings, 'AUTH_TOKEN_STATE', {})
+        backend_class = import_string(config.get(
+            'BACKEND', 'apps.authentication.token_state.DatabaseTokenStateBackend'
+        ))
+        backend = backend_class(**config.get('OPTIONS', {}))
+        _token_state = FilteredTokenState(
+            backend,
+            capacity=config.get('FILTER_CAPACITY', 100_000),
+            error_rate=config.get('FILTER_ERROR_RATE', 0.001),
+            sync_interval=config.get('FILTER_SYNC_INTERVAL', 1.0),
+            legacy=None if isinstance(backend, DatabaseTokenStateBackend) else DatabaseTokenStateBackend(),
+        )
+    return _token_state
+
+
+def reset_token_state():
+    """Oublier l'instance courante (changement de settings, tests)"""
+    global _token_state
+    _token_state = None
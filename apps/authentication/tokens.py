@@ -0,0 +1,117 @@
+"""
+Tokens JWT avec claims de rôle pour l'app Authentication
+
+Les tokens embarquent le code du rôle, les gares des affectations actives et
+la version des claims de l'utilisateur (``User.token_version``). Les
+permissions peuvent ainsi décider sans consulter ``User.role``.
+"""
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+
+from .cache import get_token_version
+from .models import User
+from .token_state import get_token_state
+
+ROLE_CLAIM = 'role'
+GARES_CLAIM = 'gares'
+VERSION_CLAIM = 'ver'
+
+
+def add_role_claims(token, user):
+    """Ajouter (ou rafraîchir) les claims de rôle d'un token"""
+    token[ROLE_CLAIM] = user.role.nom if user.role_id else None
+    token[GARES_CLAIM] = [
+        str(gare_id) for gare_id in user.affectations.filter(
+            is_active=True, gare_id__isnull=False
+        ).values_list('gare_id', flat=True)
+    ]
+    token[VERSION_CLAIM] = user.token_version
+    return token
+
+
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh token dont le token d'accès hérite des claims de rôle
+
+    La liste noire passe par le backend d'état configuré
+    (``AUTH_TOKEN_STATE``) au lieu des tables de simplejwt.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        # Sauter BlacklistMixin.for_user, qui écrit toujours un OutstandingToken
+        token = super(BlacklistMixin, cls).for_user(user)
+        add_role_claims(token, user)
+        get_token_state().add_outstanding(token, user)
+        return token
+
+    def check_blacklist(self):
+        if get_token_state().is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        get_token_state().blacklist(
+            self.payload[api_settings.JTI_CLAIM], self.payload['exp'], token=self
+        )
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh qui réémet les claims quand leur version est périmée
+
+    Sans cela, la rotation recopierait indéfiniment un rôle obsolète.
+    """
+    token_class = RoleRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user_id = refresh.get(api_settings.USER_ID_CLAIM)
+        if refresh.get(VERSION_CLAIM) != get_token_version(user_id):
+            try:
+                user = User.objects.select_related('role').get(pk=user_id)
+            except User.DoesNotExist:
+                raise InvalidToken('Utilisateur introuvable')
+            if not user.is_active:
+                raise serializers.ValidationError({'detail': 'Compte désactivé'})
+            add_role_claims(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+
+            data['refresh'] = str(refresh)
+
+        return data
+
+
+def claimed_principal(request):
+    """
+    Claims de rôle du token de la requête, s'ils sont à jour
+
+    Retourne ``(role, gare_ids)`` ou None si le token n'a pas de claims ou
+    si leur version ne correspond plus (changement de rôle, d'affectation...).
+    Le résultat est mémorisé sur la requête.
+    """
+    if hasattr(request, '_claimed_principal'):
+        return request._claimed_principal
+
+    principal = None
+    token = getattr(request, 'auth', None)
+    if token is not None and VERSION_CLAIM in token:
+        user_id = token.get(api_settings.USER_ID_CLAIM)
+        if token[VERSION_CLAIM] == get_token_version(user_id):
+            principal = (token.get(ROLE_CLAIM), frozenset(token.get(GARES_CLAIM, ())))
+
+    request._claimed_principal = principal
+    return principal
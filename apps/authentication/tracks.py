@@ -0,0 +1,224 @@
+"""
+Historique des positions (trajets)
+
+Stockage compact, partitionné par heure : une ligne ``PositionSegment``
+par utilisateur et par heure, dont ``points`` empaquette des enregistrements
+de 10 octets (``RECORD``) :
+
+- secondes depuis le début de l'heure (entier non signé 16 bits) ;
+- latitude et longitude en 1e-7 degrés (entiers signés 32 bits, ~1 cm).
+
+Les points reçus (``positions``) sont accumulés par ``TrackBuffer`` puis
+ajoutés en bloc (``append_points``) : les segments concernés sont lus en une
+requête, complétés, puis créés ou mis à jour par ``bulk_create`` /
+``bulk_update``. ``iter_track`` parcourt un trajet segment par segment sans
+instancier de modèles ; ``downsample`` réduit l'historique ancien à un
+point par intervalle (commande ``downsample_tracks``).
+"""
+import atexit
+import json
+import math
+import struct
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from core.geo import haversine
+
+from .activity import WriteBehindBuffer
+from .models import PositionSegment, User
+
+RECORD = struct.Struct('<Hii')
+SCALE = 10 ** 7
+SEGMENT = timedelta(hours=1)
+
+
+def track_settings():
+    return getattr(settings, 'AUTH_TRACKS', {})
+
+
+def segment_start(at):
+    """Début (UTC) de l'heure contenant ``at``"""
+    return at.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def valid_point(lat, lon):
+    """Coordonnées finies et dans les bornes (sinon non encodables)"""
+    lat, lon = float(lat), float(lon)
+    return math.isfinite(lat) and math.isfinite(lon) and abs(lat) <= 90 and abs(lon) <= 180
+
+
+def encode(lat, lon, offset):
+    return int(offset.total_seconds()), round(float(lat) * SCALE), round(float(lon) * SCALE)
+
+
+def pack(records):
+    return b''.join(RECORD.pack(*record) for record in records)
+
+
+def unpack(data):
+    """Enregistrements (secondes, latitude, longitude) d'un segment"""
+    return RECORD.iter_unpack(bytes(data))
+
+
+def downsample_records(records, resolution):
+    """Premier enregistrement de chaque intervalle de ``resolution`` secondes"""
+    kept, bucket = [], None
+    for record in records:
+        if record[0] // resolution != bucket:
+            bucket = record[0] // resolution
+            kept.append(record)
+    return kept
+
+
+def append_points(tracks, batch_size=500):
+    """
+    Ajouter des points ``{user_id: [(latitude, longitude, at), ...]}``
+
+    Les points peuvent arriver dans le désordre : chaque segment reste trié,
+    les doublons exacts sont ignorés. Les points invalides et ceux des
+    utilisateurs supprimés entre-temps sont abandonnés : ils ne pourraient
+    jamais être écrits et bloqueraient les autres. Retourne le nombre de
+    segments écrits.
+    """
+    segments = defaultdict(set)
+    for user_id, points in tracks.items():
+        for lat, lon, at in points:
+            if not valid_point(lat, lon):
+                continue
+            start = segment_start(at)
+            segments[user_id, start].add(encode(lat, lon, at - start))
+    if not segments:
+        return 0
+
+    with transaction.atomic():
+        users = set(User.objects.filter(pk__in={user_id for user_id, _ in segments}).values_list('pk', flat=True))
+        segments = {key: records for key, records in segments.items() if key[0] in users}
+        if not segments:
+            return 0
+        existing = {
+            (segment.user_id, segment.debut): segment
+            for segment in PositionSegment.objects.select_for_update().filter(
+                user_id__in={user_id for user_id, _ in segments},
+                debut__in={start for _, start in segments},
+            )
+        }
+        created, updated = [], []
+        for (user_id, start), records in segments.items():
+            segment = existing.get((user_id, start))
+            if segment is None:
+                segment = PositionSegment(user_id=user_id, debut=start)
+                created.append(segment)
+            else:
+                records |= set(unpack(segment.points))
+                updated.append(segment)
+            records = sorted(records)
+            segment.points, segment.nombre = pack(records), len(records)
+        PositionSegment.objects.bulk_create(created, batch_size=batch_size)
+        PositionSegment.objects.bulk_update(updated, ['points', 'nombre'], batch_size=batch_size)
+    return len(segments)
+
+
+def iter_track(user_id, start=None, end=None, chunk_size=100):
+    """
+    Points (at, latitude, longitude) d'un utilisateur par ordre chronologique
+
+    Les segments sont lus par paquets de ``chunk_size`` (curseur serveur sous
+    PostgreSQL) ; seuls les points du segment courant sont en mémoire.
+    """
+    queryset = PositionSegment.objects.filter(user_id=user_id).order_by('debut')
+    if start is not None:
+        queryset = queryset.filter(debut__gt=start - SEGMENT)
+    if end is not None:
+        queryset = queryset.filter(debut__lte=end)
+    for debut, data in queryset.values_list('debut', 'points').iterator(chunk_size=chunk_size):
+        for offset, lat, lon in unpack(data):
+            at = debut + timedelta(seconds=offset)
+            if (start is not None and at < start) or (end is not None and at > end):
+                continue
+            yield at, lat / SCALE, lon / SCALE
+
+
+def track_distance(points):
+    """Distance parcourue (km) le long de points (at, latitude, longitude)"""
+    distance, previous = 0.0, None
+    for _, lat, lon in points:
+        if previous is not None:
+            distance += haversine(previous[0], previous[1], lat, lon)
+        previous = (lat, lon)
+    return distance
+
+
+def track_json(user_id, start, end, chunk_points=500):
+    """
+    Trajet en JSON, produit par morceaux (réponse en streaming)
+
+    {"user": id, "debut": ..., "fin": ..., "points": [[at, lat, lon], ...],
+    "count": n, "distance_km": d}
+    """
+    yield json.dumps({'user': str(user_id), 'debut': start.isoformat(), 'fin': end.isoformat()})[:-1]
+    yield ', "points": ['
+    count, distance, previous, chunk = 0, 0.0, None, []
+    for at, lat, lon in iter_track(user_id, start, end):
+        if previous is not None:
+            distance += haversine(previous[0], previous[1], lat, lon)
+        previous = (lat, lon)
+        chunk.append(json.dumps([at.isoformat(), lat, lon]))
+        count += 1
+        if len(chunk) >= chunk_points:
+            yield (',' if count > len(chunk) else '') + ','.join(chunk)
+            chunk = []
+    if chunk:
+        yield (',' if count > len(chunk) else '') + ','.join(chunk)
+    yield f'], "count": {count}, "distance_km": {round(distance, 3)}}}'
+
+
+def downsample(before, resolution, batch_size=500):
+    """
+    Réduire les segments antérieurs à ``before`` à un point toutes les
+    ``resolution`` secondes ; retourne le nombre de segments réduits
+    """
+    queryset = PositionSegment.objects.filter(debut__lt=before, resolution__lt=resolution)
+    total = 0
+    while True:
+        with transaction.atomic():
+            segments = list(queryset.select_for_update().order_by('pk')[:batch_size])
+            if not segments:
+                return total
+            for segment in segments:
+                records = downsample_records(unpack(segment.points), resolution)
+                segment.points, segment.nombre = pack(records), len(records)
+                segment.resolution = resolution
+            PositionSegment.objects.bulk_update(segments, ['points', 'nombre', 'resolution'])
+        total += len(segments)
+
+
+class TrackBuffer(WriteBehindBuffer):
+    """Buffer write-behind des points de trajet (tous les points reçus)"""
+    thread_name = 'track-flush'
+    failure_message = "Échec de l'écriture différée des trajets, nouvel essai"
+
+    def merge(self, current, value):
+        return (current or []) + value
+
+    def record(self, user_id, points):
+        """Enregistrer des points ``(latitude, longitude, at)``"""
+        self._store(user_id, list(points))
+
+    def write(self, pending):
+        append_points(pending, batch_size=self.batch_size)
+
+
+def _build_buffer():
+    config = track_settings()
+    return TrackBuffer(
+        flush_interval=config.get('FLUSH_INTERVAL', 30.0),
+        max_pending=config.get('MAX_PENDING', 10_000),
+        batch_size=config.get('BATCH_SIZE', 500),
+    )
+
+
+track_buffer = _build_buffer()
+atexit.register(track_buffer.flush)
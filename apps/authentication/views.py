@@ -1,20 +1,43 @@
 """
 Views pour l'app Authentication
 """
+import uuid
+
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django_filters.rest_framework import DjangoFilterBackend
 
+from core.db import prefix_filter
+from core.versions import get_versions
+from core.viewsets import CompiledListMixin, ConditionalGetMixin, SparseFieldsetViewMixin
+from apps.geography.models import Gare, Ville
+
 from .models import Role, User, AffectationGare
 from .serializers import (
     RoleSerializer, UserSerializer, RegisterSerializer,
-    LoginSerializer, ChangePasswordSerializer, AffectationGareSerializer
+    LoginSerializer, ChangePasswordSerializer, AffectationGareSerializer,
+    BulkUserSerializer, BulkUserUpdateSerializer, NearestLivreursSerializer,
+    PositionBatchSerializer, TrackQuerySerializer,
+)
+from .activity import activity_buffer
+from .bulk import UPDATED, bulk_max_users, bulk_update_users
+from .filters import UserFilter
+from .hashers import get_pipeline
+from .livreurs import livreur_index
+from .positions import position_buffer
+from .permissions import (
+    IsAdmin, IsAdminOrGerant, IsOwnerOrAdmin, IsPersonnel, affected_gare_ids, has_role
 )
-from .permissions import IsAdmin, IsOwnerOrAdmin
+from .phone import normalize_telephone_prefix
+from .roster import on_duty, user_overlaps
+from .search import UserSearchFilter
+from .tracks import track_buffer, track_json
+from .tokens import RoleRefreshToken
 
 
 class AuthViewSet(viewsets.GenericViewSet):
@@ -36,7 +59,7 @@ class AuthViewSet(viewsets.GenericViewSet):
             user = serializer.save()
             
             # Générer les tokens JWT
-            refresh = RefreshToken.for_user(user)
+            refresh = RoleRefreshToken.for_user(user)
             
             return Response({
                 'user': UserSerializer(user).data,
@@ -59,12 +82,12 @@ class AuthViewSet(viewsets.GenericViewSet):
         if serializer.is_valid():
             user = serializer.validated_data['user']
             
-            # Mettre à jour last_login
-            user.last_login = timezone.now()
-            user.save(update_fields=['last_login'])
+            # Mettre à jour last_login (écriture différée, en bloc)
+            user.last_login = user.last_activity = timezone.now()
+            activity_buffer.record_login(user.pk, user.last_login)
             
             # Générer les tokens JWT
-            refresh = RefreshToken.for_user(user)
+            refresh = RoleRefreshToken.for_user(user)
             
             return Response({
                 'user': UserSerializer(user).data,
@@ -86,7 +109,7 @@ class AuthViewSet(viewsets.GenericViewSet):
         try:
             refresh_token = request.data.get('refresh')
             if refresh_token:
-                token = RefreshToken(refresh_token)
+                token = RoleRefreshToken(refresh_token)
                 token.blacklist()
             return Response({
                 'message': 'Déconnexion réussie'
@@ -106,15 +129,17 @@ class AuthViewSet(viewsets.GenericViewSet):
         if serializer.is_valid():
             user = request.user
             
+            pipeline = get_pipeline()
+            
             # Vérifier l'ancien mot de passe
-            if not user.check_password(serializer.validated_data['old_password']):
+            if not pipeline.check_password(user, serializer.validated_data['old_password']):
                 return Response({
                     'error': 'Ancien mot de passe incorrect'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # Définir le nouveau mot de passe
-            user.set_password(serializer.validated_data['new_password'])
-            user.save()
+            user.password = pipeline.make_password(serializer.validated_data['new_password'])
+            user.save(update_fields=['password', 'updated_at'])
             
             return Response({
                 'message': 'Mot de passe modifié avec succès'
@@ -123,7 +148,7 @@ class AuthViewSet(viewsets.GenericViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class RoleViewSet(viewsets.ReadOnlyModelViewSet):
+class RoleViewSet(ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet pour les rôles (lecture seule)
     """
@@ -133,19 +158,30 @@ class RoleViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['nom', 'description']
     ordering_fields = ['nom']
+    etag_models = (Role,)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(
+    ConditionalGetMixin, SparseFieldsetViewMixin, CompiledListMixin, viewsets.ModelViewSet
+):
     """
     ViewSet pour la gestion des utilisateurs
     """
     queryset = User.objects.select_related('role').all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['role', 'is_active']
+    filter_backends = [DjangoFilterBackend, UserSearchFilter, filters.OrderingFilter]
+    filterset_class = UserFilter
     search_fields = ['nom', 'prenom', 'telephone', 'email']
     ordering_fields = ['created_at', 'nom', 'prenom']
+    compiled_depends = {'nom_complet': ('nom', 'prenom')}
+    query_budgets = {'list': 3, 'retrieve': 2, 'livreurs_proches': 3, 'positions': 1, 'trajet': 2}
+    etag_models = (User, Role)
+    sparse_actions = ('list', 'retrieve', 'livreurs_proches')
+    
+    # Recherche par téléphone
+    TELEPHONE_MIN_DIGITS = 3
+    TELEPHONE_LIMIT = 20
     
     def get_permissions(self):
         """Permissions selon l'action"""
@@ -153,7 +189,8 @@ class UserViewSet(viewsets.ModelViewSet):
             return [IsOwnerOrAdmin()]
         elif self.action == 'create':
             return [IsAdmin()]
-        return [IsAuthenticated()]
+        # Autres actions : permission_classes du viewset ou de l'@action
+        return super().get_permissions()
     
     @action(detail=False, methods=['get'])
     def me(self, request):
@@ -161,9 +198,123 @@ class UserViewSet(viewsets.ModelViewSet):
         Obtenir les informations de l'utilisateur connecté
         GET /api/auth/users/me/
         """
-        serializer = self.get_serializer(request.user)
+        user = position_buffer.apply_pending(activity_buffer.apply_pending(request.user))
+        # Inchangé tant que la ligne, l'activité, la position et les rôles le sont
+        etag = self.get_etag(
+            'me', user.updated_at.isoformat(), user.last_login, user.last_activity,
+            user.latitude, user.longitude, *get_versions(Role),
+        )
+        return self.conditional_response(
+            etag, int(user.updated_at.timestamp()),
+            lambda: Response(self.get_serializer(user).data),
+        )
+    
+    @action(detail=False, methods=['post'])
+    def positions(self, request):
+        """
+        Enregistrer des positions GPS de l'utilisateur connecté (par lots)
+        POST /api/auth/users/positions/
+        {"points": [{"lat": 12.37, "lon": -1.52, "at": "2024-05-01T10:00:00Z"}, ...]}
+        
+        La plus récente devient la position de l'utilisateur, toutes sont
+        ajoutées à son trajet ; l'écriture en base est différée.
+        """
+        serializer = PositionBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        now = timezone.now()
+        points = [
+            (point['lat'], point['lon'], point.get('at') or now)
+            for point in serializer.validated_data['points']
+        ]
+        position = position_buffer.record(request.user.pk, points)
+        track_buffer.record(request.user.pk, points)
+        if position is not None and request.user.is_livreur and request.user.is_active:
+            livreur_index.move(request.user.pk, (position.latitude, position.longitude), position.at)
+        return Response({
+            'accepted': len(serializer.validated_data['points']),
+            'position': None if position is None else {
+                'latitude': str(position.latitude),
+                'longitude': str(position.longitude),
+                'at': position.at.isoformat(),
+            },
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=True, methods=['get'], permission_classes=[IsPersonnel])
+    def trajet(self, request, pk=None):
+        """
+        Trajet d'un utilisateur sur une période (réponse en streaming)
+        GET /api/auth/users/{id}/trajet/?debut=2024-05-01T08:00:00Z&fin=2024-05-01T12:00:00Z
+        
+        Les points reçus depuis moins de FLUSH_INTERVAL ne sont pas encore
+        dans l'historique.
+        """
+        params = TrackQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        user = self.get_object()
+        return StreamingHttpResponse(
+            track_json(user.pk, params.validated_data['debut'], params.validated_data['fin']),
+            content_type='application/json',
+        )
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsPersonnel])
+    def telephone(self, request):
+        """
+        Rechercher un utilisateur par la fin ou le début de son téléphone
+        GET /api/auth/users/telephone/?suffix=2233
+        GET /api/auth/users/telephone/?prefix=%2B22670  (ou prefix=7011)
+        """
+        suffix = ''.join(c for c in request.query_params.get('suffix', '') if c.isdigit())
+        prefix = request.query_params.get('prefix', '').strip()
+        
+        if suffix:
+            if len(suffix) < self.TELEPHONE_MIN_DIGITS:
+                return Response({
+                    'error': f'Au moins {self.TELEPHONE_MIN_DIGITS} chiffres requis'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            lookup = prefix_filter('telephone_reversed', suffix[::-1])
+            ordering = 'telephone_reversed'
+        elif prefix:
+            prefix = normalize_telephone_prefix(prefix)
+            if len(prefix) - 1 < self.TELEPHONE_MIN_DIGITS:
+                return Response({
+                    'error': f'Au moins {self.TELEPHONE_MIN_DIGITS} chiffres requis'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            lookup = prefix_filter('telephone_e164', prefix)
+            ordering = 'telephone_e164'
+        else:
+            return Response({
+                'error': 'Paramètre suffix ou prefix requis'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Parcours de l'index dans son ordre : LIMIT sans tri des résultats
+        users = self.get_queryset().filter(**lookup).order_by(ordering)[:self.TELEPHONE_LIMIT]
+        serializer = self.get_serializer(users, many=True)
         return Response(serializer.data)
     
+    @action(
+        detail=False, methods=['get'], url_path='livreurs-proches', permission_classes=[IsPersonnel]
+    )
+    def livreurs_proches(self, request):
+        """
+        Livreurs actifs les plus proches d'un point, par distance croissante
+        GET /api/auth/users/livreurs-proches/?lat=12.37&lon=-1.52&k=5
+        GET /api/auth/users/livreurs-proches/?lat=12.37&lon=-1.52&radius=3  (km)
+        """
+        params = NearestLivreursSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        found = livreur_index.nearest(data['lat'], data['lon'], data['k'], data['radius'])
+        
+        # L'index d'un autre worker peut avoir jusqu'à SYNC_INTERVAL de retard
+        users = self.get_queryset().filter(is_active=True).in_bulk(
+            [user_id for _, user_id in found]
+        )
+        found = [(distance, users[user_id]) for distance, user_id in found if user_id in users]
+        results = self.get_serializer([user for _, user in found], many=True).data
+        for (distance, _), item in zip(found, results):
+            item['distance'] = round(distance, 3)
+        return Response({'count': len(results), 'results': results})
+    
     @action(detail=True, methods=['post'], permission_classes=[IsAdmin])
     def activate(self, request, pk=None):
         """
@@ -172,7 +323,7 @@ class UserViewSet(viewsets.ModelViewSet):
         """
         user = self.get_object()
         user.is_active = True
-        user.save()
+        user.save(update_fields=['is_active', 'updated_at'])
         return Response({
             'message': f'Utilisateur {user.nom_complet} activé'
         })
@@ -185,19 +336,135 @@ class UserViewSet(viewsets.ModelViewSet):
         """
         user = self.get_object()
         user.is_active = False
-        user.save()
+        user.save(update_fields=['is_active', 'updated_at'])
         return Response({
             'message': f'Utilisateur {user.nom_complet} désactivé'
         })
+    
+    @action(detail=False, methods=['post'], url_path='bulk-activate', permission_classes=[IsAdmin])
+    def bulk_activate(self, request):
+        """
+        Activer des utilisateurs par ids ou par filtres
+        POST /api/auth/users/bulk-activate/  {"ids": [...]}
+        POST /api/auth/users/bulk-activate/?gare={id}
+        """
+        return self.bulk_apply(request, BulkUserSerializer, {'is_active': True})
+    
+    @action(detail=False, methods=['post'], url_path='bulk-deactivate', permission_classes=[IsAdmin])
+    def bulk_deactivate(self, request):
+        """
+        Désactiver des utilisateurs par ids ou par filtres
+        POST /api/auth/users/bulk-deactivate/  {"ids": [...]}
+        POST /api/auth/users/bulk-deactivate/?gare={id}&role={id}
+        """
+        return self.bulk_apply(request, BulkUserSerializer, {'is_active': False})
+    
+    @action(detail=False, methods=['post'], url_path='bulk-update', permission_classes=[IsAdmin])
+    def bulk_update(self, request):
+        """
+        Modifier le rôle et/ou l'activation d'utilisateurs
+        POST /api/auth/users/bulk-update/  {"ids": [...], "role": id, "is_active": true}
+        """
+        return self.bulk_apply(request, BulkUserUpdateSerializer)
+    
+    def bulk_apply(self, request, serializer_class, values=None):
+        serializer = serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = dict(serializer.validated_data)
+        ids = data.pop('ids', None)
+        values = values or data
+        
+        if ids is None:
+            filter_params = set(self.filterset_class.get_filters()) | {'search'}
+            if not filter_params & set(request.query_params):
+                return Response({
+                    'error': 'Liste ids ou filtre (role, is_active, gare, search) requis'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            max_users = bulk_max_users()
+            ids = list(self.filter_queryset(self.get_queryset()).values_list(
+                'pk', flat=True
+            )[:max_users + 1])
+            if len(ids) > max_users:
+                return Response({
+                    'error': f'Plus de {max_users} utilisateurs sélectionnés'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Un administrateur ne se désactive pas lui-même
+        skip = [request.user.pk] if values.get('is_active') is False else []
+        results = bulk_update_users(ids, values, skip=skip)
+        updated = sum(1 for result in results.values() if result == UPDATED)
+        return Response({
+            'message': f'{updated} utilisateur(s) modifié(s)',
+            'results': results,
+        })
 
 
-class AffectationGareViewSet(viewsets.ModelViewSet):
+class AffectationGareViewSet(ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet pour les affectations de gares
     """
-    queryset = AffectationGare.objects.select_related('user').all()
+    queryset = AffectationGare.objects.select_related('user__role').all()
     serializer_class = AffectationGareSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['user', 'type', 'is_active']
     search_fields = ['user__nom', 'user__prenom']
+    query_budgets = {'list': 4, 'retrieve': 3}
+    etag_models = (AffectationGare, User, Role, Gare, Ville)
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminOrGerant])
+    def roster(self, request):
+        """
+        Personnel affecté à une gare à une date (aujourd'hui par défaut)
+        GET /api/auth/affectations/roster/?gare={id}&date=2024-05-01
+        """
+        gare_id = request.query_params.get('gare', '')
+        date = request.query_params.get('date')
+        try:
+            gare_id = str(uuid.UUID(gare_id))
+            date = parse_date(date) if date else timezone.localdate()
+        except ValueError:
+            date = None
+        if date is None:
+            return Response({
+                'error': 'Paramètres gare (UUID) et date (AAAA-MM-JJ) requis'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if not has_role(request, Role.ADMIN) and gare_id not in affected_gare_ids(request):
+            return Response({
+                'error': "Vous n'êtes pas affecté à cette gare"
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        shifts = on_duty(gare_id, date)
+        users = {
+            str(user['id']): user for user in User.objects.filter(
+                pk__in=[shift.user_id for shift in shifts]
+            ).values('id', 'nom', 'prenom', 'telephone')
+        }
+        personnel = []
+        for shift in shifts:
+            user = users.get(shift.user_id)
+            personnel.append({
+                **shift.as_dict(),
+                'nom_complet': f"{user['prenom']} {user['nom']}" if user else None,
+                'telephone': user['telephone'] if user else None,
+            })
+        return Response({'gare': gare_id, 'date': date.isoformat(), 'personnel': personnel})
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminOrGerant])
+    def chevauchements(self, request):
+        """
+        Affectations actives d'un utilisateur qui se chevauchent
+        GET /api/auth/affectations/chevauchements/?user={id}
+        """
+        try:
+            user_id = uuid.UUID(request.query_params.get('user', ''))
+        except ValueError:
+            return Response({
+                'error': 'Paramètre user (UUID) requis'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response([
+            {'affectations': [first.as_dict(), second.as_dict()]}
+            for first, second in user_overlaps(user_id)
+        ])
@@ -7,4 +7,8 @@ from django.apps import AppConfig
 class GeographyConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.geography'
-    verbose_name = 'Géographie'
\ No newline at end of file
+    verbose_name = 'Géographie'
+    
+    def ready(self):
+        """Import signals when app is ready"""
+        import apps.geography.signals  # noqa: F401
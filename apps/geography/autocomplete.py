@@ -0,0 +1,145 @@
+"""
+Autocomplétion des noms de villes, quartiers et gares
+
+Index en mémoire du worker, reconstruit quand la version d'un des modèles
+change (``core.versions``) :
+
+- chaque mot normalisé d'un nom (``core.text.tokenize`` : sans accents ni
+  casse) est une clé d'une liste triée ; un préfixe correspond à un
+  intervalle de cette liste (``bisect``) ;
+- classement : noms qui commencent par le préfixe d'abord, puis population
+  de la ville (celle de leur ville pour les quartiers et les gares), villes
+  avant quartiers et gares, noms courts d'abord ;
+- les entrées des préfixes fréquents (plus de ``SCAN_ROWS`` clés, par
+  exemple « gare ») sont classées à la construction : la recherche les
+  parcourt dans l'ordre et s'arrête au nombre de résultats demandé ; les
+  autres intervalles sont courts et classés à la recherche.
+"""
+from bisect import bisect_left
+from itertools import islice
+
+from django.conf import settings
+
+from core.text import fold, prefix_successor, tokenize
+from core.versions import VersionedValue
+
+from .models import Pays, Ville, Quartier, Gare
+
+TYPES = ('ville', 'quartier', 'gare')
+
+
+def autocomplete_settings():
+    return getattr(settings, 'GEOGRAPHY_AUTOCOMPLETE', {})
+
+
+class Entry:
+    """Nom indexé : ``data`` est le résultat rendu tel quel"""
+    __slots__ = ('type', 'tokens', 'rank', 'data')
+
+    def __init__(self, type, nom, weight, data):
+        self.type = type
+        self.tokens = tokenize(nom)
+        # Sans le critère « commence par », ajouté à la recherche
+        self.rank = (-(weight or 0), TYPES.index(type), len(nom), fold(nom))
+        self.data = data
+
+
+class AutocompleteIndex:
+    """Clés triées (mot, position du mot dans le nom, entrée)"""
+
+    def __init__(self, entries, scan_rows=256):
+        self.rows = sorted(
+            (token, position, entry_id)
+            for entry_id, entry in enumerate(entries)
+            for position, token in enumerate(entry.tokens)
+        )
+        self.keys = [token for token, _, _ in self.rows]
+        self.entries = entries
+        # Préfixes de plus de scan_rows clés : classement fait d'avance
+        self.top = {}
+        prefixes, length = {key[:1] for key in self.keys}, 1
+        while prefixes:
+            longer = set()
+            for prefix in prefixes:
+                start, end = self._range(prefix)
+                if end - start > scan_rows:
+                    self.top[prefix] = self._rank(start, end)
+                    longer.update(key[:length + 1] for key in self.keys[start:end] if len(key) > length)
+            prefixes, length = longer, length + 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _range(self, prefix):
+        start = bisect_left(self.keys, prefix)
+        return start, bisect_left(self.keys, prefix_successor(prefix), lo=start)
+
+    def _rank(self, start, end):
+        """Entrées ayant une clé dans l'intervalle, de la mieux classée à la moins bien"""
+        best = {}
+        for _, position, entry_id in self.rows[start:end]:
+            rank = (position > 0,) + self.entries[entry_id].rank + (entry_id,)
+            if entry_id not in best or rank < best[entry_id]:
+                best[entry_id] = rank
+        return [self.entries[entry_id] for entry_id in sorted(best, key=best.get)]
+
+    @staticmethod
+    def _covers(entry, tokens):
+        """Chaque mot de la requête est le préfixe d'un mot distinct du nom"""
+        available = list(entry.tokens)
+        for token in sorted(tokens, key=len, reverse=True):
+            for index, candidate in enumerate(available):
+                if candidate.startswith(token):
+                    del available[index]
+                    break
+            else:
+                return False
+        return True
+
+    def search(self, query, limit=10, types=None):
+        """Résultats (``data``) les mieux classés pour ``query``"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        # Entrées du mot le plus long (« gare b » : celles de « gare »),
+        # parcourues dans l'ordre du classement
+        prefix = max(tokens, key=len)
+        ranked = self.top.get(prefix)
+        if ranked is None:
+            ranked = self._rank(*self._range(prefix))
+        found = (
+            entry for entry in ranked
+            if (types is None or entry.type in types)
+            and (len(tokens) == 1 or self._covers(entry, tokens))
+        )
+        return [entry.data for entry in islice(found, limit)]
+
+
+def build_autocomplete_index(versions=None):
+    entries = []
+    for ville_id, nom, population, pays in Ville.objects.values_list(
+        'id', 'nom', 'population', 'pays__code'
+    ).iterator():
+        entries.append(Entry('ville', nom, population, {
+            'type': 'ville', 'id': str(ville_id), 'nom': nom, 'pays': pays,
+        }))
+    for quartier_id, nom, ville, population in Quartier.objects.values_list(
+        'id', 'nom', 'ville__nom', 'ville__population'
+    ).iterator():
+        entries.append(Entry('quartier', nom, population, {
+            'type': 'quartier', 'id': str(quartier_id), 'nom': nom, 'ville': ville,
+        }))
+    for gare_id, nom, ville, population in Gare.objects.filter(is_active=True).values_list(
+        'id', 'nom', 'ville__nom', 'ville__population'
+    ).iterator():
+        entries.append(Entry('gare', nom, population, {
+            'type': 'gare', 'id': str(gare_id), 'nom': nom, 'ville': ville,
+        }))
+    config = autocomplete_settings()
+    return AutocompleteIndex(
+        entries,
+        scan_rows=config.get('SCAN_ROWS', 256),
+    )
+
+
+autocomplete_index = VersionedValue(build_autocomplete_index, Pays, Ville, Quartier, Gare)
@@ -0,0 +1,117 @@
+"""
+Distances entre gares (tarification, planification)
+
+Les coordonnées des gares actives géolocalisées sont chargées en tableaux
+NumPy une fois par version du modèle Gare (``core.versions``) ; les
+distances (haversine, km, float32) sont calculées par blocs de lignes
+vectorisés :
+
+- jusqu'à ``MAX_MATRIX_GARES`` gares, la matrice complète est calculée à la
+  construction (4·n² octets : 100 Mo pour 5 000 gares) ;
+- au-delà, seules les coordonnées sont gardées et les lignes ou
+  sous-matrices demandées sont calculées à la volée.
+"""
+import numpy as np
+from django.conf import settings
+
+from core.geo import EARTH_RADIUS_KM
+from core.versions import VersionedValue
+
+from .models import Gare
+
+
+def distance_settings():
+    return getattr(settings, 'GEOGRAPHY_DISTANCES', {})
+
+
+class DistanceMatrix:
+    """Distances entre les gares ``ids`` (identifiants en chaînes)"""
+
+    def __init__(self, ids, latitudes, longitudes, versions=(), max_full=5000, block_rows=256):
+        self.ids = list(ids)
+        self.positions = {gare_id: position for position, gare_id in enumerate(self.ids)}
+        self.versions = tuple(versions)
+        self.block_rows = block_rows
+        self.lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+        self.lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+        self.cos = np.cos(self.lat)
+        self.matrix = None
+        if len(self.ids) <= max_full:
+            everything = np.arange(len(self.ids))
+            self.matrix = self._compute(everything, everything)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        arrays = (self.lat, self.lon, self.cos) + ((self.matrix,) if self.matrix is not None else ())
+        return sum(array.nbytes for array in arrays)
+
+    def _compute(self, rows, columns):
+        """Distances (km) des positions ``rows`` vers les positions ``columns``"""
+        out = np.empty((len(rows), len(columns)), dtype=np.float32)
+        lat, lon, cos = self.lat[columns], self.lon[columns], self.cos[columns]
+        # Par blocs : temporaires de block_rows × len(columns) float64
+        for begin in range(0, len(rows), self.block_rows):
+            block = rows[begin:begin + self.block_rows]
+            a = np.sin((lat - self.lat[block, None]) * 0.5)
+            a *= a
+            b = np.sin((lon - self.lon[block, None]) * 0.5)
+            b *= b
+            b *= self.cos[block, None]
+            b *= cos
+            a += b
+            np.sqrt(a, out=a)
+            np.minimum(a, 1.0, out=a)
+            np.arcsin(a, out=a)
+            a *= 2 * EARTH_RADIUS_KM
+            out[begin:begin + len(block)] = a
+        return out
+
+    def lookup(self, ids):
+        """Positions des gares ``ids`` ; KeyError avec les identifiants inconnus"""
+        missing = [gare_id for gare_id in ids if gare_id not in self.positions]
+        if missing:
+            raise KeyError(missing)
+        return np.fromiter((self.positions[gare_id] for gare_id in ids), dtype=np.intp, count=len(ids))
+
+    def row(self, gare_id):
+        """Distances de la gare vers toutes les gares (ordre de ``ids``)"""
+        position = self.lookup([gare_id])
+        if self.matrix is not None:
+            return self.matrix[position[0]]
+        return self._compute(position, np.arange(len(self.ids)))[0]
+
+    def submatrix(self, origins, destinations=None):
+        """Distances ``origins`` × ``destinations`` (par défaut ``origins``)"""
+        rows = self.lookup(origins)
+        columns = rows if destinations is None else self.lookup(destinations)
+        if self.matrix is not None:
+            return self.matrix[np.ix_(rows, columns)]
+        return self._compute(rows, columns)
+
+
+def kilometres(distances):
+    """Distances arrondies au mètre, en flottants Python (sérialisation)"""
+    return np.round(np.asarray(distances, dtype=np.float64), 3).tolist()
+
+
+def build_distance_matrix(versions=()):
+    rows = Gare.objects.filter(
+        is_active=True, latitude__isnull=False, longitude__isnull=False
+    ).values_list('id', 'latitude', 'longitude')
+    ids, latitudes, longitudes = [], [], []
+    for gare_id, lat, lon in rows.iterator():
+        ids.append(str(gare_id))
+        latitudes.append(float(lat))
+        longitudes.append(float(lon))
+    config = distance_settings()
+    return DistanceMatrix(
+        ids, latitudes, longitudes, versions,
+        max_full=config.get('MAX_MATRIX_GARES', 5000),
+        block_rows=config.get('BLOCK_ROWS', 256),
+    )
+
+
+distance_matrix = VersionedValue(build_distance_matrix, Gare)
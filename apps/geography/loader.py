@@ -0,0 +1,307 @@
+"""
+Chargement en masse du référentiel géographique (commande ``load_geography``)
+
+Les lignes sont lues en flux et traitées par lots ; chaque lot est écrit
+dans une transaction, niveau par niveau (pays, villes, quartiers), par
+« upsert » sur les clés naturelles :
+
+- ``Pays.code`` ; ``Ville(nom, pays)`` ; ``Quartier(nom, ville)`` ;
+- les lignes existantes du lot sont lues en une requête par niveau (par
+  nom, première colonne des index uniques ; le parent est comparé en
+  Python), puis seules les modifiées sont écrites (``bulk_update``,
+  ``updated_at`` compris) ; les nouvelles sont insérées par ``COPY`` sous
+  PostgreSQL (``core.db.copy_insert``), ``bulk_create`` sinon ;
+- une cellule vide ne remplace pas la valeur existante ;
+- un lot qui viole une autre contrainte (ex. nom de pays déjà pris par un
+  autre code) est annulé puis repris ligne par ligne : seules les lignes
+  en cause sont rejetées.
+
+Formats :
+
+- CSV (en-tête) : pays (code), pays_nom, indicatif, ville, latitude,
+  longitude, population, quartier, description. Le niveau d'une ligne est
+  le plus fin renseigné (quartier, sinon ville, sinon pays) ; le parent
+  doit exister ou figurer plus haut dans le fichier ;
+- GeoNames (``allCountries.txt``, ``BF.txt`` : tabulations, sans en-tête) :
+  les lieux habités (classe P, hors quartiers et lieux abandonnés) deviennent
+  des villes du pays de code ``country code``, qui doit exister.
+
+``bulk_create`` / ``bulk_update`` n'émettent pas de signals : les versions
+des modèles (ETag, instantané, index) sont incrémentées après le commit et
+les objets écrits journalisés pour la synchronisation (``sync``).
+"""
+import csv
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.db import copy_insert
+from core.versions import bump_version
+
+from .models import Pays, Ville, Quartier
+from .sync import record_changes
+
+COORDINATE = Decimal('0.00000001')
+INSERTED, UPDATED, UNCHANGED, REJECTED = 'inseres', 'mis_a_jour', 'inchanges', 'rejetes'
+
+# Colonnes GeoNames utilisées
+GEONAMES_NAME, GEONAMES_LATITUDE, GEONAMES_LONGITUDE = 1, 4, 5
+GEONAMES_CLASS, GEONAMES_CODE, GEONAMES_COUNTRY, GEONAMES_POPULATION = 6, 7, 8, 14
+# Quartiers (sans ville parente), lieux historiques, abandonnés ou détruits
+GEONAMES_EXCLUDED = {'PPLX', 'PPLH', 'PPLQ', 'PPLW', 'PPLCH'}
+
+
+def read_csv(path):
+    """(numéro de ligne, dict) d'un fichier CSV avec en-tête"""
+    with open(path, encoding='utf-8-sig', newline='') as handle:
+        for number, row in enumerate(csv.DictReader(handle), start=1):
+            yield number, row
+
+
+def read_geonames(path):
+    """(numéro de ligne, dict) des lieux habités d'un export GeoNames"""
+    with open(path, encoding='utf-8') as handle:
+        for number, line in enumerate(handle, start=1):
+            columns = line.rstrip('\n').split('\t')
+            if len(columns) <= GEONAMES_POPULATION or columns[GEONAMES_CLASS] != 'P':
+                continue
+            if columns[GEONAMES_CODE] in GEONAMES_EXCLUDED:
+                continue
+            yield number, {
+                'pays': columns[GEONAMES_COUNTRY],
+                'ville': columns[GEONAMES_NAME],
+                'latitude': columns[GEONAMES_LATITUDE],
+                'longitude': columns[GEONAMES_LONGITUDE],
+                # 0 : population inconnue
+                'population': None if columns[GEONAMES_POPULATION] == '0' else columns[GEONAMES_POPULATION],
+            }
+
+
+class GeographyLoader:
+    """
+    Upsert par lots ; ``counts[niveau]`` compte les lignes insérées, mises à
+    jour, inchangées et rejetées, ``reject(numéro, record, message)`` est
+    appelé pour chaque ligne rejetée
+    """
+
+    def __init__(self, chunk_size=1000, reject=None):
+        self.chunk_size = chunk_size
+        self.reject_callback = reject
+        self.counts = {level: Counter() for level in ('pays', 'ville', 'quartier')}
+        self.rejected = []
+        # Clés naturelles déjà résolues : code -> id, (pays_id, nom) -> id
+        self.pays_ids = {}
+        self.ville_ids = {}
+
+    def load(self, records):
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                return self.counts
+            self.load_chunk(chunk)
+
+    def reject(self, level, number, record, message):
+        # Signalé au commit du lot (un lot annulé est repris ligne par ligne)
+        self.rejected.append((level, number, record, message))
+
+    def load_chunk(self, chunk):
+        counts = {level: Counter(counter) for level, counter in self.counts.items()}
+        self.rejected = []
+        try:
+            self.write_chunk(chunk)
+        except IntegrityError as e:
+            self.counts = counts
+            # Ids des lignes annulées : relus en base au besoin
+            self.pays_ids.clear()
+            self.ville_ids.clear()
+            if len(chunk) > 1:
+                for item in chunk:
+                    self.load_chunk([item])
+                return
+            number, record = chunk[0]
+            self.rejected = [(level_of(record), number, record, f'Contrainte non respectée : {e}')]
+        for level, number, record, message in self.rejected:
+            self.counts[level][REJECTED] += 1
+            if self.reject_callback is not None:
+                self.reject_callback(number, record, message)
+
+    def write_chunk(self, chunk):
+        rows = {'pays': {}, 'ville': {}, 'quartier': {}}
+        for number, record in chunk:
+            level = level_of(record)
+            try:
+                key, attrs = self.clean(level, record)
+            except ValueError as e:
+                self.reject(level, number, record, str(e))
+                continue
+            # Doublon dans le lot : la dernière ligne l'emporte
+            rows[level][key] = (number, record, attrs)
+
+        with transaction.atomic():
+            changed = [
+                model for model, upsert, level in (
+                    (Pays, self.upsert_pays, 'pays'),
+                    (Ville, self.upsert_villes, 'ville'),
+                    (Quartier, self.upsert_quartiers, 'quartier'),
+                ) if rows[level] and upsert(rows[level])
+            ]
+            if changed:
+                transaction.on_commit(lambda: bump_version(*changed))
+
+    def clean(self, level, record):
+        """(clé naturelle, attributs renseignés) ; lève ValueError si invalide"""
+        code = (value(record, 'pays') or '').upper()
+        if not code:
+            raise ValueError('Code pays manquant')
+        if level == 'pays':
+            return code, present(nom=value(record, 'pays_nom'), indicatif=value(record, 'indicatif'))
+        if level == 'ville':
+            return (code, value(record, 'ville')), present(
+                latitude=coordinate(record, 'latitude', 90),
+                longitude=coordinate(record, 'longitude', 180),
+                population=integer(record, 'population'),
+            )
+        ville = value(record, 'ville')
+        if not ville:
+            raise ValueError('Ville manquante')
+        return (code, ville, value(record, 'quartier')), present(description=value(record, 'description'))
+
+    def resolve_pays(self, codes):
+        missing = set(codes) - set(self.pays_ids)
+        if missing:
+            self.pays_ids.update(Pays.objects.filter(code__in=missing).values_list('code', 'id'))
+        return self.pays_ids
+
+    def resolve_villes(self, keys):
+        """Ids des villes (code pays, nom)"""
+        pays_ids = self.resolve_pays({code for code, _ in keys})
+        wanted = {(pays_ids[code], nom) for code, nom in keys if code in pays_ids}
+        missing = wanted - set(self.ville_ids)
+        if missing:
+            for pays_id, nom, ville_id in Ville.objects.filter(
+                nom__in={nom for _, nom in missing}
+            ).values_list('pays_id', 'nom', 'id'):
+                if (pays_id, nom) in missing:
+                    self.ville_ids[pays_id, nom] = ville_id
+        return {
+            (code, nom): self.ville_ids[pays_ids[code], nom]
+            for code, nom in keys if code in pays_ids and (pays_ids[code], nom) in self.ville_ids
+        }
+
+    def upsert_pays(self, rows):
+        existing = Pays.objects.filter(code__in=rows)
+        instances, changed = self.upsert(
+            Pays, 'pays', rows, {pays.code: pays for pays in existing},
+            lambda code, attrs: Pays(code=code, **attrs), required=('nom', 'indicatif'),
+        )
+        self.pays_ids.update((code, pays.id) for code, pays in instances.items())
+        return changed
+
+    def upsert_villes(self, rows):
+        pays_ids = self.resolve_pays({code for code, _ in rows})
+        for key in [key for key in rows if key[0] not in pays_ids]:
+            number, record, _ = rows.pop(key)
+            self.reject('ville', number, record, f'Pays inconnu : {key[0]}')
+        codes = {pays_id: code for code, pays_id in pays_ids.items()}
+        existing = Ville.objects.filter(nom__in={nom for _, nom in rows})
+        instances, changed = self.upsert(
+            Ville, 'ville', rows,
+            {(codes.get(ville.pays_id), ville.nom): ville for ville in existing},
+            lambda key, attrs: Ville(pays_id=pays_ids[key[0]], nom=key[1], **attrs),
+        )
+        self.ville_ids.update(((pays_ids[code], nom), ville.id) for (code, nom), ville in instances.items())
+        return changed
+
+    def upsert_quartiers(self, rows):
+        ville_ids = self.resolve_villes({(code, ville) for code, ville, _ in rows})
+        for key in [key for key in rows if key[:2] not in ville_ids]:
+            number, record, _ = rows.pop(key)
+            self.reject('quartier', number, record, f'Ville inconnue : {key[1]} ({key[0]})')
+        keys = {ville_id: key for key, ville_id in ville_ids.items()}
+        existing = Quartier.objects.filter(nom__in={nom for _, _, nom in rows})
+        _, changed = self.upsert(
+            Quartier, 'quartier', rows,
+            {
+                keys[quartier.ville_id] + (quartier.nom,): quartier
+                for quartier in existing if quartier.ville_id in keys
+            },
+            lambda key, attrs: Quartier(ville_id=ville_ids[key[:2]], nom=key[2], **attrs),
+        )
+        return changed
+
+    def upsert(self, model, level, rows, existing, build, required=()):
+        """
+        Insérer les nouvelles lignes, mettre à jour les modifiées ; retourne
+        ({clé: instance}, au moins une écriture)
+        """
+        now = timezone.now()
+        instances = {}
+        created, updated, fields = [], [], set()
+        for key, (number, record, attrs) in rows.items():
+            instance = existing.get(key)
+            if instance is None:
+                absent = [field for field in required if field not in attrs]
+                if absent:
+                    self.reject(level, number, record, f"Champs obligatoires manquants : {', '.join(absent)}")
+                    continue
+                instance = build(key, attrs)
+                created.append(instance)
+            else:
+                changes = [field for field, new in attrs.items() if getattr(instance, field) != new]
+                if changes:
+                    for field in changes:
+                        setattr(instance, field, attrs[field])
+                    instance.updated_at = now
+                    fields.update(changes)
+                    updated.append(instance)
+                else:
+                    self.counts[level][UNCHANGED] += 1
+            instances[key] = instance
+        copy_insert(model, created)
+        if updated:
+            model.objects.bulk_update(updated, sorted(fields) + ['updated_at'], batch_size=self.chunk_size)
+        record_changes(model, [instance.pk for instance in created + updated])
+        self.counts[level][INSERTED] += len(created)
+        self.counts[level][UPDATED] += len(updated)
+        return instances, bool(created or updated)
+
+
+def level_of(record):
+    """Niveau d'une ligne : le plus fin renseigné"""
+    return 'quartier' if value(record, 'quartier') else 'ville' if value(record, 'ville') else 'pays'
+
+
+def value(record, key):
+    return (str(record.get(key) or '')).strip() or None
+
+
+def present(**attrs):
+    """Attributs renseignés (une cellule vide ne remplace pas la valeur)"""
+    return {field: attr for field, attr in attrs.items() if attr is not None}
+
+
+def coordinate(record, key, bound):
+    raw = value(record, key)
+    if raw is None:
+        return None
+    try:
+        number = Decimal(raw).quantize(COORDINATE)
+    except InvalidOperation:
+        raise ValueError(f'{key} invalide : {raw}')
+    if abs(number) > bound:
+        raise ValueError(f'{key} hors bornes : {raw}')
+    return number
+
+
+def integer(record, key):
+    raw = value(record, key)
+    if raw is None:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise ValueError(f'{key} invalide : {raw}')
@@ -0,0 +1,16 @@
+"""
+Loaders groupés Geography
+"""
+from core.loaders import get_loader
+
+from .models import Gare
+
+
+def load_gares(ids):
+    """Gares (avec leur ville) par id, en une requête"""
+    return {gare.pk: gare for gare in Gare.objects.select_related('ville').filter(pk__in=ids)}
+
+
+def gare_loader(request=None):
+    """Loader des gares de la requête courante"""
+    return get_loader(request, 'geography.gare', load_gares)
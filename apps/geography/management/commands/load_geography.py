@@ -0,0 +1,59 @@
+"""
+Commande de chargement en masse du référentiel géographique
+Usage: python manage.py load_geography villes.csv [--format csv|geonames] [--chunk-size 1000]
+
+Upsert sur les clés naturelles (Pays.code, Ville(nom, pays), Quartier(nom,
+ville)) ; formats et règles dans ``apps.geography.loader``. Les lignes
+rejetées sont écrites dans un rapport CSV.
+"""
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.geography.loader import (
+    INSERTED, REJECTED, UNCHANGED, UPDATED, GeographyLoader, read_csv, read_geonames,
+)
+
+REPORT_FIELDS = ['ligne', 'pays', 'ville', 'quartier', 'erreur']
+
+
+class Command(BaseCommand):
+    help = 'Charge pays, villes et quartiers depuis un fichier CSV ou GeoNames'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichier CSV ou export GeoNames')
+        parser.add_argument(
+            '--format', choices=['csv', 'geonames'],
+            help='Deduit de l\'extension par defaut (.txt : geonames)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--report', help='Rapport des erreurs (defaut: <fichier>.errors.csv)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"Fichier introuvable: {path}")
+
+        fmt = options['format'] or ('geonames' if path.endswith('.txt') else 'csv')
+        records = read_geonames(path) if fmt == 'geonames' else read_csv(path)
+        report_path = options['report'] or f"{path}.errors.csv"
+
+        with open(report_path, 'w', newline='') as report_file:
+            report = csv.DictWriter(report_file, fieldnames=REPORT_FIELDS)
+            report.writeheader()
+
+            def reject(number, record, message):
+                report.writerow({
+                    'ligne': number, 'pays': record.get('pays', ''), 'ville': record.get('ville', ''),
+                    'quartier': record.get('quartier', ''), 'erreur': message,
+                })
+
+            counts = GeographyLoader(chunk_size=options['chunk_size'], reject=reject).load(records)
+
+        for level, label in (('pays', 'Pays'), ('ville', 'Villes'), ('quartier', 'Quartiers')):
+            self.stdout.write(
+                f"  {label}: {counts[level][INSERTED]} inseres, {counts[level][UPDATED]} mis a jour, "
+                f"{counts[level][UNCHANGED]} inchanges, {counts[level][REJECTED]} rejetes"
+            )
+        self.stdout.write(self.style.SUCCESS(f"\n✓ Chargement termine (rapport: {report_path})"))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("geography", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="gare",
+            index=models.Index(
+                fields=["created_at", "id"], name="geography_gare_keyset_idx"
+            ),
+        ),
+    ]
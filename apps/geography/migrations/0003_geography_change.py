@@ -0,0 +1,58 @@
+# Generated by Django 4.2.8 on 2026-10-17 18:55
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def fill_geography_changes(apps, schema_editor):
+    """Journal initial : tout le référentiel existant, parents d'abord"""
+    GeographyChange = apps.get_model("geography", "GeographyChange")
+    changes = []
+    for name in ("pays", "ville", "quartier", "gare"):
+        model = apps.get_model("geography", name)
+        for object_id, updated_at in model.objects.order_by("created_at").values_list(
+            "id", "updated_at"
+        ).iterator():
+            changes.append(
+                GeographyChange(model=name, object_id=object_id, changed_at=updated_at)
+            )
+            if len(changes) >= 1000:
+                GeographyChange.objects.bulk_create(changes)
+                changes = []
+    GeographyChange.objects.bulk_create(changes)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("geography", "0002_gare_keyset_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GeographyChange",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "model",
+                    models.CharField(
+                        help_text="pays, ville, quartier ou gare", max_length=20
+                    ),
+                ),
+                ("object_id", models.UUIDField()),
+                ("deleted", models.BooleanField(default=False)),
+                ("changed_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "verbose_name": "Modification du référentiel",
+                "verbose_name_plural": "Modifications du référentiel",
+                "db_table": "geography_change",
+                "indexes": [
+                    models.Index(
+                        fields=["model", "object_id"],
+                        name="geography_change_object_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_geography_changes, migrations.RunPython.noop),
+    ]
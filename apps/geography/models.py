@@ -2,6 +2,7 @@
 Modèles géographiques
 """
 from django.db import models
+from django.utils import timezone
 from core.models import BaseModel
 
 
@@ -77,6 +78,32 @@ class Gare(BaseModel):
         verbose_name = 'Gare'
         verbose_name_plural = 'Gares'
         ordering = ['nom']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='geography_gare_keyset_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.nom} - {self.ville.nom}"
\ No newline at end of file
+        return f"{self.nom} - {self.ville.nom}"
+
+
+class GeographyChange(models.Model):
+    """
+    Journal des modifications du référentiel (synchronisation hors ligne)
+
+    Une ligne par objet : sa dernière modification ou sa suppression
+    (``deleted``, « tombstone »). ``id`` est une séquence croissante qui
+    sert de jeton de synchronisation (cf. ``sync``).
+    """
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=20, help_text="pays, ville, quartier ou gare")
+    object_id = models.UUIDField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'geography_change'
+        verbose_name = 'Modification du référentiel'
+        verbose_name_plural = 'Modifications du référentiel'
+        indexes = [
+            models.Index(fields=['model', 'object_id'], name='geography_change_object_idx'),
+        ]
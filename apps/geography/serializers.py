@@ -1,11 +1,22 @@
 """
 Serializers Geography
 """
+import uuid
+
 from rest_framework import serializers
+
+from core.fieldsets import SparseFieldsetMixin
+from core.loaders import LoaderField
+from core.serializers import FiniteFloatField
+from .loaders import gare_loader
 from .models import Pays, Ville, Quartier, Gare
+from .autocomplete import TYPES, autocomplete_settings
+from .distances import distance_settings
+from .spatial import nearby_settings
+from .sync import sync_settings
 
 
-class PaysSerializer(serializers.ModelSerializer):
+class PaysSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer pour les pays"""
     
     class Meta:
@@ -13,7 +24,7 @@ class PaysSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class VilleSerializer(serializers.ModelSerializer):
+class VilleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer pour les villes"""
     pays_detail = PaysSerializer(source='pays', read_only=True)
     
@@ -22,7 +33,7 @@ class VilleSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class QuartierSerializer(serializers.ModelSerializer):
+class QuartierSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer pour les quartiers"""
     ville_detail = VilleSerializer(source='ville', read_only=True)
     
@@ -31,11 +42,99 @@ class QuartierSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class GareSerializer(serializers.ModelSerializer):
+class GareSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer pour les gares"""
     ville_detail = VilleSerializer(source='ville', read_only=True)
     quartier_detail = QuartierSerializer(source='quartier', read_only=True)
     
     class Meta:
         model = Gare
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class GareSummarySerializer(serializers.ModelSerializer):
+    """Résumé d'une gare (référencée sans clé étrangère)"""
+    ville_nom = serializers.CharField(source='ville.nom', read_only=True)
+    
+    class Meta:
+        model = Gare
+        fields = ['id', 'nom', 'ville', 'ville_nom', 'adresse', 'telephone', 'is_active']
+
+
+class GareDetailField(LoaderField):
+    """Résumé de la gare désignée par un identifiant (ex. ``gare_id``)"""
+    
+    def get_loader(self, request):
+        return gare_loader(request)
+    
+    def to_representation_loaded(self, gare):
+        return GareSummarySerializer(gare, context=self.context).data
+
+
+class NearbyQuerySerializer(serializers.Serializer):
+    """Paramètres de la recherche des gares proches (rayon en km)"""
+    lat = FiniteFloatField(min_value=-90, max_value=90)
+    lon = FiniteFloatField(min_value=-180, max_value=180)
+    radius = FiniteFloatField(min_value=0, required=False)
+    limit = serializers.IntegerField(min_value=1, required=False)
+    
+    def validate(self, attrs):
+        config = nearby_settings()
+        attrs.setdefault('radius', config.get('DEFAULT_RADIUS_KM', 10))
+        attrs.setdefault('limit', config.get('DEFAULT_LIMIT', 20))
+        if attrs['radius'] > config.get('MAX_RADIUS_KM', 200):
+            raise serializers.ValidationError(
+                {'radius': f"Rayon maximal : {config.get('MAX_RADIUS_KM', 200)} km"}
+            )
+        attrs['limit'] = min(attrs['limit'], config.get('MAX_LIMIT', 100))
+        return attrs
+
+
+class GareIdListField(serializers.CharField):
+    """Identifiants de gares séparés par des virgules"""
+    
+    def to_internal_value(self, data):
+        try:
+            ids = [str(uuid.UUID(item.strip())) for item in super().to_internal_value(data).split(',')]
+        except ValueError:
+            raise serializers.ValidationError('Identifiants de gares invalides')
+        max_ids = distance_settings().get('MAX_IDS', 500)
+        if len(ids) > max_ids:
+            raise serializers.ValidationError(f'Au plus {max_ids} gares')
+        return list(dict.fromkeys(ids))
+
+
+class DistanceMatrixQuerySerializer(serializers.Serializer):
+    """Gares d'origine et de destination (par défaut les origines)"""
+    origines = GareIdListField()
+    destinations = GareIdListField(required=False)
+
+
+class AutocompleteQuerySerializer(serializers.Serializer):
+    """Saisie en cours, types de lieux (séparés par des virgules) et nombre de résultats"""
+    q = serializers.CharField(max_length=100)
+    types = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, required=False)
+    
+    def validate_types(self, value):
+        types = [item.strip() for item in value.split(',') if item.strip()]
+        unknown = sorted(set(types) - set(TYPES))
+        if unknown:
+            raise serializers.ValidationError(f"Types inconnus : {', '.join(unknown)}")
+        return types or None
+    
+    def validate(self, attrs):
+        config = autocomplete_settings()
+        attrs['limit'] = min(attrs.get('limit', config.get('DEFAULT_LIMIT', 10)), config.get('MAX_LIMIT', 50))
+        return attrs
+
+
+class SyncQuerySerializer(serializers.Serializer):
+    """Jeton de la dernière synchronisation (0 : tout le référentiel) et taille de page"""
+    token = serializers.IntegerField(min_value=0, required=False, default=0)
+    limit = serializers.IntegerField(min_value=1, required=False)
+    
+    def validate(self, attrs):
+        config = sync_settings()
+        attrs['limit'] = min(attrs.get('limit', config.get('PAGE_SIZE', 500)), config.get('MAX_PAGE_SIZE', 5000))
+        return attrs
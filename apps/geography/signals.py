@@ -0,0 +1,40 @@
+"""
+Signals pour l'app Geography
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.versions import track_versions
+from .models import Pays, Ville, Quartier, Gare
+from .autocomplete import autocomplete_index
+from .distances import distance_matrix
+from .snapshot import geography_snapshot
+from .spatial import gare_index
+from .sync import record_changes
+
+# Versions des modèles (ETag des réponses, instantané)
+track_versions(Pays, Ville, Quartier, Gare)
+
+
+@receiver(post_save, sender=Pays)
+@receiver(post_save, sender=Ville)
+@receiver(post_save, sender=Quartier)
+@receiver(post_save, sender=Gare)
+@receiver(post_delete, sender=Pays)
+@receiver(post_delete, sender=Ville)
+@receiver(post_delete, sender=Quartier)
+@receiver(post_delete, sender=Gare)
+def geography_changed(sender, instance, **kwargs):
+    """Périmer les valeurs du worker (les autres suivent les versions), journaliser"""
+    record_changes(sender, [instance.pk], deleted=kwargs['signal'] is post_delete)
+    geography_snapshot.invalidate()
+    autocomplete_index.invalidate()
+    if sender is Gare:
+        gare_index.invalidate()
+        distance_matrix.invalidate()
+
+
+@receiver(pre_delete, sender=Quartier)
+def quartier_deleting(sender, instance, **kwargs):
+    """Les gares du quartier sont détachées (SET_NULL) sans signal : les journaliser"""
+    record_changes(Gare, instance.gares.values_list('id', flat=True))
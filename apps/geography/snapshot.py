@@ -0,0 +1,85 @@
+"""
+Instantané du référentiel géographique (pays > villes > quartiers, gares)
+
+Le référentiel change rarement mais est lu sur presque tous les écrans :
+chaque worker construit une fois un instantané immuable de toute la
+hiérarchie (quatre requêtes), déjà rendu en JSON et compressé en gzip, et
+le sert tel quel. L'instantané porte les versions des modèles
+(``core.versions``) à partir desquelles il a été construit
+(``VersionedValue``) :
+
+- une lecture compare ces versions aux versions courantes (une lecture du
+  cache) et reconstruit l'instantané si un modèle a changé dans n'importe
+  quel worker ;
+- dans le worker qui écrit, les signals le périment immédiatement.
+"""
+import gzip
+import hashlib
+from collections import defaultdict
+
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from core.serializers import CompiledSerializer
+from core.versions import VersionedValue
+
+from .models import Pays, Ville, Quartier, Gare
+
+MODELS = (Pays, Ville, Quartier, Gare)
+
+# À incrémenter quand la structure de l'instantané change (fait partie de l'ETag)
+SNAPSHOT_FORMAT = 1
+
+
+def _flat(model):
+    """Champs du modèle seuls (la hiérarchie remplace les ``*_detail``)"""
+    meta = type('Meta', (), {'model': model, 'fields': '__all__'})
+    serializer_class = type(f'{model.__name__}SnapshotSerializer', (serializers.ModelSerializer,), {
+        'Meta': meta, '__module__': __name__,
+    })
+    return CompiledSerializer(serializer_class)
+
+
+SERIALIZERS = {model: _flat(model) for model in MODELS}
+
+
+def _rows(model):
+    """(record, dictionnaire rendu) dans l'ordre du modèle"""
+    compiled = SERIALIZERS[model]
+    records = list(compiled.records(model.objects.all()))
+    return zip(records, compiled.data(records))
+
+
+class GeographySnapshot:
+    """Hiérarchie complète, rendue en JSON et en gzip (immuable)"""
+    __slots__ = ('versions', 'etag', 'last_modified', 'data', 'content', 'gzipped')
+
+    def __init__(self, versions, data):
+        self.versions = versions
+        # Identique dans tous les workers (contrairement à l'heure de construction)
+        self.last_modified = max(versions) // 1000
+        self.etag = hashlib.md5(repr((SNAPSHOT_FORMAT, versions)).encode()).hexdigest()
+        self.data = {'version': self.etag, 'pays': data}
+        self.content = JSONRenderer().render(self.data)
+        # mtime fixe : même contenu, mêmes octets
+        self.gzipped = gzip.compress(self.content, compresslevel=9, mtime=0)
+
+    @classmethod
+    def build(cls, versions):
+        quartiers, gares, villes = defaultdict(list), defaultdict(list), defaultdict(list)
+        for record, item in _rows(Quartier):
+            quartiers[record.ville_id].append(item)
+        for record, item in _rows(Gare):
+            gares[record.ville_id].append(item)
+        for record, item in _rows(Ville):
+            item['quartiers'] = quartiers[record.id]
+            item['gares'] = gares[record.id]
+            villes[record.pays_id].append(item)
+        pays = []
+        for record, item in _rows(Pays):
+            item['villes'] = villes[record.id]
+            pays.append(item)
+        return cls(versions, pays)
+
+
+geography_snapshot = VersionedValue(GeographySnapshot.build, *MODELS)
@@ -0,0 +1,32 @@
+"""
+Index spatial des gares actives (recherche des gares proches)
+
+Chaque worker garde une grille (``core.geo.GridIndex``) des gares actives
+géolocalisées, construite en une requête et reconstruite quand la version
+du modèle Gare change (``core.versions``).
+"""
+from django.conf import settings
+
+from core.geo import GridIndex
+from core.versions import VersionedValue
+
+from .models import Gare
+
+
+def nearby_settings():
+    return getattr(settings, 'GEOGRAPHY_NEARBY', {})
+
+
+def build_gare_index(versions=None):
+    points = Gare.objects.filter(
+        is_active=True, latitude__isnull=False, longitude__isnull=False
+    ).values_list('id', 'latitude', 'longitude')
+    return GridIndex(points.iterator(), cell_deg=nearby_settings().get('CELL_DEG', 0.05))
+
+
+gare_index = VersionedValue(build_gare_index, Gare)
+
+
+def nearby_gares(lat, lon, radius_km, limit=None):
+    """Gares actives à moins de ``radius_km`` : [(distance, id)] par distance croissante"""
+    return gare_index.get().within(lat, lon, radius_km, limit)
@@ -0,0 +1,108 @@
+"""
+Synchronisation incrémentale du référentiel (clients hors ligne)
+
+Chaque écriture d'un pays, d'une ville, d'un quartier ou d'une gare est
+journalisée dans ``GeographyChange`` après le commit (signals ; le
+chargeur en masse appelle ``record_changes``) :
+
+- le journal ne garde que la dernière modification de chaque objet (la
+  précédente est supprimée) : sa taille est celle du référentiel, plus
+  les suppressions (« tombstones », conservées) ;
+- le jeton de synchronisation est le dernier ``id`` reçu : une page
+  contient les objets modifiés ou supprimés depuis, dans l'ordre de la
+  séquence, avec leur état courant (``updated_at`` compris) ;
+- ``updated_at`` seul ne suffit pas comme curseur (égalités à la
+  milliseconde, horloges des workers, suppressions invisibles) ;
+- la séquence est attribuée au commit, mais deux commits simultanés
+  peuvent devenir visibles dans le désordre : une page s'arrête à la
+  première modification de moins de ``SETTLE_SECONDS`` secondes (le jeton
+  ne la dépasse jamais), le temps que celles d'``id`` inférieur soient
+  visibles. ``SETTLE_SECONDS`` doit excéder la durée d'une écriture du
+  journal (une transaction courte).
+
+Jeton 0 : tout le référentiel (le journal est initialisé par la migration).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Pays, Ville, Quartier, Gare, GeographyChange
+from .snapshot import SERIALIZERS
+
+# Clés de la réponse, parents d'abord
+SYNC_MODELS = {'pays': Pays, 'villes': Ville, 'quartiers': Quartier, 'gares': Gare}
+LABELS = {model._meta.model_name: key for key, model in SYNC_MODELS.items()}
+
+# Taille des lots d'écriture du journal (paramètres de la clause IN)
+WRITE_BATCH = 500
+
+
+def sync_settings():
+    return getattr(settings, 'GEOGRAPHY_SYNC', {})
+
+
+def record_changes(model, ids, deleted=False):
+    """Journaliser (après le commit) la modification ou la suppression des objets ``ids``"""
+    ids = list(ids)
+    if not ids:
+        return
+    label = model._meta.model_name
+
+    def write():
+        now = timezone.now()
+        with transaction.atomic():
+            for start in range(0, len(ids), WRITE_BATCH):
+                batch = ids[start:start + WRITE_BATCH]
+                GeographyChange.objects.filter(model=label, object_id__in=batch).delete()
+                GeographyChange.objects.bulk_create([
+                    GeographyChange(model=label, object_id=pk, deleted=deleted, changed_at=now)
+                    for pk in batch
+                ])
+
+    transaction.on_commit(write)
+
+
+def changes_since(token, limit):
+    """
+    Page de modifications après le jeton ``token`` :
+    ``{'token', 'has_more', 'changes': {clé: [objets]}, 'deleted': {clé: [ids]}}``
+    """
+    settled = timezone.now() - timedelta(seconds=sync_settings().get('SETTLE_SECONDS', 1))
+    entries = list(
+        GeographyChange.objects.filter(id__gt=token).order_by('id')
+        .values_list('id', 'model', 'object_id', 'deleted', 'changed_at')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    # Arrêt à la première modification trop récente, pas de saut par-dessus
+    for position, entry in enumerate(entries):
+        if entry[4] > settled:
+            entries, has_more = entries[:position], False
+            break
+
+    changed = {key: [] for key in SYNC_MODELS}
+    deleted = {key: [] for key in SYNC_MODELS}
+    for _, label, object_id, is_deleted, _ in entries:
+        (deleted if is_deleted else changed)[LABELS[label]].append(object_id)
+
+    changes = {}
+    for key, model in SYNC_MODELS.items():
+        ids = changed[key]
+        if not ids:
+            changes[key] = []
+            continue
+        compiled = SERIALIZERS[model]
+        records = list(compiled.records(model.objects.filter(pk__in=ids).order_by()))
+        rendered = dict(zip((record.id for record in records), compiled.data(records)))
+        # Ordre de la séquence ; un objet absent a été supprimé depuis : sa
+        # tombstone, plus récente, viendra dans une page suivante
+        changes[key] = [rendered[pk] for pk in ids if pk in rendered]
+
+    return {
+        'token': str(entries[-1][0] if entries else token),
+        'has_more': has_more,
+        'changes': changes,
+        'deleted': {key: [str(pk) for pk in ids] for key, ids in deleted.items()},
+    }
@@ -0,0 +1,578 @@
+"""
+Tests pour l'app Geography
+"""
+import csv
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from apps.authentication.models import User
+from core.geo import haversine
+from core.queries import QueryBudgetTestMixin, QueryRecorder
+from core.versions import bump_version, get_versions
+from .autocomplete import autocomplete_index
+from .distances import distance_matrix
+from .models import Pays, Ville, Quartier, Gare, GeographyChange
+from .serializers import GareSerializer
+from .snapshot import geography_snapshot
+from .spatial import gare_index
+from .views import AutocompleteView, GareViewSet, GeographySyncView, PaysViewSet, QuartierViewSet
+
+
+class GeographyTestCase(TestCase):
+    """Jeu de données commun : Burkina Faso, deux villes, trois gares"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            telephone='+22670000001', password='x', nom='Test', prenom='Geo'
+        )
+        self.client.force_authenticate(self.user)
+        self.pays = Pays.objects.create(nom='Burkina Faso', code='BF', indicatif='+226')
+        self.ouaga = Ville.objects.create(
+            nom='Ouagadougou', pays=self.pays, latitude='12.37142770', longitude='-1.51966030',
+            population=2453496
+        )
+        self.bobo = Ville.objects.create(nom='Bobo-Dioulasso', pays=self.pays)
+        self.gounghin = Quartier.objects.create(nom='Gounghin', ville=self.ouaga)
+        self.gares = [
+            Gare.objects.create(
+                nom='Gare TSR', ville=self.ouaga, quartier=self.gounghin,
+                latitude='12.36470000', longitude='-1.54280000'
+            ),
+            Gare.objects.create(nom='Gare Rakieta', ville=self.bobo, is_active=False),
+            Gare.objects.create(nom='Gare STAF', ville=self.ouaga, telephone='25300000'),
+        ]
+
+
+class GareListTest(GeographyTestCase):
+    """Tests pour la liste des gares"""
+    
+    def test_compiled_list_identical_to_drf(self):
+        """La liste compilée rend le même JSON que GareSerializer"""
+        response = self.client.get('/api/geography/gares/')
+        expected = GareSerializer(
+            Gare.objects.select_related('ville', 'quartier'), many=True
+        ).data
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(response.data['results']), renderer.render(expected))
+        self.assertEqual(response.data['count'], 3)
+
+
+class QueryBudgetTest(QueryBudgetTestMixin, GeographyTestCase):
+    """Tests pour les budgets de requêtes des vues géographiques"""
+    
+    def test_nested_details_without_n_plus_one(self):
+        """Les détails imbriqués (ville, pays) sont chargés par jointure"""
+        Quartier.objects.create(nom='Dapoya', ville=self.ouaga)
+        Quartier.objects.create(nom='Accart-Ville', ville=self.bobo)
+        with self.assertQueryBudget(QuartierViewSet, 'list', max_repeats=1):
+            response = self.client.get('/api/geography/quartiers/')
+        self.assertEqual(response.data['results'][0]['ville_detail']['pays_detail']['code'], 'BF')
+        with self.assertQueryBudget(GareViewSet, 'retrieve', max_repeats=1):
+            self.client.get(f'/api/geography/gares/{self.gares[0].pk}/')
+
+
+class ConditionalGetTest(QueryBudgetTestMixin, GeographyTestCase):
+    """Tests pour les GET conditionnels du référentiel"""
+    
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+    
+    def test_list_not_modified_without_queries(self):
+        """Liste inchangée : 304 sans requête SQL, Cache-Control max-age"""
+        response = self.client.get('/api/geography/gares/')
+        self.assertIn('max-age=300', response['Cache-Control'])
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/geography/gares/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('max-age=300', response['Cache-Control'])
+        
+        # Une ville renommée change la représentation des gares
+        self.ouaga.nom = 'Ouaga'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ouaga.save()
+        response = self.client.get('/api/geography/gares/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_retrieve_and_queryset_state(self):
+        """Détail revalidé, et ETag calculé sur le queryset sans versions déclarées"""
+        url = f'/api/geography/gares/{self.gares[0].pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        
+        with mock.patch.object(PaysViewSet, 'etag_models', ()):
+            response = self.client.get('/api/geography/pays/')
+            etag = response['ETag']
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/geography/pays/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            Pays.objects.create(nom='Mali', code='ML', indicatif='+223')
+            response = self.client.get('/api/geography/pays/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+
+class SnapshotTest(GeographyTestCase):
+    """Tests pour l'instantané du référentiel"""
+    
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        geography_snapshot.invalidate()
+    
+    def test_hierarchy(self):
+        """Pays > villes > quartiers et gares, champs des serializers"""
+        response = self.client.get('/api/geography/snapshot/')
+        data = json.loads(response.content)
+        self.assertEqual(data['version'], response['ETag'][3:-1])
+        [pays] = data['pays']
+        self.assertEqual(pays['code'], 'BF')
+        villes = {ville['nom']: ville for ville in pays['villes']}
+        ouaga = villes['Ouagadougou']
+        self.assertEqual(ouaga['latitude'], '12.37142770')
+        self.assertEqual([quartier['nom'] for quartier in ouaga['quartiers']], ['Gounghin'])
+        self.assertEqual([gare['nom'] for gare in ouaga['gares']], ['Gare STAF', 'Gare TSR'])
+        self.assertEqual(ouaga['gares'][1]['quartier'], str(self.gounghin.pk))
+        self.assertEqual(len(villes['Bobo-Dioulasso']['gares']), 1)
+    
+    def test_gzip_etag_and_rebuild(self):
+        """Réponse gzip prête, 304 sans reconstruction, nouvelle version après écriture"""
+        response = self.client.get('/api/geography/snapshot/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content))['pays'][0]['code'], 'BF')
+        for header, compressed in (('gzip;q=0, br', False), ('br, *;q=0.5', True), ('*, gzip;q=0', False)):
+            response = self.client.get('/api/geography/snapshot/', HTTP_ACCEPT_ENCODING=header)
+            self.assertEqual(response.has_header('Content-Encoding'), compressed, header)
+        etag = response['ETag']
+        
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/geography/snapshot/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Gare.objects.create(nom='Gare Sogebaf', ville=self.bobo)
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/geography/snapshot/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        
+        # Un autre worker (instantané local intact) suit les versions du cache
+        snapshot = geography_snapshot.get()
+        Gare.objects.filter(pk=self.gares[0].pk).update(nom='Gare TSR Ouaga')
+        bump_version(Gare)
+        self.assertIn('Gare TSR Ouaga', geography_snapshot.get().content.decode())
+        self.assertIsNot(geography_snapshot.get(), snapshot)
+
+
+class SparseFieldsetTest(GeographyTestCase):
+    """Tests pour ?fields= et ?expand="""
+    
+    def test_fields_drop_joins(self):
+        """fields=id,nom : deux clés, ni jointure ni colonne superflue"""
+        with QueryRecorder() as recorder:
+            response = self.client.get('/api/geography/gares/?fields=id,nom')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'nom'})
+        [sql] = [query for query in recorder.queries if 'geography_gare' in query and 'COUNT' not in query]
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('adresse', sql)
+        
+        url = f'/api/geography/villes/{self.ouaga.pk}/?fields=nom,pays_detail.code'
+        with QueryRecorder() as recorder:
+            response = self.client.get(url)
+        self.assertEqual(response.data, {'nom': 'Ouagadougou', 'pays_detail': {'code': 'BF'}})
+        [sql] = recorder.queries
+        self.assertIn('JOIN', sql)
+        self.assertNotIn('population', sql)
+    
+    def test_expand_depth(self):
+        """expand limite les serializers imbriqués développés"""
+        response = self.client.get('/api/geography/gares/?expand=ville_detail')
+        gare = response.data['results'][0]
+        self.assertNotIn('quartier_detail', gare)
+        self.assertNotIn('pays_detail', gare['ville_detail'])
+        self.assertIn('adresse', gare)
+        
+        response = self.client.get(
+            f'/api/geography/gares/{self.gares[0].pk}/?expand=quartier_detail.ville_detail'
+        )
+        self.assertNotIn('ville_detail', response.data)
+        self.assertEqual(response.data['quartier_detail']['ville_detail']['nom'], 'Ouagadougou')
+        self.assertNotIn('pays_detail', response.data['quartier_detail']['ville_detail'])
+        
+        # Écritures : tous les champs restent validés
+        response = self.client.post('/api/geography/pays/?fields=id', {
+            'nom': 'Niger', 'code': 'NE', 'indicatif': '+227'
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['code'], 'NE')
+
+
+class NearbyTest(QueryBudgetTestMixin, GeographyTestCase):
+    """Tests pour la recherche des gares proches"""
+    
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        gare_index.invalidate()
+        self.gares[2].latitude, self.gares[2].longitude = '12.37000000', '-1.52000000'
+        self.gares[2].save()
+    
+    def test_ordered_by_distance(self):
+        """Gares actives géolocalisées dans le rayon, les plus proches d'abord"""
+        with self.assertQueryBudget(GareViewSet, 'nearby'):
+            response = self.client.get('/api/geography/gares/nearby/?lat=12.371&lon=-1.519&radius=5')
+        self.assertEqual(
+            [gare['nom'] for gare in response.data['results']], ['Gare STAF', 'Gare TSR']
+        )
+        self.assertLess(response.data['results'][0]['distance'], 0.2)
+        self.assertAlmostEqual(
+            response.data['results'][1]['distance'],
+            haversine(12.371, -1.519, 12.3647, -1.5428), places=3
+        )
+        response = self.client.get('/api/geography/gares/nearby/?lat=12.371&lon=-1.519&radius=1&fields=nom')
+        self.assertEqual(response.data['results'], [{'nom': 'Gare STAF', 'distance': 0.155}])
+    
+    def test_rebuilt_on_change_and_validation(self):
+        """Index reconstruit après une modification ; paramètres validés"""
+        url = '/api/geography/gares/nearby/?lat=12.371&lon=-1.519&limit=1'
+        self.assertEqual(self.client.get(url).data['results'][0]['nom'], 'Gare STAF')
+        self.gares[2].is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gares[2].save()
+        self.assertEqual(self.client.get(url).data['results'][0]['nom'], 'Gare TSR')
+        
+        self.assertEqual(self.client.get('/api/geography/gares/nearby/?lat=95&lon=0').status_code, 400)
+        self.assertEqual(
+            self.client.get('/api/geography/gares/nearby/?lat=12&lon=0&radius=1000').status_code, 400
+        )
+        for query in ('lat=nan&lon=1', 'lat=12&lon=inf', 'lat=12&lon=1&radius=nan'):
+            self.assertEqual(self.client.get(f'/api/geography/gares/nearby/?{query}').status_code, 400)
+
+
+class DistanceMatrixTest(QueryBudgetTestMixin, GeographyTestCase):
+    """Tests pour les distances entre gares"""
+    
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        distance_matrix.invalidate()
+        self.gares[2].latitude, self.gares[2].longitude = '12.37000000', '-1.52000000'
+        self.gares[2].save()
+        self.extra = Gare.objects.create(
+            nom='Gare Bobo', ville=self.bobo, latitude='11.17715000', longitude='-4.29790000'
+        )
+        self.ids = [str(self.gares[0].pk), str(self.gares[2].pk), str(self.extra.pk)]
+    
+    def test_matrix_matches_haversine(self):
+        """Matrice complète et calcul à la demande identiques à haversine"""
+        for max_full in (5000, 0):
+            distance_matrix.invalidate()
+            with override_settings(GEOGRAPHY_DISTANCES={'MAX_MATRIX_GARES': max_full, 'BLOCK_ROWS': 2}):
+                matrix = distance_matrix.get()
+                self.assertEqual(matrix.matrix is None, max_full == 0)
+                distances = matrix.submatrix(self.ids)
+            for i, origin in enumerate((self.gares[0], self.gares[2], self.extra)):
+                for j, destination in enumerate((self.gares[0], self.gares[2], self.extra)):
+                    self.assertAlmostEqual(float(distances[i, j]), haversine(
+                        origin.latitude, origin.longitude, destination.latitude, destination.longitude
+                    ), places=2)
+        self.assertEqual(sorted(matrix.ids), sorted(self.ids))
+    
+    def test_endpoints(self):
+        """Ligne d'une gare, sous-matrice, validation et reconstruction"""
+        with self.assertQueryBudget(GareViewSet, 'distances'):
+            response = self.client.get(f'/api/geography/gares/{self.ids[0]}/distances/')
+        row = response.data['distances']
+        self.assertEqual(set(row), set(self.ids))
+        self.assertEqual(row[self.ids[0]], 0)
+        self.assertAlmostEqual(row[self.ids[2]], haversine(12.3647, -1.5428, 11.17715, -4.2979), places=2)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(
+            f'/api/geography/gares/{self.ids[0]}/distances/', HTTP_IF_NONE_MATCH=etag
+        ).status_code, 304)
+        
+        with self.assertQueryBudget(GareViewSet, 'matrice'):
+            response = self.client.get(
+                '/api/geography/gares/matrice/',
+                {'origines': ','.join(self.ids[:2]), 'destinations': self.ids[2]},
+            )
+        self.assertEqual(response.data['origines'], self.ids[:2])
+        self.assertEqual(len(response.data['distances']), 2)
+        self.assertEqual(response.data['distances'][0], [row[self.ids[2]]])
+        
+        # Gare inactive : absente de la matrice après sa modification
+        self.gares[1].latitude, self.gares[1].longitude = '12', '-1'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gares[1].save()
+        inactive = str(self.gares[1].pk)
+        self.assertEqual(self.client.get(f'/api/geography/gares/{inactive}/distances/').status_code, 404)
+        self.assertEqual(self.client.get(
+            '/api/geography/gares/matrice/', {'origines': f'{self.ids[0]},{inactive}'}
+        ).status_code, 400)
+        self.assertEqual(
+            self.client.get('/api/geography/gares/matrice/', {'origines': 'abc'}).status_code, 400
+        )
+        self.extra.latitude = '11.50000000'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.extra.save()
+        response = self.client.get(f'/api/geography/gares/{self.ids[0]}/distances/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(response.data['distances'][self.ids[2]], row[self.ids[2]])
+
+
+class AutocompleteTest(QueryBudgetTestMixin, GeographyTestCase):
+    """Tests pour l'autocomplétion des lieux"""
+    
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        autocomplete_index.invalidate()
+        self.bobo.population = 904920
+        self.bobo.save()
+        Ville.objects.create(nom='Boromo', pays=self.pays, population=30000)
+        Gare.objects.create(nom='Gare de Bobo', ville=self.ouaga)
+        self.url = '/api/geography/autocomplete/'
+    
+    def names(self, **params):
+        return [result['nom'] for result in self.client.get(self.url, params).data['results']]
+    
+    def test_ranking(self):
+        """Début du nom d'abord, puis population ; accents et casse ignorés"""
+        with self.assertQueryBudget(AutocompleteView, 'get'):
+            response = self.client.get(self.url, {'q': 'BÔBO'})
+        self.assertEqual(response.data['results'][0], {
+            'type': 'ville', 'id': str(self.bobo.pk), 'nom': 'Bobo-Dioulasso', 'pays': 'BF',
+        })
+        self.assertEqual(self.names(q='bo'), ['Bobo-Dioulasso', 'Boromo', 'Gare de Bobo'])
+        self.assertEqual(self.names(q='dioul'), ['Bobo-Dioulasso'])
+        self.assertEqual(self.names(q='gare s'), ['Gare STAF'])
+        self.assertEqual(self.names(q='ouaga'), ['Ouagadougou'])
+        # Gare inactive non proposée
+        self.assertEqual(self.names(q='rakieta'), [])
+        self.assertEqual(self.names(q='gare', types='gare', limit=2), ['Gare TSR', 'Gare STAF'])
+    
+    def test_precomputed_prefixes_and_rebuild(self):
+        """Préfixes fréquents classés d'avance à l'identique ; index reconstruit"""
+        index = autocomplete_index.get()
+        for query in ('g', 'gare', 'bo', 'o'):
+            with override_settings(GEOGRAPHY_AUTOCOMPLETE={'SCAN_ROWS': 0}):
+                autocomplete_index.invalidate()
+                self.assertIn(query, autocomplete_index.get().top)
+                self.assertEqual(autocomplete_index.get().search(query), index.search(query))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Quartier.objects.create(nom='Bobodioulasso-Koko', ville=self.ouaga)
+        self.assertIn('Bobodioulasso-Koko', self.names(q='koko'))
+        self.assertEqual(self.client.get(self.url, {'q': 'bo', 'types': 'pays'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+
+
+class LoadGeographyTest(GeographyTestCase):
+    """Tests pour la commande load_geography"""
+    
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'referentiel.csv')
+        with open(self.path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow([
+                'pays', 'pays_nom', 'indicatif', 'ville', 'latitude', 'longitude',
+                'population', 'quartier', 'description',
+            ])
+            writer.writerow(['bf', 'Burkina Faso', '+226', '', '', '', '', '', ''])
+            writer.writerow(['CI', "Côte d'Ivoire", '+225', '', '', '', '', '', ''])
+            writer.writerow(['BF', '', '', 'Ouagadougou', '12.3714277', '-1.5196603', '2500000', '', ''])
+            writer.writerow(['BF', '', '', 'Koudougou', '12.25', '-2.36', '160239', '', ''])
+            writer.writerow(['CI', '', '', 'Abidjan', '5.36', '-4.0083', '', '', ''])
+            writer.writerow(['BF', '', '', 'Koudougou', '', '', '', 'Dapoya', 'Centre'])
+            writer.writerow(['BF', '', '', 'Gounghin', '', '', '', 'Secteur 8', ''])
+            writer.writerow(['BF', '', '', 'Ouagadougou', '', '', '', 'Gounghin', ''])
+            writer.writerow(['BF', '', '', 'Kaya', '95', '0', '', '', ''])
+            writer.writerow(['ML', '', '', 'Bamako', '', '', '', '', ''])
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def test_upsert_with_counts_and_report(self):
+        """Insertions, mises à jour et lignes inchangées sur les clés naturelles"""
+        versions = get_versions(Ville)
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('load_geography', self.path, chunk_size=4, stdout=out)
+        output = out.getvalue()
+        self.assertIn('Pays: 1 inseres, 0 mis a jour, 1 inchanges, 0 rejetes', output)
+        self.assertIn('Villes: 2 inseres, 1 mis a jour, 0 inchanges, 2 rejetes', output)
+        self.assertIn('Quartiers: 1 inseres, 0 mis a jour, 1 inchanges, 1 rejetes', output)
+        
+        self.ouaga.refresh_from_db()
+        self.assertEqual(self.ouaga.population, 2500000)
+        self.assertEqual(str(self.ouaga.latitude), '12.37142770')
+        self.assertGreater(self.ouaga.updated_at, self.ouaga.created_at)
+        self.assertEqual(Quartier.objects.get(nom='Dapoya').ville.nom, 'Koudougou')
+        self.assertEqual(Ville.objects.get(nom='Abidjan').pays.code, 'CI')
+        self.assertNotEqual(get_versions(Ville), versions)
+        # Écritures en masse journalisées pour la synchronisation
+        self.assertTrue(GeographyChange.objects.filter(model='ville', object_id=self.ouaga.pk).exists())
+        self.assertTrue(GeographyChange.objects.filter(
+            model='quartier', object_id=Quartier.objects.get(nom='Dapoya').pk
+        ).exists())
+        with open(f'{self.path}.errors.csv') as handle:
+            errors = {row['ligne']: row['erreur'] for row in csv.DictReader(handle)}
+        self.assertEqual(sorted(errors, key=int), ['7', '9', '10'])
+        self.assertIn('Ville inconnue', errors['7'])
+        self.assertIn('Pays inconnu', errors['10'])
+        
+        # Second passage : rien n'est écrit
+        out = StringIO()
+        call_command('load_geography', self.path, stdout=out)
+        self.assertIn('Villes: 0 inseres, 0 mis a jour, 3 inchanges, 2 rejetes', out.getvalue())
+    
+    def test_constraint_violation_rejects_row(self):
+        """Nom de pays déjà pris : lot repris ligne par ligne, seule la ligne rejetée"""
+        with open(self.path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['pays', 'pays_nom', 'indicatif', 'ville'])
+            writer.writerow(['ML', 'Mali', '+223', ''])
+            writer.writerow(['BFA', 'Burkina Faso', '+226', ''])
+            writer.writerow(['ML', '', '', 'Bamako'])
+        out = StringIO()
+        call_command('load_geography', self.path, stdout=out)
+        self.assertIn('Pays: 1 inseres, 0 mis a jour, 0 inchanges, 1 rejetes', out.getvalue())
+        self.assertEqual(Ville.objects.get(nom='Bamako').pays.code, 'ML')
+        self.assertFalse(Pays.objects.filter(code='BFA').exists())
+        with open(f'{self.path}.errors.csv') as handle:
+            errors = {row['ligne']: row['erreur'] for row in csv.DictReader(handle)}
+        self.assertEqual(list(errors), ['2'])
+        self.assertIn('Contrainte non respectée', errors['2'])
+    
+    def test_geonames(self):
+        """Lieux habités GeoNames chargés comme villes, quartiers ignorés"""
+        path = os.path.join(self.directory.name, 'BF.txt')
+        lines = [
+            ['2357048', 'Ouagadougou', 'Ouagadougou', '', '12.36566', '-1.53388', 'P', 'PPLC', 'BF',
+             '', '03', '', '', '', '1086505', '', '316', 'Africa/Ouagadougou', '2020-05-18'],
+            ['2358738', 'Banfora', 'Banfora', '', '10.63333', '-4.76667', 'P', 'PPLA', 'BF',
+             '', '13', '', '', '', '0', '', '302', 'Africa/Ouagadougou', '2012-01-18'],
+            ['2360000', 'Zogona', 'Zogona', '', '12.38', '-1.50', 'P', 'PPLX', 'BF',
+             '', '03', '', '', '', '0', '', '300', 'Africa/Ouagadougou', '2012-01-18'],
+            ['2361000', 'Mouhoun', 'Mouhoun', '', '12.0', '-3.0', 'H', 'STM', 'BF',
+             '', '', '', '', '', '0', '', '250', 'Africa/Ouagadougou', '2012-01-18'],
+        ]
+        with open(path, 'w') as handle:
+            handle.writelines('\t'.join(line) + '\n' for line in lines)
+        out = StringIO()
+        call_command('load_geography', path, stdout=out)
+        self.assertIn('Villes: 1 inseres, 1 mis a jour, 0 inchanges, 0 rejetes', out.getvalue())
+        self.assertIsNone(Ville.objects.get(nom='Banfora').population)
+        self.assertFalse(Ville.objects.filter(nom='Zogona').exists())
+
+
+@override_settings(GEOGRAPHY_SYNC={'SETTLE_SECONDS': 0})
+class GeographySyncTest(QueryBudgetTestMixin, GeographyTestCase):
+    """Tests pour la synchronisation incrémentale du référentiel"""
+    
+    def setUp(self):
+        # Journal écrit au commit
+        with self.captureOnCommitCallbacks(execute=True):
+            super().setUp()
+        self.url = '/api/geography/sync/'
+    
+    def sync(self, token, **params):
+        response = self.client.get(self.url, {'token': token, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+    
+    def test_full_sync_in_pages(self):
+        """Jeton 0 : tout le référentiel, page par page, parents d'abord"""
+        with self.assertQueryBudget(GeographySyncView, 'get'):
+            page = self.sync(0, limit=4)
+        self.assertTrue(page['has_more'])
+        self.assertEqual([item['nom'] for item in page['changes']['pays']], ['Burkina Faso'])
+        self.assertEqual(len(page['changes']['villes']), 2)
+        
+        received, token = {key: [] for key in page['changes']}, 0
+        while True:
+            page = self.sync(token, limit=4)
+            for key, items in page['changes'].items():
+                received[key].extend(item['id'] for item in items)
+            token = page['token']
+            if not page['has_more']:
+                break
+        self.assertEqual(len(received['villes']), 2)
+        self.assertEqual(len(received['quartiers']), 1)
+        self.assertEqual(sorted(received['gares']), sorted(str(gare.pk) for gare in self.gares))
+        
+        # À jour : rien de plus, même jeton
+        page = self.sync(token)
+        self.assertEqual(page['token'], token)
+        self.assertFalse(any(page['changes'].values()) or any(page['deleted'].values()))
+    
+    def test_delta_with_tombstones(self):
+        """Dernier état de chaque objet modifié, ids des objets supprimés"""
+        token = self.sync(0)['token']
+        deleted = [str(self.gounghin.pk), str(self.bobo.pk), str(self.gares[1].pk)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gares[2].telephone = '25300001'
+            self.gares[2].save()
+            self.gares[2].telephone = '25300002'
+            self.gares[2].save()
+            # Gare TSR détachée (SET_NULL), sans signal
+            self.gounghin.delete()
+            # Cascade : Gare Rakieta supprimée avec sa ville
+            self.bobo.delete()
+        self.assertEqual(GeographyChange.objects.filter(object_id=self.gares[2].pk).count(), 1)
+        
+        page = self.sync(token)
+        gares = {item['nom']: item for item in page['changes']['gares']}
+        self.assertEqual(sorted(gares), ['Gare STAF', 'Gare TSR'])
+        self.assertEqual(gares['Gare STAF']['telephone'], '25300002')
+        self.assertIsNone(gares['Gare TSR']['quartier'])
+        self.assertEqual(
+            [page['deleted'][key] for key in ('quartiers', 'villes', 'gares')],
+            [[pk] for pk in deleted],
+        )
+        self.assertFalse(page['has_more'])
+    
+    def test_recent_changes_wait(self):
+        """Modifications de moins de SETTLE_SECONDS : page suivante"""
+        token = self.sync(0)['token']
+        with override_settings(GEOGRAPHY_SYNC={'SETTLE_SECONDS': 60}):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.pays.save()
+            page = self.sync(token)
+        self.assertEqual(page['token'], token)
+        self.assertEqual(page['changes']['pays'], [])
+        self.assertEqual(self.sync(token)['changes']['pays'][0]['id'], str(self.pays.pk))
+    
+    def test_unsettled_change_not_skipped(self):
+        """Une modification récente d'id inférieur arrête la page au lieu d'être sautée"""
+        token = self.sync(0)['token']
+        now = timezone.now()
+        recent = GeographyChange.objects.create(model='ville', object_id=self.bobo.pk, changed_at=now)
+        GeographyChange.objects.create(
+            model='pays', object_id=self.pays.pk, changed_at=now - timedelta(minutes=1)
+        )
+        with override_settings(GEOGRAPHY_SYNC={'SETTLE_SECONDS': 30}):
+            page = self.sync(token)
+            self.assertEqual(page['token'], token)
+            self.assertFalse(any(page['changes'].values()))
+            GeographyChange.objects.filter(pk=recent.pk).update(changed_at=now - timedelta(minutes=1))
+            page = self.sync(token)
+        self.assertEqual([item['id'] for item in page['changes']['villes']], [str(self.bobo.pk)])
+        self.assertEqual([item['id'] for item in page['changes']['pays']], [str(self.pays.pk)])
@@ -3,7 +3,10 @@ URLs Geography
 """
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PaysViewSet, VilleViewSet, QuartierViewSet, GareViewSet
+from .views import (
+    PaysViewSet, VilleViewSet, QuartierViewSet, GareViewSet, GeographySnapshotView, AutocompleteView,
+    GeographySyncView,
+)
 
 router = DefaultRouter()
 router.register(r'pays', PaysViewSet, basename='pays')
@@ -14,5 +17,8 @@ router.register(r'gares', GareViewSet, basename='gare')
 app_name = 'geography'
 
 urlpatterns = [
+    path('snapshot/', GeographySnapshotView.as_view(), name='snapshot'),
+    path('autocomplete/', AutocompleteView.as_view(), name='autocomplete'),
+    path('sync/', GeographySyncView.as_view(), name='sync'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
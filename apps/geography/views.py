@@ -1,24 +1,66 @@
 """
 Views Geography
 """
+import uuid
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 from rest_framework import viewsets, filters
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 
+from core.viewsets import CompiledListMixin, ConditionalGetMixin, SparseFieldsetViewMixin
+
 from .models import Pays, Ville, Quartier, Gare
-from .serializers import PaysSerializer, VilleSerializer, QuartierSerializer, GareSerializer
+from .serializers import (
+    PaysSerializer, VilleSerializer, QuartierSerializer, GareSerializer, NearbyQuerySerializer,
+    DistanceMatrixQuerySerializer, AutocompleteQuerySerializer, SyncQuerySerializer,
+)
+from .autocomplete import autocomplete_index
+from .distances import distance_matrix, kilometres
+from .snapshot import geography_snapshot
+from .spatial import nearby_gares
+from .sync import changes_since
+
+# Référentiel peu modifié : réutilisable 5 minutes par le client, puis revalidé
+GEOGRAPHY_CACHE_CONTROL = {'private': True, 'max_age': 300}
+
 
+def accepts_gzip(request):
+    """gzip accepté par le client (``Accept-Encoding``, q-values comprises)"""
+    qualities = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, raw = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(raw)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0))) > 0
 
-class PaysViewSet(viewsets.ModelViewSet):
+
+class PaysViewSet(ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """ViewSet pour les pays"""
     queryset = Pays.objects.all()
     serializer_class = PaysSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     search_fields = ['nom', 'code']
+    etag_models = (Pays,)
+    cache_control = GEOGRAPHY_CACHE_CONTROL
 
 
-class VilleViewSet(viewsets.ModelViewSet):
+class VilleViewSet(ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """ViewSet pour les villes"""
     queryset = Ville.objects.select_related('pays').all()
     serializer_class = VilleSerializer
@@ -26,23 +68,177 @@ class VilleViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['pays']
     search_fields = ['nom']
+    query_budgets = {'list': 3, 'retrieve': 2}
+    etag_models = (Ville, Pays)
+    cache_control = GEOGRAPHY_CACHE_CONTROL
 
 
-class QuartierViewSet(viewsets.ModelViewSet):
+class QuartierViewSet(ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """ViewSet pour les quartiers"""
-    queryset = Quartier.objects.select_related('ville').all()
+    queryset = Quartier.objects.select_related('ville__pays').all()
     serializer_class = QuartierSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['ville']
     search_fields = ['nom']
+    query_budgets = {'list': 3, 'retrieve': 2}
+    etag_models = (Quartier, Ville, Pays)
+    cache_control = GEOGRAPHY_CACHE_CONTROL
 
 
-class GareViewSet(viewsets.ModelViewSet):
+class GareViewSet(
+    ConditionalGetMixin, SparseFieldsetViewMixin, CompiledListMixin, viewsets.ModelViewSet
+):
     """ViewSet pour les gares"""
-    queryset = Gare.objects.select_related('ville', 'quartier').all()
+    queryset = Gare.objects.select_related('ville__pays', 'quartier__ville__pays').all()
     serializer_class = GareSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['ville', 'is_active']
-    search_fields = ['nom']
\ No newline at end of file
+    search_fields = ['nom']
+    # Distances : une requête à la reconstruction de la matrice
+    query_budgets = {'list': 3, 'retrieve': 2, 'nearby': 3, 'distances': 2, 'matrice': 2}
+    sparse_actions = ('list', 'retrieve', 'nearby')
+    etag_models = (Gare, Ville, Quartier, Pays)
+    cache_control = GEOGRAPHY_CACHE_CONTROL
+    
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """
+        Gares actives les plus proches, par distance croissante
+        GET /api/geography/gares/nearby/?lat=12.37&lon=-1.52&radius=10&limit=20
+        
+        ``radius`` en kilomètres ; chaque gare porte sa ``distance`` (km).
+        """
+        params = NearbyQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        found = nearby_gares(
+            params.validated_data['lat'], params.validated_data['lon'],
+            params.validated_data['radius'], params.validated_data['limit'],
+        )
+        gares = self.get_queryset().in_bulk([gare_id for _, gare_id in found])
+        # Gares désactivées depuis la construction de l'index : ignorées
+        found = [(distance, gares[gare_id]) for distance, gare_id in found if gare_id in gares]
+        results = self.get_serializer([gare for _, gare in found], many=True).data
+        for (distance, _), data in zip(found, results):
+            data['distance'] = round(distance, 3)
+        return Response({'count': len(results), 'results': results})
+    
+    @action(detail=True, methods=['get'])
+    def distances(self, request, pk=None):
+        """
+        Distances (km) d'une gare vers toutes les gares actives géolocalisées
+        GET /api/geography/gares/{id}/distances/
+        """
+        matrix = distance_matrix.get()
+        try:
+            gare_id = str(uuid.UUID(pk))
+            row = matrix.row(gare_id)
+        except (ValueError, KeyError):
+            raise NotFound('Gare inconnue, inactive ou sans coordonnées')
+        return self.conditional_response(
+            self.get_etag('distances', *matrix.versions), max(matrix.versions) // 1000,
+            lambda: Response({'gare': gare_id, 'distances': dict(zip(matrix.ids, kilometres(row)))}),
+        )
+    
+    @action(detail=False, methods=['get'])
+    def matrice(self, request):
+        """
+        Distances (km) entre des gares : une ligne par origine
+        GET /api/geography/gares/matrice/?origines=<id>,<id>&destinations=<id>,<id>
+        """
+        params = DistanceMatrixQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        origins = params.validated_data['origines']
+        destinations = params.validated_data.get('destinations', origins)
+        matrix = distance_matrix.get()
+        try:
+            distances = matrix.submatrix(origins, destinations)
+        except KeyError as exc:
+            raise ValidationError({'gares': [f'Gares inconnues, inactives ou sans coordonnées : {exc.args[0]}']})
+        return self.conditional_response(
+            self.get_etag('matrice', *matrix.versions), max(matrix.versions) // 1000,
+            lambda: Response({
+                'origines': origins, 'destinations': destinations,
+                'distances': kilometres(distances),
+            }),
+        )
+
+
+class GeographySnapshotView(APIView):
+    """
+    Référentiel complet en une réponse (pays > villes > quartiers, gares)
+    GET /api/geography/snapshot/
+    
+    Le JSON est rendu et compressé une fois par version du référentiel ;
+    revalidation par ETag (304).
+    """
+    permission_classes = [IsAuthenticated]
+    # Reconstruction : quatre requêtes, plus l'authentification
+    query_budgets = {'get': 5}
+    
+    def get(self, request):
+        snapshot = geography_snapshot.get()
+        # ETag faible : la version gzip et la version brute sont équivalentes
+        etag = f'W/"{snapshot.etag}"'
+        response = get_conditional_response(
+            request, etag=etag, last_modified=snapshot.last_modified
+        )
+        if response is None:
+            if accepts_gzip(request):
+                response = HttpResponse(snapshot.gzipped, content_type='application/json')
+                response['Content-Encoding'] = 'gzip'
+            else:
+                response = HttpResponse(snapshot.content, content_type='application/json')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(snapshot.last_modified)
+        patch_cache_control(response, **GEOGRAPHY_CACHE_CONTROL)
+        patch_vary_headers(response, ['Accept-Encoding', 'Authorization'])
+        return response
+
+
+class AutocompleteView(APIView):
+    """
+    Autocomplétion des villes, quartiers et gares actives
+    GET /api/geography/autocomplete/?q=bobo&types=ville,gare&limit=10
+    
+    Insensible aux accents et à la casse ; les noms qui commencent par la
+    saisie d'abord, puis les plus grandes villes.
+    """
+    permission_classes = [IsAuthenticated]
+    # Reconstruction de l'index : trois requêtes
+    query_budgets = {'get': 3}
+    
+    def get(self, request):
+        params = AutocompleteQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        results = autocomplete_index.get().search(
+            params.validated_data['q'], params.validated_data['limit'],
+            params.validated_data.get('types'),
+        )
+        response = Response({'count': len(results), 'results': results})
+        patch_cache_control(response, **GEOGRAPHY_CACHE_CONTROL)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+class GeographySyncView(APIView):
+    """
+    Modifications du référentiel depuis la dernière synchronisation
+    GET /api/geography/sync/?token=1234&limit=500
+    
+    Objets modifiés (état courant) et ids supprimés, par page ; le client
+    garde ``token`` et redemande tant que ``has_more``. Sans jeton : tout
+    le référentiel.
+    """
+    permission_classes = [IsAuthenticated]
+    # Journal, puis une requête par modèle, plus l'authentification
+    query_budgets = {'get': 6}
+    
+    def get(self, request):
+        params = SyncQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        response = Response(changes_since(params.validated_data['token'], params.validated_data['limit']))
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
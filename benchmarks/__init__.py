@@ -0,0 +1,45 @@
+"""
+Benchmarks du backend
+
+Exécution depuis la racine du projet:
+    python -m benchmarks.bench_hashing
+
+Les benchmarks utilisent les settings de test (SQLite en mémoire), le schéma
+est créé à la volée.
+"""
+import os
+import statistics
+import time
+
+
+def setup(create_schema=True):
+    """Initialiser Django avec une base en mémoire"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.test')
+    import django
+    django.setup()
+    if create_schema:
+        from django.core.management import call_command
+        call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def measure(func, repeat=5, number=1):
+    """
+    Mesurer ``func`` : retourne la médiane (en secondes) d'un appel
+
+    ``number`` appels par mesure, ``repeat`` mesures.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return statistics.median(timings)
+
+
+def report(title, rows):
+    """Afficher un tableau de résultats ``[(libellé, valeur), ...]``"""
+    print(f"\n=== {title} ===")
+    width = max(len(label) for label, _ in rows)
+    for label, value in rows:
+        print(f"  {label:<{width}}  {value}")
@@ -0,0 +1,82 @@
+"""
+Benchmark de l'autocomplétion des lieux
+Usage: python -m benchmarks.bench_autocomplete
+
+2 000 villes, 20 000 quartiers et 20 000 gares (« Gare ... ») : construction
+de l'index puis saisies de 1 à 6 caractères, comparées à la recherche
+``icontains`` sur les gares (``SearchFilter``).
+"""
+import random
+import statistics
+import time
+
+from benchmarks import measure, report, setup
+
+setup()
+
+from apps.geography.autocomplete import build_autocomplete_index  # noqa: E402
+from apps.geography.models import Gare, Pays, Quartier, Ville  # noqa: E402
+
+VILLES = 2000
+QUARTIERS = 20_000
+GARES = 20_000
+QUERIES = 2000
+SYLLABES = ['ba', 'bo', 'dou', 'ga', 'kou', 'ma', 'ou', 'sa', 'té', 'yé', 'zi', 'la', 'nô', 'fa']
+
+
+def name(rng, words=1):
+    return ' '.join(
+        ''.join(rng.choice(SYLLABES) for _ in range(rng.randint(2, 4))).capitalize()
+        for _ in range(words)
+    )
+
+
+def populate(rng):
+    pays = Pays.objects.create(nom='Burkina Faso', code='BF', indicatif='+226')
+    Ville.objects.bulk_create([
+        Ville(nom=f'{name(rng)} {index}', pays=pays, population=rng.randint(1000, 2_000_000))
+        for index in range(VILLES)
+    ])
+    villes = list(Ville.objects.all())
+    Quartier.objects.bulk_create([
+        Quartier(nom=f'{name(rng, 2)} {index}', ville=rng.choice(villes)) for index in range(QUARTIERS)
+    ], batch_size=5000)
+    Gare.objects.bulk_create([
+        Gare(nom=f'Gare {name(rng)}', ville=rng.choice(villes)) for _ in range(GARES)
+    ], batch_size=5000)
+    return [ville.nom for ville in villes]
+
+
+def main():
+    rng = random.Random(42)
+    names = populate(rng)
+    build_time = measure(build_autocomplete_index, repeat=3)
+    index = build_autocomplete_index()
+
+    queries = []
+    for _ in range(QUERIES):
+        words = rng.choice(names).split() if rng.random() < 0.8 else ['gare', rng.choice(names)[:2]]
+        queries.append(' '.join(words)[:rng.randint(1, 6)])
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, 10)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    def icontains():
+        for query in queries[:20]:
+            list(Gare.objects.filter(nom__icontains=query).values_list('id', 'nom')[:10])
+    db_time = measure(icontains, repeat=3) / 20
+
+    report('Autocomplétion', [
+        ('Noms indexés', f'{len(index)} ({len(index.top)} préfixes classés d\'avance)'),
+        ('Construction', f'{build_time * 1000:.0f} ms'),
+        ('Recherche, moyenne', f'{statistics.mean(timings) * 1000:.3f} ms'),
+        ('Recherche, p99 / max', f'{timings[int(len(timings) * 0.99)] * 1000:.3f} / {timings[-1] * 1000:.3f} ms'),
+        ('icontains (gares)', f'{db_time * 1000:.2f} ms'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
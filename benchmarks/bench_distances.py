@@ -0,0 +1,88 @@
+"""
+Benchmark des distances entre gares
+Usage: python -m benchmarks.bench_distances
+
+Matrice complète (NumPy, par blocs) de 1 000 à 20 000 gares : temps de
+calcul et mémoire, comparés au calcul paire par paire en Python sur les
+Decimal ; lignes et sous-matrices calculées à la demande, chargement des
+coordonnées depuis la base.
+"""
+import random
+from decimal import Decimal
+
+from benchmarks import measure, report, setup
+
+setup()
+
+from django.test.utils import override_settings  # noqa: E402
+
+from apps.geography.distances import DistanceMatrix, build_distance_matrix  # noqa: E402
+from apps.geography.models import Gare, Pays, Ville  # noqa: E402
+from core.geo import haversine  # noqa: E402
+
+SIZES = (1000, 5000, 10_000, 20_000)
+# Emprise approximative du Burkina Faso
+LAT_RANGE = (9.4, 15.1)
+LON_RANGE = (-5.5, 2.4)
+
+
+def coordinates(rng, count):
+    return (
+        [rng.uniform(*LAT_RANGE) for _ in range(count)],
+        [rng.uniform(*LON_RANGE) for _ in range(count)],
+    )
+
+
+def python_pairs(latitudes, longitudes):
+    """Toutes les paires, haversine en Python sur des Decimal (avant)"""
+    points = [(Decimal(f'{lat:.8f}'), Decimal(f'{lon:.8f}')) for lat, lon in zip(latitudes, longitudes)]
+    return [[haversine(a[0], a[1], b[0], b[1]) for b in points] for a in points]
+
+
+def main():
+    rng = random.Random(42)
+    rows = []
+
+    latitudes, longitudes = coordinates(rng, 500)
+    python_time = measure(lambda: python_pairs(latitudes, longitudes), repeat=1)
+    rows.append(('Python, 500 gares', f'{python_time * 1000:.0f} ms (~{python_time * 1600:.0f} s pour 20 000)'))
+
+    for size in SIZES:
+        latitudes, longitudes = coordinates(rng, size)
+        ids = [str(index) for index in range(size)]
+        matrix = None
+
+        def build():
+            nonlocal matrix
+            matrix = None
+            matrix = DistanceMatrix(ids, latitudes, longitudes, max_full=size)
+        build_time = measure(build, repeat=1)
+        rows.append((
+            f'Matrice, {size} gares',
+            f'{build_time * 1000:.0f} ms, {matrix.nbytes / 2 ** 20:.0f} Mio',
+        ))
+        matrix = None
+
+    # Au-delà de MAX_MATRIX_GARES : coordonnées seules
+    lazy = DistanceMatrix(ids, latitudes, longitudes, max_full=0)
+    sample = rng.sample(ids, 500)
+    row_time = measure(lambda: lazy.row(sample[0]), repeat=20)
+    sub_time = measure(lambda: lazy.submatrix(sample), repeat=5)
+    rows.append(('À la demande, ligne (20 000)', f'{row_time * 1000:.2f} ms ({lazy.nbytes / 2 ** 10:.0f} Kio)'))
+    rows.append(('À la demande, 500 × 500', f'{sub_time * 1000:.1f} ms'))
+
+    pays = Pays.objects.create(nom='Burkina Faso', code='BF', indicatif='+226')
+    ville = Ville.objects.create(nom='Ouagadougou', pays=pays)
+    Gare.objects.bulk_create([
+        Gare(nom=f'Gare{index}', ville=ville, latitude=f'{lat:.8f}', longitude=f'{lon:.8f}')
+        for index, (lat, lon) in enumerate(zip(latitudes, longitudes))
+    ], batch_size=5000)
+    with override_settings(GEOGRAPHY_DISTANCES={'MAX_MATRIX_GARES': 0}):
+        load_time = measure(build_distance_matrix, repeat=3)
+    rows.append(('Chargement base (20 000)', f'{load_time * 1000:.0f} ms'))
+
+    report('Distances entre gares', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark du hachage des mots de passe
+Usage: PASSWORD_HASH_ITERATIONS=600000 python -m benchmarks.bench_hashing
+
+Compare le hachage en série et via le CredentialPipeline pour le coût
+configuré (les mesures affichent le nombre d'itérations utilisé).
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import measure, report, setup
+
+setup(create_schema=False)
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import hashers  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from apps.authentication.hashers import CredentialPipeline  # noqa: E402
+
+HASHER = 'apps.authentication.hashers.TunablePBKDF2PasswordHasher'
+BURST = 32
+
+
+def main():
+    with override_settings(PASSWORD_HASHERS=[HASHER]):
+        iterations = settings.PASSWORD_HASH_ITERATIONS
+        serial = measure(lambda: hashers.make_password('motdepasse'), repeat=3, number=4)
+
+        rows = [
+            ('Itérations PBKDF2', iterations),
+            ('Hash en série', f"{serial * 1000:.1f} ms/hash"),
+        ]
+
+        for workers in (1, 2, 4, 8):
+            pipeline = CredentialPipeline(workers=workers, max_pending=BURST)
+            with ThreadPoolExecutor(BURST) as clients:
+                # Rafale de connexions simultanées (BURST requêtes)
+                elapsed = measure(
+                    lambda: list(clients.map(
+                        lambda _: pipeline.make_password('motdepasse'), range(BURST)
+                    )),
+                    repeat=3,
+                )
+            rows.append((f"Pipeline {workers} threads", f"{BURST / elapsed:.1f} hash/s"))
+
+    report('Hachage des mots de passe', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark de l'index des positions des livreurs
+Usage: python -m benchmarks.bench_livreurs
+
+5 000 livreurs sur Ouagadougou : reconstruction de la grille, recherche des
+5 plus proches et déplacement d'un livreur (index du worker, sans la
+lecture des utilisateurs en base).
+"""
+import random
+
+from benchmarks import measure, report, setup
+
+setup()
+
+from apps.authentication.livreurs import build_livreur_index, livreur_index  # noqa: E402
+from apps.authentication.models import Role, User  # noqa: E402
+
+LIVREURS = 5000
+QUERIES = 1000
+K = 5
+# Emprise approximative de Ouagadougou
+LAT_RANGE = (12.25, 12.48)
+LON_RANGE = (-1.65, -1.40)
+
+
+def populate(rng):
+    role = Role.objects.create(nom=Role.LIVREUR, description='Livreur')
+    User.objects.bulk_create([
+        User(
+            telephone=f'+226700{index:05d}', nom=f'Livreur{index}', prenom='L', role=role,
+            latitude=f'{rng.uniform(*LAT_RANGE):.8f}', longitude=f'{rng.uniform(*LON_RANGE):.8f}',
+        )
+        for index in range(LIVREURS)
+    ])
+    return list(User.objects.values_list('pk', flat=True))
+
+
+def main():
+    rng = random.Random(42)
+    ids = populate(rng)
+    points = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(QUERIES)]
+    moves = [
+        (rng.choice(ids), (rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)))
+        for _ in range(QUERIES)
+    ]
+    livreur_index.invalidate()
+    livreur_index.index()
+
+    build_time = measure(build_livreur_index, repeat=3)
+    nearest_time = measure(
+        lambda: [livreur_index.nearest(lat, lon, K) for lat, lon in points], repeat=5
+    ) / QUERIES
+    update_time = measure(
+        lambda: [livreur_index.update(user_id, position) for user_id, position in moves], repeat=5
+    ) / QUERIES
+    report('Livreurs proches', [
+        ('Livreurs', LIVREURS),
+        ('Reconstruction', f'{build_time * 1000:.1f} ms'),
+        (f'{K} plus proches', f'{nearest_time * 1000:.3f} ms ({1 / nearest_time:.0f}/s)'),
+        ('Déplacement', f'{update_time * 1000:.3f} ms ({1 / update_time:.0f}/s)'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
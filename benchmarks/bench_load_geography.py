@@ -0,0 +1,84 @@
+"""
+Benchmark du chargement en masse du référentiel géographique
+Usage: python -m benchmarks.bench_load_geography
+
+Fichier de 5 000 villes et 20 000 quartiers : ``get_or_create`` ligne par
+ligne (comme ``init_data``, sur un échantillon), puis ``GeographyLoader``
+au premier chargement et au rechargement (lignes inchangées).
+"""
+import csv
+import os
+import random
+import tempfile
+
+from benchmarks import measure, report, setup
+
+setup()
+
+from django.db import transaction  # noqa: E402
+
+from apps.geography.loader import GeographyLoader, read_csv  # noqa: E402
+from apps.geography.models import Pays, Quartier, Ville  # noqa: E402
+from core.queries import QueryRecorder  # noqa: E402
+
+VILLES = 5000
+QUARTIERS = 20_000
+SAMPLE = 1000
+FIELDS = ['pays', 'pays_nom', 'indicatif', 'ville', 'latitude', 'longitude', 'population', 'quartier']
+
+
+def write_file(rng, path):
+    with open(path, 'w', newline='') as handle:
+        writer = csv.DictWriter(handle, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerow({'pays': 'BF', 'pays_nom': 'Burkina Faso', 'indicatif': '+226'})
+        for index in range(VILLES):
+            writer.writerow({
+                'pays': 'BF', 'ville': f'Ville {index}',
+                'latitude': f'{rng.uniform(9.4, 15.1):.6f}', 'longitude': f'{rng.uniform(-5.5, 2.4):.6f}',
+                'population': rng.randint(500, 500_000),
+            })
+        for index in range(QUARTIERS):
+            writer.writerow({'pays': 'BF', 'ville': f'Ville {index % VILLES}', 'quartier': f'Quartier {index}'})
+
+
+def row_by_row(path):
+    """get_or_create par ligne, une transaction par ligne (échantillon)"""
+    pays = Pays.objects.get_or_create(code='XX', defaults={'nom': 'Test', 'indicatif': '+0'})[0]
+    for number, record in read_csv(path):
+        if number > SAMPLE:
+            break
+        if record['ville'] and not record['quartier']:
+            with transaction.atomic():
+                Ville.objects.get_or_create(nom=record['ville'], pays=pays, defaults={
+                    'latitude': record['latitude'], 'longitude': record['longitude'],
+                    'population': record['population'],
+                })
+
+
+def main():
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'referentiel.csv')
+        write_file(rng, path)
+        rows = VILLES + QUARTIERS + 1
+
+        sample_time = measure(lambda: row_by_row(path), repeat=1)
+        Ville.objects.filter(pays__code='XX').delete()
+
+        loader = GeographyLoader()
+        with QueryRecorder() as recorder:
+            first_time = measure(lambda: loader.load(read_csv(path)), repeat=1)
+        assert Quartier.objects.count() == QUARTIERS
+        reload_time = measure(lambda: GeographyLoader().load(read_csv(path)), repeat=3)
+
+    report('Chargement du référentiel', [
+        ('Lignes', rows),
+        ('get_or_create', f'{sample_time / SAMPLE * 1000:.2f} ms/ligne (~{sample_time / SAMPLE * rows:.0f} s)'),
+        ('Loader, premier chargement', f'{first_time:.2f} s ({rows / first_time:.0f} lignes/s, {recorder.count} requêtes)'),
+        ('Loader, rechargement', f'{reload_time:.2f} s ({rows / reload_time:.0f} lignes/s)'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark de la recherche des gares proches
+Usage: python -m benchmarks.bench_nearby
+
+Compare, sur 100 000 gares réparties sur le Burkina Faso, le parcours de
+toutes les gares (lecture + haversine) et l'index en grille
+(``apps.geography.spatial``), et vérifie que les résultats sont identiques.
+"""
+import random
+
+from benchmarks import measure, report, setup
+
+setup()
+
+from apps.geography.models import Pays, Ville, Gare  # noqa: E402
+from apps.geography.spatial import build_gare_index  # noqa: E402
+from core.geo import haversine  # noqa: E402
+
+GARES = 100_000
+QUERIES = 200
+RADIUS_KM = 10
+LIMIT = 20
+# Emprise approximative du Burkina Faso
+LAT_RANGE = (9.4, 15.1)
+LON_RANGE = (-5.5, 2.4)
+
+
+def populate(rng):
+    pays = Pays.objects.create(nom='Burkina Faso', code='BF', indicatif='+226')
+    ville = Ville.objects.create(nom='Ouagadougou', pays=pays)
+    Gare.objects.bulk_create([
+        Gare(
+            nom=f'Gare{index}', ville=ville,
+            latitude=f'{rng.uniform(*LAT_RANGE):.8f}', longitude=f'{rng.uniform(*LON_RANGE):.8f}',
+        )
+        for index in range(GARES)
+    ], batch_size=5000)
+
+
+def main():
+    rng = random.Random(42)
+    populate(rng)
+    points = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(QUERIES)]
+
+    def scan(lat, lon):
+        # Sans index : toutes les gares lues puis filtrées
+        found = [
+            (haversine(lat, lon, gare_lat, gare_lon), gare_id)
+            for gare_id, gare_lat, gare_lon in Gare.objects.filter(is_active=True).values_list(
+                'id', 'latitude', 'longitude'
+            )
+        ]
+        return sorted(item for item in found if item[0] <= RADIUS_KM)[:LIMIT]
+
+    index = build_gare_index()
+    for lat, lon in points[:5]:
+        expected = scan(lat, lon)
+        got = index.within(lat, lon, RADIUS_KM, LIMIT)
+        assert [key for _, key in got] == [key for _, key in expected], 'résultats différents'
+
+    scan_time = measure(lambda: scan(*points[0]), repeat=3)
+    build_time = measure(build_gare_index, repeat=3)
+    within_time = measure(
+        lambda: [index.within(lat, lon, RADIUS_KM, LIMIT) for lat, lon in points], repeat=5
+    ) / QUERIES
+    nearest_time = measure(
+        lambda: [index.nearest(lat, lon, LIMIT) for lat, lon in points], repeat=5
+    ) / QUERIES
+    report('Gares proches', [
+        ('Gares', GARES),
+        ('Rayon / limite', f'{RADIUS_KM} km / {LIMIT}'),
+        ('Parcours complet', f'{scan_time * 1000:.1f} ms/recherche'),
+        ('Construction index', f'{build_time * 1000:.1f} ms'),
+        ('Index, rayon', f'{within_time * 1000:.3f} ms/recherche (x{scan_time / within_time:.0f})'),
+        ('Index, k plus proches', f'{nearest_time * 1000:.3f} ms/recherche'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark de l'ingestion des positions GPS
+Usage: python -m benchmarks.bench_positions
+
+1 000 livreurs envoient chacun 10 lots de 5 points : débit de l'endpoint
+``POST /api/auth/users/positions/`` puis écriture regroupée, comparés à une
+sauvegarde de l'utilisateur par lot (ancien ``PATCH``).
+"""
+import random
+import time
+from datetime import timedelta
+
+from benchmarks import report, setup
+
+setup()
+
+from django.test.utils import override_settings  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from apps.authentication.models import Role, User  # noqa: E402
+from apps.authentication.positions import position_buffer  # noqa: E402
+from core.queries import QueryRecorder  # noqa: E402
+
+LIVREURS = 1000
+BATCHES = 10
+POINTS = 5
+
+
+def populate():
+    role = Role.objects.create(nom=Role.LIVREUR, description='Livreur')
+    User.objects.bulk_create([
+        User(telephone=f'+226700{index:05d}', nom=f'Livreur{index}', prenom='L', role=role)
+        for index in range(LIVREURS)
+    ])
+    return list(User.objects.select_related('role'))
+
+
+def batches(rng, start):
+    for batch in range(BATCHES):
+        yield [
+            {
+                'lat': rng.uniform(12.25, 12.48), 'lon': rng.uniform(-1.65, -1.40),
+                'at': (start + timedelta(seconds=batch * POINTS + index)).isoformat(),
+            }
+            for index in range(POINTS)
+        ]
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+def main():
+    # Pas de thread d'écriture : il ouvrirait sa propre base SQLite en mémoire
+    position_buffer.flush_interval = 0
+    rng = random.Random(42)
+    users = populate()
+    client = APIClient()
+    start = timezone.now() - timedelta(hours=1)
+    work = [(user, points) for user in users for points in batches(rng, start)]
+
+    begin = time.perf_counter()
+    for user, points in work:
+        client.force_authenticate(user)
+        client.post('/api/auth/users/positions/', {'points': points}, format='json')
+    ingest_time = time.perf_counter() - begin
+
+    with QueryRecorder() as recorder:
+        begin = time.perf_counter()
+        flushed = position_buffer.flush()
+        flush_time = time.perf_counter() - begin
+
+    # Ancien chemin : une sauvegarde complète de l'utilisateur par lot
+    begin = time.perf_counter()
+    for user, points in work[:1000]:
+        user.latitude, user.longitude = f"{points[-1]['lat']:.8f}", f"{points[-1]['lon']:.8f}"
+        user.save()
+    save_time = (time.perf_counter() - begin) / 1000
+
+    requests = len(work)
+    report('Ingestion des positions', [
+        ('Lots / points', f'{requests} / {requests * POINTS}'),
+        ('Endpoint', f'{ingest_time / requests * 1000:.2f} ms/lot ({requests / ingest_time:.0f} lots/s)'),
+        ('Écriture regroupée', f'{flushed} lignes, {recorder.count} requêtes, {flush_time * 1000:.0f} ms'),
+        ('Sauvegarde par lot', f'{save_time * 1000:.2f} ms/lot ({requests} écritures)'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark de la sérialisation des listes
+Usage: python -m benchmarks.bench_serialization
+
+Compare le serializer DRF (instances + select_related) et la version
+compilée (values_list + records) sur des pages d'utilisateurs et de gares,
+et vérifie que le JSON produit est identique.
+"""
+from benchmarks import measure, report, setup
+
+setup()
+
+from django.utils import timezone  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from apps.authentication.models import Role, User  # noqa: E402
+from apps.authentication.serializers import UserSerializer  # noqa: E402
+from apps.geography.models import Pays, Ville, Quartier, Gare  # noqa: E402
+from apps.geography.serializers import GareSerializer  # noqa: E402
+from core.serializers import CompiledSerializer  # noqa: E402
+
+USERS = 2000
+GARES = 1000
+PAGE = 100
+
+
+def populate():
+    roles = [
+        Role.objects.create(nom=code, description=label) for code, label in Role.ROLE_CHOICES
+    ]
+    now = timezone.now()
+    User.objects.bulk_create([
+        User(
+            telephone=f'+226700{index:05d}', nom=f'Nom{index}', prenom='Prenom',
+            email=f'user{index}@example.com', role=roles[index % len(roles)] if index % 5 else None,
+            latitude='12.37142770', longitude='-1.51966030', last_login=now,
+        )
+        for index in range(USERS)
+    ])
+    pays = Pays.objects.create(nom='Burkina Faso', code='BF', indicatif='+226')
+    villes = [Ville.objects.create(nom=f'Ville{index}', pays=pays) for index in range(20)]
+    quartiers = [Quartier.objects.create(nom=f'Quartier{index}', ville=villes[index]) for index in range(20)]
+    Gare.objects.bulk_create([
+        Gare(
+            nom=f'Gare{index}', ville=villes[index % 20],
+            quartier=quartiers[index % 20] if index % 3 else None,
+            latitude='12.36470000', longitude='-1.54280000',
+        )
+        for index in range(GARES)
+    ])
+
+
+def compare(label, serializer_class, queryset, depends=None):
+    compiled = CompiledSerializer(serializer_class, depends=depends)
+    renderer = JSONRenderer()
+
+    def drf():
+        return renderer.render(serializer_class(queryset[:PAGE], many=True).data)
+
+    def fast():
+        return renderer.render(compiled.data(compiled.records(queryset)[:PAGE]))
+
+    assert drf() == fast(), f'{label}: sorties différentes'
+    drf_time = measure(drf, repeat=5, number=5)
+    fast_time = measure(fast, repeat=5, number=5)
+    return [
+        (f'{label} DRF', f'{drf_time * 1000:.1f} ms/page'),
+        (f'{label} compilé', f'{fast_time * 1000:.1f} ms/page (x{drf_time / fast_time:.1f})'),
+    ]
+
+
+def main():
+    populate()
+    rows = [('Taille de page', PAGE)]
+    rows += compare(
+        'Utilisateurs', UserSerializer, User.objects.select_related('role').order_by('-created_at', 'id'),
+        depends={'nom_complet': ('nom', 'prenom')},
+    )
+    rows += compare(
+        'Gares', GareSerializer,
+        Gare.objects.select_related('ville__pays', 'quartier__ville__pays').order_by('nom'),
+    )
+    report('Sérialisation des listes (JSON rendu)', rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark de la synchronisation incrémentale du référentiel
+Usage: python -m benchmarks.bench_sync
+
+2 000 villes, 10 000 quartiers et 10 000 gares : synchronisation complète
+(jeton 0, pages de 5 000), puis reprise après 50 modifications et 10
+suppressions, comparées au téléchargement des listes complètes (instantané).
+"""
+import random
+
+from benchmarks import measure, report, setup
+
+setup()
+
+from django.test.utils import override_settings  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from apps.geography.models import Gare, GeographyChange, Pays, Quartier, Ville  # noqa: E402
+from apps.geography.snapshot import geography_snapshot  # noqa: E402
+from apps.geography.sync import changes_since, record_changes  # noqa: E402
+from core.queries import QueryRecorder  # noqa: E402
+
+VILLES = 2000
+QUARTIERS = 10_000
+GARES = 10_000
+PAGE = 5000
+
+
+def populate(rng):
+    pays = Pays.objects.create(nom='Burkina Faso', code='BF', indicatif='+226')
+    Ville.objects.bulk_create([Ville(nom=f'Ville {index}', pays=pays) for index in range(VILLES)])
+    villes = list(Ville.objects.all())
+    Quartier.objects.bulk_create([
+        Quartier(nom=f'Quartier {index}', ville=rng.choice(villes)) for index in range(QUARTIERS)
+    ], batch_size=5000)
+    Gare.objects.bulk_create([
+        Gare(nom=f'Gare {index}', ville=rng.choice(villes), telephone='25300000') for index in range(GARES)
+    ], batch_size=5000)
+    # Hors transaction : journalisé immédiatement
+    for model in (Ville, Quartier, Gare):
+        record_changes(model, model.objects.values_list('id', flat=True))
+
+
+def full_sync(token=0):
+    pages, size = 0, 0
+    while True:
+        page = changes_since(token, PAGE)
+        pages, size = pages + 1, size + len(JSONRenderer().render(page))
+        token = int(page['token'])
+        if not page['has_more']:
+            return token, pages, size
+
+
+def main():
+    rng = random.Random(42)
+    populate(rng)
+    renderer = JSONRenderer()
+
+    with override_settings(GEOGRAPHY_SYNC={'SETTLE_SECONDS': 0}):
+        full_time = measure(full_sync, repeat=3)
+        token, pages, full_size = full_sync()
+        snapshot_size = len(geography_snapshot.get().content)
+
+        gares = list(Gare.objects.order_by('?')[:60])
+        for gare in gares[:50]:
+            gare.telephone = '25300001'
+            gare.save()
+        for gare in gares[50:]:
+            gare.delete()
+        with QueryRecorder() as recorder:
+            delta_time = measure(lambda: changes_since(token, PAGE), repeat=20)
+        delta = changes_since(token, PAGE)
+
+    report('Synchronisation du référentiel', [
+        ('Journal', f'{GeographyChange.objects.count()} lignes'),
+        ('Complète (jeton 0)', f'{full_time * 1000:.0f} ms, {pages} pages, {full_size / 2 ** 10:.0f} Kio'),
+        ('Instantané complet', f'{snapshot_size / 2 ** 10:.0f} Kio'),
+        ('Reprise (50 + 10 tombstones)', (
+            f'{delta_time * 1000:.2f} ms, {len(renderer.render(delta)) / 2 ** 10:.1f} Kio, '
+            f'{recorder.count // 20} requêtes'
+        )),
+    ])
+
+
+if __name__ == '__main__':
+    main()
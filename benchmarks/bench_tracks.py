@@ -0,0 +1,85 @@
+"""
+Benchmark de l'historique des positions
+Usage: python -m benchmarks.bench_tracks
+
+50 livreurs envoient un point toutes les 5 secondes pendant 6 heures, écrit
+toutes les 30 secondes (``append_points``, comme ``TrackBuffer``) : débit
+d'ajout, taille stockée, lecture du trajet d'un livreur et
+sous-échantillonnage.
+"""
+import random
+from datetime import timedelta
+
+from benchmarks import measure, report, setup
+
+setup()
+
+from django.db.models import Sum  # noqa: E402
+from django.db.models.functions import Length  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from apps.authentication.models import PositionSegment, Role, User  # noqa: E402
+from apps.authentication.tracks import (  # noqa: E402
+    append_points, downsample, iter_track, track_distance,
+)
+
+LIVREURS = 50
+HOURS = 6
+PERIOD = 5  # secondes entre deux points
+FLUSH = 30  # secondes entre deux écritures
+
+
+def populate():
+    role = Role.objects.create(nom=Role.LIVREUR, description='Livreur')
+    User.objects.bulk_create([
+        User(telephone=f'+226700{index:05d}', nom=f'Livreur{index}', prenom='L', role=role)
+        for index in range(LIVREURS)
+    ])
+    return list(User.objects.values_list('pk', flat=True))
+
+
+def flushes(rng, ids, start):
+    """Lots écrits toutes les FLUSH secondes : {user_id: [(lat, lon, at)]}"""
+    positions = {user_id: [rng.uniform(12.25, 12.48), rng.uniform(-1.65, -1.40)] for user_id in ids}
+    for flush in range(HOURS * 3600 // FLUSH):
+        batch = {}
+        for user_id, position in positions.items():
+            points = []
+            for step in range(FLUSH // PERIOD):
+                position[0] += rng.uniform(-0.0003, 0.0003)
+                position[1] += rng.uniform(-0.0003, 0.0003)
+                at = start + timedelta(seconds=flush * FLUSH + step * PERIOD)
+                points.append((position[0], position[1], at))
+            batch[user_id] = points
+        yield batch
+
+
+def main():
+    rng = random.Random(42)
+    ids = populate()
+    start = (timezone.now() - timedelta(days=10)).replace(minute=0, second=0, microsecond=0)
+    batches = list(flushes(rng, ids, start))
+    points = sum(len(track) for batch in batches for track in batch.values())
+
+    append_time = measure(lambda: [append_points(batch) for batch in batches], repeat=1)
+    stored = PositionSegment.objects.aggregate(size=Sum(Length('points')))['size']
+    segments = PositionSegment.objects.count()
+
+    track = []
+    read_time = measure(lambda: track.extend(iter_track(ids[0])) or track.clear(), repeat=5)
+    distance = track_distance(iter_track(ids[0]))
+    downsample_time = measure(lambda: downsample(timezone.now(), 60), repeat=1)
+    kept = PositionSegment.objects.aggregate(total=Sum('nombre'))['total']
+
+    per_user = points // LIVREURS
+    report('Historique des positions', [
+        ('Points / segments', f'{points} / {segments}'),
+        ('Ajout', f'{append_time * 1000 / len(batches):.1f} ms/écriture ({points / append_time:.0f} points/s)'),
+        ('Stockage', f'{stored / points:.1f} octets/point ({stored / 1024:.0f} Kio)'),
+        (f'Trajet ({per_user} points)', f'{read_time * 1000:.1f} ms, {distance:.1f} km'),
+        ('Sous-échantillonnage 60 s', f'{downsample_time * 1000:.0f} ms, {kept} points conservés'),
+    ])
+
+
+if __name__ == '__main__':
+    main()
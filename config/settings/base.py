@@ -99,6 +99,29 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hachage des mots de passe : coût PBKDF2 réglable par environnement.
+# Les anciens hashers restent listés pour vérifier les hash existants.
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 600000))
+
+PASSWORD_HASHERS = [
+    'apps.authentication.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+AUTHENTICATION_BACKENDS = [
+    'apps.authentication.hashers.PipelineModelBackend',
+]
+
+# Pool de hachage : WORKERS calculs simultanés, au plus MAX_PENDING requêtes
+# (bloquées) en cours ou en attente ; au-delà de QUEUE_TIMEOUT secondes
+# d'attente d'une place, réponse 503
+PASSWORD_HASHING = {
+    'WORKERS': int(os.environ.get('PASSWORD_HASHING_WORKERS', 4)),
+    'MAX_PENDING': int(os.environ.get('PASSWORD_HASHING_MAX_PENDING', 32)),
+    'QUEUE_TIMEOUT': float(os.environ.get('PASSWORD_HASHING_QUEUE_TIMEOUT', 2.0)),
+}
+
 # Internationalization
 LANGUAGE_CODE = 'fr-fr'
 TIME_ZONE = 'Africa/Ouagadougou'
@@ -120,7 +143,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.authentication.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -130,7 +153,7 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.StandardPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
@@ -141,13 +164,21 @@ REST_FRAMEWORK = {
     'TIME_FORMAT': '%H:%M:%S',
 }
 
+# Budgets de requêtes SQL (core.queries) : le middleware est activé en développement
+QUERY_BUDGETS = {
+    'DEFAULT_MAX_QUERIES': None,
+    'MAX_REPEATS': 5,
+    'RAISE': False,
+}
+
 # Simple JWT Configuration
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    # last_login est écrit en différé par AuthViewSet.login (activity_buffer)
+    'UPDATE_LAST_LOGIN': False,
     
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
@@ -164,6 +195,116 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
     
     'JTI_CLAIM': 'jti',
+    
+    # Réémet les claims de rôle (role, gares, ver) au refresh si périmés
+    'TOKEN_REFRESH_SERIALIZER': 'apps.authentication.tokens.RoleTokenRefreshSerializer',
+}
+
+# Cache des principaux authentifiés (utilisateur + rôle), en secondes
+AUTH_PRINCIPAL_CACHE_TIMEOUT = int(os.environ.get('AUTH_PRINCIPAL_CACHE_TIMEOUT', 300))
+
+# Tableaux de service par gare (apps.authentication.roster), en secondes
+AUTH_ROSTER_CACHE_TIMEOUT = int(os.environ.get('AUTH_ROSTER_CACHE_TIMEOUT', 3600))
+
+# Index des positions des livreurs (apps.authentication.livreurs) : délai
+# maximal (s) de prise en compte d'un déplacement fait dans un autre worker,
+# durée de conservation (s) des lots de positions publiés, cellules en degrés
+# (0.01° ≈ 1,1 km), rayon en km
+AUTH_LIVREUR_INDEX = {
+    'SYNC_INTERVAL': 1.0,
+    'MOVES_TIMEOUT': 60,
+    'CELL_DEG': 0.01,
+    'DEFAULT_K': 5,
+    'MAX_K': 50,
+    'MAX_RADIUS_KM': 100,
+}
+
+# Ingestion des positions GPS (apps.authentication.positions) : écriture en
+# bloc toutes les FLUSH_INTERVAL secondes, dernière position gardée en cache
+# CACHE_TIMEOUT secondes, avance tolérée des horloges MAX_CLOCK_SKEW secondes
+AUTH_POSITIONS = {
+    'FLUSH_INTERVAL': 10,
+    'MAX_PENDING': 10_000,
+    'BATCH_SIZE': 500,
+    'CACHE_TIMEOUT': 3600,
+    'MAX_CLOCK_SKEW': 300,
+}
+
+# Historique des positions (apps.authentication.tracks) : écriture en bloc
+# toutes les FLUSH_INTERVAL secondes, sous-échantillonnage à un point toutes
+# les DOWNSAMPLE_RESOLUTION secondes au-delà de DOWNSAMPLE_AFTER_DAYS jours,
+# période maximale d'une lecture MAX_RANGE_DAYS jours
+AUTH_TRACKS = {
+    'FLUSH_INTERVAL': 30,
+    'MAX_PENDING': 10_000,
+    'BATCH_SIZE': 500,
+    'DOWNSAMPLE_AFTER_DAYS': 7,
+    'DOWNSAMPLE_RESOLUTION': 60,
+    'MAX_RANGE_DAYS': 31,
+}
+
+# Actions groupées sur les utilisateurs (apps.authentication.bulk) :
+# utilisateurs au plus par requête, liste ids comme filtres
+AUTH_BULK = {
+    'MAX_USERS': 1000,
+}
+
+# Écriture différée de last_login / last_activity (en secondes)
+AUTH_ACTIVITY = {
+    'FLUSH_INTERVAL': 30,
+    'MAX_PENDING': 10_000,
+    'RESOLUTION': 60,
+    'BATCH_SIZE': 500,
+}
+
+# État des refresh tokens (liste noire) : backend + filtre de Bloom par worker
+# FILTER_SYNC_INTERVAL borne (en secondes) le délai de prise en compte d'une
+# mise en liste noire faite par un autre worker
+AUTH_TOKEN_STATE = {
+    'BACKEND': 'apps.authentication.token_state.CacheTokenStateBackend',
+    'OPTIONS': {'cache': 'default'},
+    'FILTER_CAPACITY': 100_000,
+    'FILTER_ERROR_RATE': 0.001,
+    'FILTER_SYNC_INTERVAL': 1.0,
+}
+
+# Permissions décidées depuis les claims du token (role, gares) tant que leur
+# version correspond à User.token_version
+AUTH_PERMISSIONS_FROM_CLAIMS = os.environ.get('AUTH_PERMISSIONS_FROM_CLAIMS', 'True') == 'True'
+
+# Recherche des gares proches (apps.geography.spatial) : rayon en km,
+# taille des cellules de la grille en degrés (0.05° ≈ 5,5 km)
+GEOGRAPHY_NEARBY = {
+    'CELL_DEG': 0.05,
+    'DEFAULT_RADIUS_KM': 10,
+    'MAX_RADIUS_KM': 200,
+    'DEFAULT_LIMIT': 20,
+    'MAX_LIMIT': 100,
+}
+
+# Distances entre gares (apps.geography.distances) : matrice complète
+# calculée d'avance jusqu'à MAX_MATRIX_GARES gares (4·n² octets), au-delà
+# lignes calculées à la demande ; MAX_IDS gares au plus par sous-matrice
+GEOGRAPHY_DISTANCES = {
+    'MAX_MATRIX_GARES': 5000,
+    'BLOCK_ROWS': 256,
+    'MAX_IDS': 500,
+}
+
+# Autocomplétion des lieux (apps.geography.autocomplete) : préfixes de plus
+# de SCAN_ROWS mots classés à la construction de l'index
+GEOGRAPHY_AUTOCOMPLETE = {
+    'DEFAULT_LIMIT': 10,
+    'MAX_LIMIT': 50,
+    'SCAN_ROWS': 256,
+}
+
+# Synchronisation incrémentale du référentiel (apps.geography.sync) : les
+# modifications de moins de SETTLE_SECONDS attendent la page suivante
+GEOGRAPHY_SYNC = {
+    'PAGE_SIZE': 500,
+    'MAX_PAGE_SIZE': 5000,
+    'SETTLE_SECONDS': 1,
 }
 
 # Swagger/OpenAPI Configuration
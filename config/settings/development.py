@@ -26,6 +26,12 @@ CACHES = {
     }
 }
 
+# Budgets de requêtes - journalisation des dépassements et des N+1
+MIDDLEWARE += ['core.middleware.QueryBudgetMiddleware']
+
+# Hachage - coût réduit en développement
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 100000))
+
 # Django Extensions (si installé)
 try:
     import django_extensions
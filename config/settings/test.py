@@ -18,6 +18,12 @@ PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.MD5PasswordHasher',
 ]
 
+# État des tokens en mémoire locale
+AUTH_TOKEN_STATE = {
+    'BACKEND': 'apps.authentication.token_state.LocMemTokenStateBackend',
+    'FILTER_SYNC_INTERVAL': 0,
+}
+
 # Désactiver les migrations pour accélérer les tests
 class DisableMigrations:
     def __contains__(self, item):
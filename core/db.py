@@ -0,0 +1,56 @@
+"""
+Utilitaires de requêtes communs aux apps
+"""
+import csv
+import io
+
+from django.db import connection
+
+from .text import prefix_successor
+
+
+def prefix_filter(field, prefix):
+    """
+    Conditions « ``field`` commence par ``prefix`` » servies par un index B-tree
+
+    PostgreSQL utilise l'index varchar_pattern_ops que Django crée pour les
+    CharField ``db_index=True`` (``LIKE 'abc%'``) ; SQLite n'utilise l'index
+    que pour un intervalle en ordre binaire.
+    """
+    if connection.vendor == 'postgresql':
+        return {f'{field}__startswith': prefix}
+    return {f'{field}__gte': prefix, f'{field}__lt': prefix_successor(prefix)}
+
+
+def copy_insert(model, objs):
+    """
+    Insérer ``objs`` par ``COPY ... FROM STDIN`` sous PostgreSQL, sinon par
+    ``bulk_create``
+
+    Comme ``bulk_create`` : valeurs par défaut et ``auto_now(_add)``
+    appliquées, clés primaires fournies par le modèle (UUID), pas de signals.
+    """
+    if connection.vendor != 'postgresql' or not objs:
+        return model.objects.bulk_create(objs)
+    fields = model._meta.local_concrete_fields
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in objs:
+        values = (field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields)
+        writer.writerow(['\\N' if value is None else value for value in values])
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(
+        quote(model._meta.db_table), ', '.join(quote(field.column) for field in fields)
+    )
+    # Erreurs du pilote traduites comme pour execute() (IntegrityError...)
+    with connection.cursor() as cursor, connection.wrap_database_errors:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:
+            # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    return objs
@@ -0,0 +1,197 @@
+"""
+Champs demandés par le client (sparse fieldsets) et profondeur d'expansion
+
+    GET /api/geography/gares/?fields=id,nom
+    GET /api/geography/gares/?fields=id,nom,ville_detail.nom
+    GET /api/geography/gares/?expand=ville_detail
+
+- ``fields`` limite les champs rendus ; un chemin ``a.b`` limite les champs
+  du serializer imbriqué ``a`` (``a`` seul le rend en entier) ;
+- ``expand`` liste les champs imbriqués (serializers, champs ``expandable``)
+  à développer ; ceux qui ne sont pas cités sont omis. ``a.b`` développe
+  ``b`` dans ``a``, ``a`` seul ne développe rien dans ``a``. Sans ``expand``,
+  tous les champs imbriqués sont rendus.
+
+Seuls les GET / HEAD sont concernés : les écritures valident tous les champs.
+``SparseFieldsetMixin`` s'applique aux serializers, ``sparse_queryset``
+retire du queryset les jointures et colonnes inutiles.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _tree(value):
+    """'a,b.c,b.d' -> {'a': {}, 'b': {'c': {}, 'd': {}}}"""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def _key(tree):
+    return tuple(sorted((name, _key(child)) for name, child in tree.items()))
+
+
+def is_expandable(field):
+    """Serializer imbriqué ou champ déclaré ``expandable`` (relation chargée à part)"""
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    return isinstance(field, serializers.BaseSerializer) or getattr(field, 'expandable', False)
+
+
+class Fieldset:
+    """Arbres ``fields`` / ``expand`` d'un niveau (None : pas de restriction)"""
+    __slots__ = ('fields', 'expand')
+
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def from_params(cls, params):
+        """Fieldset des paramètres de requête, None si aucun n'est fourni"""
+        if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+            return None
+        fields = params.get(FIELDS_PARAM)
+        expand = params.get(EXPAND_PARAM)
+        return cls(
+            _tree(fields) if fields is not None else None,
+            _tree(expand) if expand is not None else None,
+        )
+
+    @classmethod
+    def from_request(cls, request):
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        return cls.from_params(request.query_params)
+
+    def key(self):
+        """Clé hashable (cache des serializers compilés)"""
+        return (
+            None if self.fields is None else _key(self.fields),
+            None if self.expand is None else _key(self.expand),
+        )
+
+    def allows(self, name, expandable=False):
+        listed = self.fields is not None and name in self.fields
+        if self.fields is not None and not listed:
+            return False
+        if expandable and self.expand is not None and name not in self.expand:
+            # Un champ imbriqué cité dans fields est rendu sans expand
+            return listed
+        return True
+
+    def child(self, name):
+        """Fieldset du serializer imbriqué ``name``"""
+        fields = (self.fields.get(name) or None) if self.fields is not None else None
+        expand = self.expand.get(name, {}) if self.expand is not None else None
+        return Fieldset(fields, expand)
+
+    def prune(self, fields):
+        """Champs conservés ; les serializers imbriqués reçoivent leur fieldset"""
+        for name in list(fields):
+            field = fields[name]
+            if not self.allows(name, is_expandable(field)):
+                del fields[name]
+                continue
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if isinstance(nested, SparseFieldsetMixin):
+                nested._fieldset = self.child(name)
+        return fields
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer restreint par ``?fields=`` / ``?expand=``
+
+    Le serializer racine lit la requête du contexte (ou ``context['fieldset']``,
+    un Fieldset) ; les serializers imbriqués reçoivent leur partie du parent.
+    """
+
+    def get_fieldset(self):
+        if '_fieldset' in self.__dict__:
+            return self._fieldset
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return None
+        if 'fieldset' in self.context:
+            return self.context['fieldset']
+        return Fieldset.from_request(self.context.get('request'))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return fields
+        return fieldset.prune(fields)
+
+
+def _collect(serializer, model, prefix, related, columns, depends):
+    """
+    Jointures et colonnes lues par ``serializer`` ; retourne False si une
+    source n'est pas une colonne connue (pas de ``only()`` possible)
+    """
+    complete = True
+    for field in serializer._readable_fields:
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if field.source == '*' or not field.source_attrs:
+            complete = False
+            continue
+        *path, last = field.source_attrs
+        target, target_prefix = model, prefix
+        try:
+            for name in path:
+                relation = target._meta.get_field(name)
+                if not (relation.many_to_one or relation.one_to_one) or not relation.concrete:
+                    raise FieldDoesNotExist(name)
+                columns.add(target_prefix + name)
+                related.add(target_prefix + name)
+                target, target_prefix = relation.related_model, f'{target_prefix}{name}__'
+            if isinstance(nested, serializers.BaseSerializer):
+                relation = target._meta.get_field(last)
+                if not (relation.many_to_one or relation.one_to_one) or not relation.concrete:
+                    raise FieldDoesNotExist(last)
+                columns.add(target_prefix + last)
+                related.add(target_prefix + last)
+                complete &= _collect(
+                    nested, relation.related_model, f'{target_prefix}{last}__',
+                    related, columns, depends,
+                )
+                continue
+            try:
+                model_field = target._meta.get_field(last)
+            except FieldDoesNotExist:
+                # Propriété du modèle : colonnes déclarées dans depends
+                if last not in depends:
+                    raise
+                columns.update(target_prefix + column for column in depends[last])
+            else:
+                if not model_field.concrete or model_field.many_to_many:
+                    raise FieldDoesNotExist(last)
+                columns.add(target_prefix + last)
+        except FieldDoesNotExist:
+            complete = False
+    return complete
+
+
+def sparse_queryset(queryset, serializer, depends=None):
+    """
+    Queryset limité aux jointures et colonnes lues par le serializer
+    (déjà restreint par son fieldset)
+    """
+    related, columns = set(), set()
+    complete = _collect(serializer, queryset.model, '', related, columns, depends or {})
+    queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    if complete:
+        queryset = queryset.only(*sorted(columns))
+    return queryset
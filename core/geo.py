@@ -0,0 +1,222 @@
+"""
+Distances et index spatial en mémoire (sans PostGIS)
+
+- ``haversine``: distance orthodromique en kilomètres ;
+- ``GridIndex``: points (clé, latitude, longitude) répartis dans une grille
+  de cellules de ``cell_deg`` degrés. Une recherche par rayon ne parcourt
+  que les cellules qui recoupent le cercle ; la recherche des k plus
+  proches parcourt des anneaux de cellules de plus en plus larges, puis,
+  si les anneaux coûtent plus qu'un parcours des points (requête loin des
+  points), les cellules occupées classées par écart de latitude. Les points peuvent être
+  déplacés ou retirés (positions en direct) : les écritures, sérialisées
+  par l'appelant, remplacent les listes de points au lieu de les modifier,
+  et les lectures ne parcourent le dictionnaire des cellules que sur une
+  copie ; elles se passent donc de verrou.
+
+Les coordonnées sont des degrés décimaux (float ou Decimal).
+"""
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Distance en kilomètres entre deux points (degrés)"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """
+    Index en grille de points (une position par clé)
+
+    Chaque cellule garde ses points sous forme de tuples
+    (latitude en radians, longitude en radians, cos(latitude), clé) : le
+    calcul de distance ne refait ni conversion ni cosinus du point indexé.
+    """
+
+    def __init__(self, points=(), cell_deg=0.1):
+        self.cell_deg = cell_deg
+        self.columns = max(1, round(360 / cell_deg))
+        self.cells = {}
+        self.where = {}
+        self.size = 0
+        self.min_row = self.max_row = None
+        for key, lat, lon in points:
+            self.add(key, lat, lon)
+
+    def __len__(self):
+        return self.size
+
+    def _row(self, lat):
+        return math.floor((float(lat) + 90) / self.cell_deg)
+
+    def _column(self, lon):
+        return math.floor((float(lon) + 180) / self.cell_deg) % self.columns
+
+    def __contains__(self, key):
+        return key in self.where
+
+    def add(self, key, lat, lon):
+        """Ajouter ou déplacer le point ``key``"""
+        self.remove(key)
+        lat, lon = float(lat), float(lon)
+        row = self._row(lat)
+        cell = (row, self._column(lon))
+        # Bornes d'abord : une lecture concurrente qui voit le point voit sa ligne
+        self.min_row = row if self.min_row is None else min(self.min_row, row)
+        self.max_row = row if self.max_row is None else max(self.max_row, row)
+        point = (math.radians(lat), math.radians(lon), math.cos(math.radians(lat)), key)
+        self.cells[cell] = self.cells.get(cell, []) + [point]
+        self.where[key] = cell
+        self.size += 1
+
+    def remove(self, key):
+        """Retirer le point ``key`` (sans effet s'il est absent)"""
+        cell = self.where.pop(key, None)
+        if cell is None:
+            return
+        points = [point for point in self.cells[cell] if point[3] != key]
+        if points:
+            self.cells[cell] = points
+        else:
+            del self.cells[cell]
+        self.size -= 1
+
+    def _scan(self, cells, lat, lon):
+        """(distance, clé) des points des cellules données"""
+        lat, lon = math.radians(lat), math.radians(lon)
+        cos_lat = math.cos(lat)
+        sin, asin, sqrt = math.sin, math.asin, math.sqrt
+        diameter = 2 * EARTH_RADIUS_KM
+        for cell in cells:
+            for point_lat, point_lon, point_cos, key in self.cells.get(cell, ()):
+                a = (
+                    sin((point_lat - lat) / 2) ** 2
+                    + cos_lat * point_cos * sin((point_lon - lon) / 2) ** 2
+                )
+                yield diameter * asin(min(1.0, sqrt(a))), key
+
+    def _column_span(self, lat, radius_km):
+        """Demi-largeur en colonnes d'un rayon à la latitude donnée"""
+        # Cosinus le plus faible atteint dans le cercle (vers le pôle)
+        extreme = min(90.0, abs(lat) + radius_km / KM_PER_DEGREE)
+        width = KM_PER_DEGREE * self.cell_deg * math.cos(math.radians(extreme))
+        if width <= 0:
+            return self.columns
+        return min(self.columns, math.ceil(radius_km / width))
+
+    def _cells_within(self, lat, lon, radius_km):
+        rows = math.ceil(radius_km / (KM_PER_DEGREE * self.cell_deg))
+        span = self._column_span(lat, radius_km)
+        row, column = self._row(lat), self._column(lon)
+        if 2 * span + 1 >= self.columns:
+            columns = range(self.columns)
+        else:
+            columns = [(column + offset) % self.columns for offset in range(-span, span + 1)]
+        return [
+            (cell_row, cell_column)
+            for cell_row in range(max(row - rows, self.min_row), min(row + rows, self.max_row) + 1)
+            for cell_column in columns
+        ] if self.size else []
+
+    def within(self, lat, lon, radius_km, limit=None):
+        """Points à moins de ``radius_km`` : [(distance, clé)] par distance croissante"""
+        lat, lon = float(lat), float(lon)
+        found = [
+            item for item in self._scan(self._cells_within(lat, lon, radius_km), lat, lon)
+            if item[0] <= radius_km
+        ]
+        if limit is not None:
+            return heapq.nsmallest(limit, found)
+        found.sort()
+        return found
+
+    def nearest(self, lat, lon, k=1, max_radius_km=None):
+        """
+        ``k`` points les plus proches (dans ``max_radius_km`` s'il est donné)
+
+        Les anneaux de cellules sont parcourus tant qu'un point plus proche
+        que le k-ième trouvé peut encore s'y trouver, et tant qu'ils coûtent
+        moins qu'un parcours des cellules occupées.
+        """
+        lat, lon = float(lat), float(lon)
+        if not self.size or k <= 0:
+            return []
+        row, column = self._row(lat), self._column(lon)
+        best = []  # tas max des k meilleurs : (-distance, clé)
+        ring = seen = visited = 0
+        while True:
+            if visited > self.size // 4:
+                return self._nearest_scan(lat, lon, k, max_radius_km)
+            cells = self._ring(row, column, ring)
+            # Cellules de l'anneau, y compris hors des lignes occupées
+            visited += max(1, 8 * ring)
+            for distance, key in self._scan(cells, lat, lon):
+                seen += 1
+                if max_radius_km is not None and distance > max_radius_km:
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, key))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, key))
+            # Distance minimale d'un point situé au-delà de l'anneau courant
+            reach = ring * self.cell_deg * KM_PER_DEGREE * math.cos(
+                math.radians(min(90.0, abs(lat) + (ring + 1) * self.cell_deg))
+            )
+            if len(best) == k and reach >= -best[0][0]:
+                break
+            if max_radius_km is not None and reach > max_radius_km:
+                break
+            if seen == self.size or self._covers_all(row, ring):
+                break
+            ring += 1
+        return sorted((-distance, key) for distance, key in best)
+
+    def _nearest_scan(self, lat, lon, k, max_radius_km):
+        """
+        ``nearest`` sur les cellules occupées, par distance minimale
+        croissante (écart de latitude) : arrêt dès qu'elle dépasse le
+        rayon ou le k-ième point trouvé
+        """
+        row, cell_km = self._row(lat), self.cell_deg * KM_PER_DEGREE
+        cells = sorted((max(0, abs(cell[0] - row) - 1) * cell_km, cell) for cell in list(self.cells))
+        best = []
+        for bound, cell in cells:
+            if max_radius_km is not None and bound > max_radius_km:
+                break
+            if len(best) == k and bound >= -best[0][0]:
+                break
+            for distance, key in self._scan((cell,), lat, lon):
+                if max_radius_km is not None and distance > max_radius_km:
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, key))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, key))
+        return sorted((-distance, key) for distance, key in best)
+
+    def _covers_all(self, row, ring):
+        return (
+            row - ring <= self.min_row and row + ring >= self.max_row
+            and 2 * ring + 1 >= self.columns
+        )
+
+    def _ring(self, row, column, ring):
+        """Cellules à exactement ``ring`` cellules (distance de Tchebychev)"""
+        if ring == 0:
+            return [(row, column)]
+        offsets = range(-ring, ring + 1)
+        cells = set()
+        for offset in offsets:
+            cells.add((row - ring, (column + offset) % self.columns))
+            cells.add((row + ring, (column + offset) % self.columns))
+            cells.add((row + offset, (column - ring) % self.columns))
+            cells.add((row + offset, (column + ring) % self.columns))
+        return [cell for cell in cells if self.min_row <= cell[0] <= self.max_row]
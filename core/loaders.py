@@ -0,0 +1,118 @@
+"""
+Chargement groupé de relations non déclarées (DataLoader)
+
+Pour les identifiants stockés sans clé étrangère (``AffectationGare.gare_id``),
+``BatchLoader`` accumule les clés demandées et les résout en une requête ;
+les résultats sont mis en cache pour la durée de la requête HTTP
+(``get_loader``). ``BatchedListSerializer`` annonce à l'avance les clés de
+toute la liste, qui est ainsi résolue en une seule requête.
+"""
+from rest_framework import serializers
+
+
+class BatchLoader:
+    """
+    Résolution groupée de clés avec cache
+
+    ``batch_fn(keys)`` reçoit un ensemble de clés et retourne un dict
+    clé -> valeur ; une clé absente du dict vaut None.
+    """
+
+    def __init__(self, batch_fn):
+        self.batch_fn = batch_fn
+        self._cache = {}
+        self._pending = set()
+
+    def prime(self, keys):
+        """Annoncer des clés qui seront chargées au prochain ``load``"""
+        self._pending.update(key for key in keys if key is not None and key not in self._cache)
+
+    def dispatch(self):
+        keys, self._pending = self._pending, set()
+        if keys:
+            results = self.batch_fn(keys)
+            for key in keys:
+                self._cache[key] = results.get(key)
+
+    def load(self, key):
+        if key not in self._cache:
+            self._pending.add(key)
+            self.dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        keys = list(keys)
+        self.prime(keys)
+        self.dispatch()
+        return [self._cache.get(key) for key in keys]
+
+    def clear(self, key=None):
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+
+def get_loader(request, name, batch_fn):
+    """
+    Loader ``name`` propre à la requête (créé au premier appel)
+
+    Sans requête (shell, tâches), un loader neuf est retourné à chaque appel.
+    """
+    if request is None:
+        return BatchLoader(batch_fn)
+    # La requête Django est partagée par les Request DRF qui l'enveloppent
+    request = getattr(request, '_request', request)
+    loaders = request.__dict__.setdefault('_batch_loaders', {})
+    if name not in loaders:
+        loaders[name] = BatchLoader(batch_fn)
+    return loaders[name]
+
+
+class LoaderField(serializers.Field):
+    """
+    Champ en lecture seule résolu par un BatchLoader
+
+    Les sous-classes définissent ``get_loader(request)`` et
+    ``to_representation_loaded(value)``. Le champ est développable
+    (``?expand=``, cf. ``core.fieldsets``) comme un serializer imbriqué.
+    """
+    expandable = True
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_loader(self, request):
+        raise NotImplementedError
+
+    def loader(self):
+        return self.get_loader(self.context.get('request'))
+
+    def prime(self, keys):
+        self.loader().prime(keys)
+
+    def to_representation(self, key):
+        value = self.loader().load(key)
+        if value is None:
+            return None
+        return self.to_representation_loaded(value)
+
+    def to_representation_loaded(self, value):
+        raise NotImplementedError
+
+
+class BatchedListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer qui annonce aux LoaderField les clés de toute la liste
+    avant le rendu (une requête par loader et non par ligne)
+    """
+
+    def to_representation(self, data):
+        if hasattr(data, 'all'):
+            data = data.all()
+        data = list(data)
+        for field in self.child._readable_fields:
+            if isinstance(field, LoaderField):
+                field.prime(field.get_attribute(instance) for instance in data)
+        return super().to_representation(data)
@@ -0,0 +1,50 @@
+"""
+Middlewares partagés
+"""
+import logging
+
+from .queries import QueryBudgetExceeded, QueryRecorder, budget_for, budget_settings
+
+logger = logging.getLogger('core.queries')
+
+
+class QueryBudgetMiddleware:
+    """
+    Contrôle des budgets de requêtes par action de viewset (développement)
+
+    Chaque requête HTTP est instrumentée ; un dépassement du budget déclaré
+    par le viewset (``query_budgets``) ou une requête répétée (N+1) est
+    journalisé, ou lève QueryBudgetExceeded si ``QUERY_BUDGETS['RAISE']``.
+    L'en-tête ``X-Query-Count`` donne le nombre de requêtes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._query_budget = None
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        if request._query_budget is not None:
+            budget, label = request._query_budget
+            messages = budget.violations(recorder, label)
+            if messages:
+                if budget_settings().get('RAISE', False):
+                    raise QueryBudgetExceeded('\n'.join(messages))
+                for message in messages:
+                    logger.warning(message)
+        response['X-Query-Count'] = str(recorder.count)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            return None
+        # Viewsets : actions par méthode HTTP ; APIView : nom de la méthode
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower(), request.method.lower())
+        request._query_budget = (
+            budget_for(view_class, action), f'{view_class.__name__}.{action}'
+        )
+        return None
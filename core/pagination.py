@@ -0,0 +1,287 @@
+"""
+Pagination des listes de l'API
+
+- ``KeysetPagination``: pagination par curseur sur une clé composite
+  (``created_at``, ``id`` par défaut, ou le champ de ``?ordering=`` suivi de
+  ``id``). Chaque page est une requête ``WHERE clé < curseur LIMIT n`` servie
+  par l'index : pas de ``COUNT(*)`` ni d'OFFSET croissant.
+- ``StandardPagination``: pagination par numéro de page (avec ``count``) ou
+  par curseur, au choix du viewset (``pagination_mode = 'keyset'``) ou du
+  client (``?pagination=keyset`` / ``?pagination=page``).
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+import uuid
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+KEYSET = 'keyset'
+PAGE = 'page'
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    return value
+
+
+def _resolve_field(model, path):
+    """Champ de modèle désigné par un chemin ``a__b`` (None si introuvable)"""
+    field = None
+    for name in path.split('__'):
+        if model is None:
+            return None
+        try:
+            field = model._meta.get_field('id' if name == 'pk' else name)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model
+    return field
+
+
+def _attribute(obj, path):
+    for name in path.split('__'):
+        obj = getattr(obj, name)
+    return obj
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par curseur sur une clé (champs de tri..., id)
+
+    Le curseur encode les valeurs de la clé du dernier (ou premier) élément
+    renvoyé et le sens de parcours ; il reste valide si des lignes sont
+    insérées ou supprimées entre deux pages.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    default_ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Curseur invalide'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = [self._resolve(queryset.model, term.lstrip('-')) for term in self.ordering]
+
+        position, reverse = self.decode_cursor(request)
+        ordering = self._flip(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        del results[self.page_size:]
+        if reverse:
+            results.reverse()
+
+        if results:
+            first, last = self._position(results[0]), self._position(results[-1])
+        else:
+            first = last = position
+        if reverse:
+            self.next_position = last if position is not None else None
+            self.previous_position = first if has_more else None
+        else:
+            self.next_position = last if has_more else None
+            self.previous_position = first if position is not None else None
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Termes de tri de la clé : ``?ordering=`` (restreint aux
+        ``ordering_fields`` du viewset) ou ``default_ordering``, complétés
+        par ``id`` pour que la clé soit unique
+        """
+        ordering = None
+        for backend in getattr(view, 'filter_backends', ()):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        # Seuls les champs non nuls peuvent servir de clé
+        ordering = [
+            term for term in ordering or ()
+            if (field := _resolve_field(queryset.model, term.lstrip('-'))) is not None
+            and not field.null
+        ] or list(self.default_ordering)
+
+        if not any(term.lstrip('-') in ('id', 'pk') for term in ordering):
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return ordering
+
+    def _resolve(self, model, path):
+        field = _resolve_field(model, path)
+        if field is None:
+            raise NotFound(self.invalid_cursor_message)
+        return field
+
+    @staticmethod
+    def _flip(ordering):
+        return [term[1:] if term.startswith('-') else '-' + term for term in ordering]
+
+    @staticmethod
+    def _after(ordering, position):
+        """
+        Condition « strictement après la position » pour ce tri :
+        (a < x) OR (a = x AND b < y) OR ... selon le sens de chaque terme
+        """
+        condition = Q()
+        equal = Q()
+        for term, value in zip(ordering, position):
+            name = term.lstrip('-')
+            lookup = 'lt' if term.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def _position(self, obj):
+        return [_attribute(obj, term.lstrip('-')) for term in self.ordering]
+
+    def decode_cursor(self, request):
+        """Retourne (position, reverse) ; (None, False) pour la première page"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            values, reverse = payload['k'], bool(payload.get('r'))
+            if len(values) != len(self.fields):
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse=False):
+        payload = {'k': [_encode_value(value) for value in position]}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(',', ':')).encode()
+        ).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Curseur de pagination (liens next / previous)',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Nombre de résultats par page',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class StandardPagination(PageNumberPagination):
+    """
+    Pagination par défaut de l'API
+
+    Numéros de page par défaut ; curseur si le viewset déclare
+    ``pagination_mode = 'keyset'``, si le client passe ``?pagination=keyset``
+    ou s'il suit un lien contenant ``cursor``.
+    """
+    mode_query_param = 'pagination'
+    keyset_class = KeysetPagination
+
+    def get_mode(self, request, view):
+        mode = request.query_params.get(self.mode_query_param)
+        if mode in (KEYSET, PAGE):
+            return mode
+        if self.keyset_class.cursor_query_param in request.query_params:
+            return KEYSET
+        return getattr(view, 'pagination_mode', PAGE)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.get_mode(request, view) == KEYSET:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_next_link(self):
+        if self.keyset is not None:
+            return self.keyset.get_next_link()
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if self.keyset is not None:
+            return self.keyset.get_previous_link()
+        return super().get_previous_link()
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Mode de pagination: page (défaut) ou keyset',
+                'schema': {'type': 'string', 'enum': [PAGE, KEYSET]},
+            },
+        ] + self.keyset_class().get_schema_operation_parameters(view)
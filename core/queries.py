@@ -0,0 +1,140 @@
+"""
+Instrumentation des requêtes SQL : budgets et détection des N+1
+
+- ``QueryRecorder``: enregistre les requêtes exécutées (``execute_wrapper``),
+  sans dépendre de ``DEBUG`` ;
+- ``QueryBudget``: nombre maximal de requêtes et de répétitions d'une même
+  forme de requête (signature d'un N+1) ;
+- ``budget_for``: budget déclaré par un viewset pour une action
+  (``query_budgets = {'list': 3, 'retrieve': 2}``). Le budget couvre toute
+  la requête HTTP, chargement de l'utilisateur authentifié compris ;
+- ``QueryBudgetTestMixin``: ``assertQueryBudget`` pour les tests.
+
+Le middleware de développement est dans ``core.middleware``.
+"""
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_RE = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+
+
+def query_shape(sql):
+    """Forme d'une requête : littéraux et listes IN (...) neutralisés"""
+    sql = _LITERAL_RE.sub('?', sql)
+    return _IN_RE.sub('IN (...)', sql)
+
+
+def budget_settings():
+    return getattr(settings, 'QUERY_BUDGETS', {})
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Budget de requêtes dépassé"""
+
+
+class QueryRecorder:
+    """Enregistrer les requêtes exécutées sur une connexion"""
+
+    def __init__(self, using='default'):
+        self.connection = connections[using]
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def repeated(self):
+        """Formes de requête exécutées plusieurs fois : [(forme, nombre)]"""
+        shapes = Counter(query_shape(sql) for sql in self.queries)
+        return [(shape, count) for shape, count in shapes.most_common() if count > 1]
+
+
+class QueryBudget:
+    """
+    Budget d'une action : ``max_queries`` requêtes au plus, et aucune forme
+    répétée plus de ``max_repeats`` fois (None = pas de limite)
+    """
+
+    def __init__(self, max_queries=None, max_repeats=None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+
+    def violations(self, recorder, label=''):
+        """Messages décrivant les dépassements (liste vide si conforme)"""
+        prefix = f'{label}: ' if label else ''
+        messages = []
+        if self.max_queries is not None and recorder.count > self.max_queries:
+            messages.append(
+                f'{prefix}{recorder.count} requêtes pour un budget de {self.max_queries}'
+            )
+        if self.max_repeats is not None:
+            for shape, count in recorder.repeated():
+                if count > self.max_repeats:
+                    messages.append(f'{prefix}requête répétée {count} fois (N+1 ?): {shape}')
+        return messages
+
+    def check(self, recorder, label=''):
+        messages = self.violations(recorder, label)
+        if messages:
+            raise QueryBudgetExceeded('\n'.join(messages))
+
+
+def budget_for(view_class, action):
+    """
+    Budget déclaré par ``view_class.query_budgets`` pour ``action``
+
+    Les valeurs sont un nombre de requêtes ou un QueryBudget ; la clé ``'*'``
+    s'applique aux actions non listées. ``MAX_REPEATS`` (settings
+    ``QUERY_BUDGETS``) borne les répétitions par défaut.
+    """
+    config = budget_settings()
+    budgets = getattr(view_class, 'query_budgets', None) or {}
+    budget = budgets.get(action, budgets.get('*', config.get('DEFAULT_MAX_QUERIES')))
+    if isinstance(budget, QueryBudget):
+        return budget
+    return QueryBudget(max_queries=budget, max_repeats=config.get('MAX_REPEATS', 5))
+
+
+class QueryBudgetTestMixin:
+    """
+    Assertions de budget pour les TestCase
+
+        with self.assertQueryBudget(UserViewSet, 'list'):
+            self.client.get('/api/auth/users/')
+
+    ``max_queries`` / ``max_repeats`` remplacent les valeurs déclarées.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, view_class=None, action=None, max_queries=None, max_repeats=None):
+        budget, label = QueryBudget(), ''
+        if view_class is not None:
+            declared = budget_for(view_class, action)
+            budget = QueryBudget(declared.max_queries, declared.max_repeats)
+            label = f'{view_class.__name__}.{action}'
+        if max_queries is not None:
+            budget.max_queries = max_queries
+        if max_repeats is not None:
+            budget.max_repeats = max_repeats
+        with QueryRecorder() as recorder:
+            yield recorder
+        messages = budget.violations(recorder, label)
+        if messages:
+            self.fail('\n'.join(messages + ['Requêtes:'] + recorder.queries))
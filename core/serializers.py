@@ -0,0 +1,292 @@
+"""
+Sérialisation compilée en lecture seule
+
+``CompiledSerializer`` analyse une fois un ModelSerializer (champs, sources
+``a.b``, serializers imbriqués) et en déduit :
+
+- la liste des colonnes à lire avec ``values_list()`` (jointures comprises) ;
+- des records à ``__slots__`` par niveau du graphe (utilisateur, rôle...),
+  construits depuis les tuples, qui portent aussi les propriétés du modèle
+  (``nom_complet``...) ;
+- un plan de rendu qui produit exactement les mêmes dictionnaires que le
+  serializer DRF (mêmes clés, même ordre, mêmes conversions).
+
+On évite ainsi l'instanciation des modèles et le parcours champ par champ
+de DRF sur les listes.
+"""
+import math
+import threading
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models.query import ValuesListIterable
+from django.utils import timezone
+from rest_framework import ISO_8601
+from rest_framework import fields as drf_fields
+from rest_framework import relations, serializers
+from rest_framework.settings import api_settings
+
+MISSING = object()
+
+# Fuseau courant, lu une fois par rendu (et non une fois par valeur)
+_context = threading.local()
+
+
+def _identity(value):
+    return value
+
+
+def _datetime_converter(field):
+    """DateTimeField.to_representation avec le fuseau du rendu en cours"""
+    fallback = field.to_representation
+
+    def convert(value):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = getattr(_context, 'timezone', None)
+        if (
+            field_timezone is None or output_format is None
+            or output_format.lower() == ISO_8601 or isinstance(value, str)
+            or value.utcoffset() is None
+        ):
+            return fallback(value)
+        return value.astimezone(field_timezone).strftime(output_format)
+    return convert
+
+
+def _converter(field):
+    """Conversion d'une valeur non nulle, identique à ``field.to_representation``"""
+    method = type(field).to_representation
+    if method is drf_fields.CharField.to_representation:
+        return str
+    if method is drf_fields.UUIDField.to_representation and field.uuid_format == 'hex_verbose':
+        return str
+    if method is drf_fields.IntegerField.to_representation:
+        return int
+    if method is drf_fields.BooleanField.to_representation:
+        return bool
+    if method is drf_fields.DateTimeField.to_representation and not hasattr(field, 'timezone'):
+        return _datetime_converter(field)
+    if method is relations.PrimaryKeyRelatedField.to_representation:
+        return field.pk_field.to_representation if field.pk_field is not None else _identity
+    return field.to_representation
+
+
+def _fallback(field):
+    """Valeur quand une relation intermédiaire est nulle (cf. Field.get_attribute)"""
+    if field.default is not drf_fields.empty:
+        return field.get_default()
+    if field.allow_null:
+        return None
+    return MISSING
+
+
+def _getter(path):
+    if len(path) == 1:
+        return attrgetter(path[0])
+    *relations_, last = path
+
+    def get(record):
+        for name in relations_:
+            record = getattr(record, name)
+            if record is None:
+                return MISSING
+        return getattr(record, last)
+    return get
+
+
+class _Level:
+    """Un modèle du graphe lu : ses colonnes et ses relations"""
+
+    def __init__(self, compiled, model, prefix='', aliases=None):
+        self.compiled = compiled
+        self.model = model
+        self.prefix = prefix
+        self.attrs = dict(aliases or {})
+        self.children = {}
+        self.properties = {}
+
+    def column(self, name):
+        field = self.model._meta.get_field(name)
+        if field.attname not in self.attrs:
+            self.attrs[field.attname] = self.compiled.add_column(self.prefix + field.name)
+        return field.attname
+
+    def child(self, name):
+        if name not in self.children:
+            field = self.model._meta.get_field(name)
+            if not (field.many_to_one or field.one_to_one) or not field.concrete:
+                raise ImproperlyConfigured(
+                    f"{self.model.__name__}.{name}: seules les clés étrangères sont supportées"
+                )
+            guard = self.attrs[self.column(name)]
+            level = _Level(
+                self.compiled, field.related_model, f'{self.prefix}{name}__',
+                aliases={field.target_field.attname: guard},
+            )
+            self.children[name] = (level, guard)
+        return self.children[name][0]
+
+    def add_property(self, name, depends):
+        prop = getattr(self.model, name, None)
+        if not isinstance(prop, property):
+            raise ImproperlyConfigured(f"{self.model.__name__}.{name}: ni champ ni propriété")
+        if name not in depends:
+            raise ImproperlyConfigured(
+                f"{self.model.__name__}.{name}: colonnes de la propriété non déclarées (depends)"
+            )
+        for column in depends[name]:
+            self.column(column)
+        self.properties[name] = prop
+        return name
+
+    def freeze(self):
+        """Créer la classe de record et la fonction de construction"""
+        for level, _ in self.children.values():
+            level.freeze()
+        self.record_class = type(f'{self.model.__name__}Record', (), {
+            '__slots__': tuple(self.attrs) + tuple(self.children),
+            '__module__': __name__,
+            **self.properties,
+        })
+        self.attr_items = tuple(self.attrs.items())
+        self.child_items = tuple(
+            (name, level, guard) for name, (level, guard) in self.children.items()
+        )
+
+    def build(self, row):
+        record = object.__new__(self.record_class)
+        for name, index in self.attr_items:
+            setattr(record, name, row[index])
+        for name, level, guard in self.child_items:
+            setattr(record, name, None if row[guard] is None else level.build(row))
+        return record
+
+
+class _Plan:
+    """Plan de rendu d'un serializer : (clé, lecture, conversion, repli)"""
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    def render(self, record):
+        data = {}
+        for key, get, convert, fallback in self.steps:
+            value = get(record)
+            if value is MISSING:
+                if fallback is MISSING:
+                    continue
+                value = fallback
+            data[key] = None if value is None else convert(value)
+        return data
+
+
+class CompiledSerializer:
+    """
+    Version compilée, en lecture seule, d'un ModelSerializer
+
+    ``depends`` indique les colonnes dont dépend chaque propriété de modèle
+    exposée par le serializer, ex. ``{'nom_complet': ('nom', 'prenom')}`` ;
+    ``extra`` ajoute des champs du modèle racine aux records sans les rendre
+    (clés de tri de la pagination) ; ``context`` est passé au serializer
+    analysé (``fieldset``...). La compilation a lieu au premier usage.
+    """
+
+    def __init__(self, serializer_class, depends=None, extra=(), context=None):
+        self.serializer_class = serializer_class
+        self.depends = depends or {}
+        self.extra = tuple(extra)
+        self.context = context or {}
+        self._compiled = False
+        self._lock = threading.Lock()
+
+    def add_column(self, path):
+        if path not in self._indexes:
+            self._indexes[path] = len(self.columns)
+            self.columns.append(path)
+        return self._indexes[path]
+
+    def compile(self):
+        if self._compiled:
+            return
+        with self._lock:
+            if self._compiled:
+                return
+            self.columns, self._indexes = [], {}
+            self.root = _Level(self, self.serializer_class.Meta.model)
+            self.plan = self._compile(self.serializer_class(context=self.context), self.root)
+            for name in (self.root.model._meta.pk.name, *self.extra):
+                try:
+                    self.root.column(name)
+                except FieldDoesNotExist:
+                    continue
+            self.root.freeze()
+
+            build = self.root.build
+            self.iterable_class = type('RecordIterable', (ValuesListIterable,), {
+                '__iter__': lambda iterable: map(build, ValuesListIterable.__iter__(iterable)),
+            })
+            self._compiled = True
+
+    def _compile(self, serializer, level):
+        steps = []
+        for field in serializer._readable_fields:
+            if not field.source_attrs or isinstance(
+                field, (serializers.ListSerializer, relations.ManyRelatedField)
+            ):
+                raise ImproperlyConfigured(
+                    f"{type(serializer).__name__}.{field.field_name}: champ non supporté"
+                )
+            *path, last = field.source_attrs
+            target = level
+            for name in path:
+                target = target.child(name)
+
+            if isinstance(field, serializers.BaseSerializer):
+                convert = self._compile(field, target.child(last)).render
+            else:
+                convert = _converter(field)
+                try:
+                    target.model._meta.get_field(last)
+                except FieldDoesNotExist:
+                    last = target.add_property(last, self.depends)
+                else:
+                    last = target.column(last)
+            steps.append((field.field_name, _getter(path + [last]), convert, _fallback(field)))
+        return _Plan(tuple(steps))
+
+    def records(self, queryset):
+        """QuerySet ``values_list`` dont l'itération produit des records"""
+        self.compile()
+        queryset = queryset.values_list(*self.columns)
+        queryset._iterable_class = self.iterable_class
+        return queryset
+
+    def to_representation(self, record):
+        return self.data([record])[0]
+
+    def data(self, records):
+        """Liste de dictionnaires, identique à ``Serializer(many=True).data``"""
+        render = self.plan.render
+        _context.timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        try:
+            return [render(record) for record in records]
+        finally:
+            _context.timezone = None
+
+
+class FiniteFloatField(serializers.FloatField):
+    """
+    FloatField qui refuse NaN et ±inf : ``float('nan')`` est accepté par
+    DRF et passe les bornes ``min_value`` / ``max_value`` (comparaisons
+    toujours fausses)
+    """
+    default_error_messages = {
+        'non_finite': 'Un nombre fini est requis.',
+    }
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if not math.isfinite(value):
+            self.fail('non_finite')
+        return value
@@ -0,0 +1,26 @@
+"""
+Normalisation de texte pour la recherche (insensible aux accents et à la casse)
+"""
+import re
+import unicodedata
+
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def fold(value):
+    """'Ouédraogo' -> 'ouedraogo'"""
+    normalized = unicodedata.normalize('NFKD', str(value or ''))
+    return ''.join(c for c in normalized if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(value):
+    """Mots normalisés d'un texte : 'Jean-Paul Ouédraogo' -> ['jean', 'paul', 'ouedraogo']"""
+    return TOKEN_RE.findall(fold(value))
+
+
+def prefix_successor(prefix):
+    """
+    Plus petite chaîne supérieure à toutes celles qui commencent par ``prefix``
+    (ordre binaire) : 'abc' -> 'abd'
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
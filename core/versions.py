@@ -0,0 +1,98 @@
+"""
+Versions de modèles pour la validation des caches HTTP
+
+Chaque modèle suivi a un numéro de version dans le cache Django : l'heure
+(en millisecondes) de sa dernière modification, strictement croissante.
+Les signals ``post_save`` / ``post_delete`` la font avancer (à nouveau après
+le commit : une lecture concurrente a pu associer la nouvelle version aux
+anciennes données) ; les écritures
+qui les contournent (``update()``, ``bulk_create``, ``bulk_update``) doivent
+appeler ``bump_version``.
+
+Une version absente du cache (redémarrage, éviction) est réinitialisée à
+l'heure courante : les ETag calculés avant ne peuvent pas être réutilisés.
+
+``VersionedValue`` conserve dans le processus une valeur dérivée de modèles
+(instantané, index) reconstruite quand leurs versions changent.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+VERSION_KEY = 'core:version:{}'
+
+
+def _key(model):
+    return VERSION_KEY.format(model._meta.label_lower)
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def get_versions(*models):
+    """Versions courantes des modèles, dans l'ordre donné"""
+    keys = [_key(model) for model in models]
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        now = _now()
+        for key in missing:
+            # add : ne pas écraser une version posée entre-temps
+            cache.add(key, now, None)
+        values.update(cache.get_many(missing))
+    return tuple(values.get(key, 0) for key in keys)
+
+
+def bump_version(*models):
+    """Marquer les modèles comme modifiés"""
+    keys = [_key(model) for model in models]
+    current = cache.get_many(keys)
+    now = _now()
+    cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, None)
+
+
+def track_versions(*models):
+    """Faire avancer la version des modèles à chaque sauvegarde ou suppression"""
+    for model in models:
+        def changed(sender, **kwargs):
+            bump_version(sender)
+            transaction.on_commit(lambda: bump_version(sender))
+        post_save.connect(changed, sender=model, weak=False, dispatch_uid=f'version:{_key(model)}')
+        post_delete.connect(changed, sender=model, weak=False, dispatch_uid=f'version-delete:{_key(model)}')
+
+
+class VersionedValue:
+    """
+    Valeur du processus construite par ``build(versions)`` à partir de
+    ``models``, reconstruite quand leurs versions changent (dans n'importe
+    quel processus) ou après ``invalidate()``
+
+    La lecture coûte une lecture du cache (``get_many``).
+    """
+
+    def __init__(self, build, *models):
+        self.build = build
+        self.models = models
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        versions = get_versions(*self.models)
+        entry = self._entry
+        if entry is not None and entry[0] == versions:
+            return entry[1]
+        with self._lock:
+            entry = self._entry
+            if entry is None or entry[0] != versions:
+                # Versions lues avant la construction : une modification
+                # concurrente provoquera une nouvelle construction
+                entry = (versions, self.build(versions))
+                self._entry = entry
+        return entry[1]
+
+    def invalidate(self):
+        self._entry = None
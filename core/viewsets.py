@@ -0,0 +1,159 @@
+"""
+Mixins de viewsets partagés
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers, quote_etag,
+)
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .fieldsets import Fieldset, sparse_queryset
+from .pagination import KeysetPagination
+from .serializers import CompiledSerializer
+from .versions import get_versions
+
+
+class ConditionalGetMixin:
+    """
+    GET conditionnels (ETag / Last-Modified) sur ``list`` et ``retrieve``
+
+    Avec ``etag_models`` (modèles dont dépend la réponse, relations
+    sérialisées comprises), l'ETag est calculé à partir de leurs versions
+    (``core.versions``) : une liste inchangée répond 304 sans requête SQL.
+    Sans ``etag_models``, il est calculé à partir du ``updated_at`` maximal
+    et du nombre de lignes du queryset filtré (une requête d'agrégat).
+
+    L'ETag dépend aussi de l'URL complète, du format de rendu et de
+    l'utilisateur. ``cache_control`` est passé à ``patch_cache_control``.
+    """
+    etag_models = ()
+    cache_control = {'private': True, 'no_cache': True}
+
+    def get_etag(self, *parts):
+        request = self.request
+        key = '|'.join(str(part) for part in (
+            request.user.pk, request.get_full_path(),
+            getattr(request.accepted_renderer, 'format', ''), *parts,
+        ))
+        return hashlib.md5(key.encode()).hexdigest()
+
+    def conditional_response(self, etag, last_modified, render):
+        """
+        304 si le client a déjà cette représentation, sinon ``render()`` ;
+        les validateurs et Cache-Control sont posés sur les deux réponses
+        """
+        response = get_conditional_response(
+            self.request, etag=quote_etag(etag), last_modified=last_modified
+        )
+        if response is None:
+            response = render()
+        response['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, **self.cache_control)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if self.etag_models:
+            versions = get_versions(*self.etag_models)
+            etag = self.get_etag('list', *versions)
+            last_modified = max(versions) // 1000
+        else:
+            state = self.filter_queryset(self.get_queryset()).aggregate(
+                updated=Max('updated_at'), count=Count('pk')
+            )
+            updated = state['updated']
+            etag = self.get_etag('list', updated and updated.isoformat(), state['count'])
+            last_modified = updated and int(updated.timestamp())
+        return self.conditional_response(
+            etag, last_modified, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        # get_object d'abord : permissions et 404 avant toute réponse 304
+        instance = self.get_object()
+        if self.etag_models and 'updated_at' in instance.get_deferred_fields():
+            # Colonne omise (?fields=) : les versions suffisent
+            updated = None
+        else:
+            updated = getattr(instance, 'updated_at', None)
+        versions = get_versions(*self.etag_models)
+        etag = self.get_etag('retrieve', instance.pk, updated and updated.isoformat(), *versions)
+        timestamps = [version // 1000 for version in versions]
+        if updated is not None:
+            timestamps.append(int(updated.timestamp()))
+        return self.conditional_response(
+            etag, max(timestamps, default=None),
+            lambda: Response(self.get_serializer(instance).data),
+        )
+
+
+class SparseFieldsetViewMixin:
+    """
+    ``?fields=`` / ``?expand=`` (``core.fieldsets``) sur ``list`` et ``retrieve``
+
+    Le serializer doit utiliser ``SparseFieldsetMixin`` ; le queryset ne
+    garde que les jointures et colonnes des champs rendus (les propriétés
+    exposées sont résolues par ``compiled_depends``).
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in self.sparse_actions and Fieldset.from_request(self.request) is not None:
+            queryset = sparse_queryset(
+                queryset, self.get_serializer(), getattr(self, 'compiled_depends', None)
+            )
+        return queryset
+
+
+class CompiledListMixin:
+    """
+    ``list`` servi par la version compilée de ``serializer_class``
+
+    Les lignes sont lues avec ``values_list()`` et rendues sans instancier
+    les modèles ; la réponse est identique à celle du serializer DRF.
+    ``compiled_depends`` déclare les colonnes des propriétés exposées. Une
+    version est compilée par fieldset demandé (``?fields=``, ``?expand=``).
+    """
+    compiled_depends = {}
+    # Fieldsets distincts compilés au plus (les suivants ne sont pas conservés)
+    compiled_fieldsets_max = 64
+
+    @classmethod
+    def get_compiled_serializer(cls, fieldset=None):
+        cache = cls.__dict__.get('_compiled_serializers')
+        if cache is None:
+            cache = cls._compiled_serializers = {}
+        key = None if fieldset is None else fieldset.key()
+        compiled = cache.get(key)
+        if compiled is None:
+            # Les clés de tri doivent figurer dans les records (pagination par curseur)
+            ordering = [
+                name for name in getattr(cls, 'ordering_fields', None) or ()
+                if name != '__all__'
+            ]
+            extra = [term.lstrip('-') for term in KeysetPagination.default_ordering]
+            compiled = CompiledSerializer(
+                cls.serializer_class, depends=cls.compiled_depends, extra=ordering + extra,
+                context={'fieldset': fieldset},
+            )
+            if len(cache) < cls.compiled_fieldsets_max:
+                cache[key] = compiled
+        return compiled
+
+    def list(self, request, *args, **kwargs):
+        if self.get_serializer_class() is not self.serializer_class:
+            return super().list(request, *args, **kwargs)
+
+        compiled = self.get_compiled_serializer(Fieldset.from_request(request))
+        queryset = compiled.records(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compiled.data(page))
+        return Response(compiled.data(queryset))